@@ -1,189 +1,501 @@
+import time
+_IMPORT_START = time.perf_counter()
 import os
 import json
 import logging
+import warnings
 import numpy as np
-import pandas as pd
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
-import joblib
-import shap
+import explainers
+import service_metrics
+import request_profiler
+from service_metrics import Counter, Gauge, Histogram
+import serving
+from serving import risk_level_for
+from shadow import ShadowScorer
+from response_cache import ResponseCache
+from micro_batch import MicroBatcher
+from async_explain import ExplanationJobs
 
 app = Flask(__name__)
 CORS(app)
 logging.basicConfig(level=logging.INFO)
+# Features are passed as plain arrays in feature_columns order
+warnings.filterwarnings('ignore', message='X does not have valid feature names')
 
 _SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 MODEL_DIR = os.path.join(_SCRIPT_DIR, "model")
 REPORTS_DIR = os.path.join(_SCRIPT_DIR, "reports")
 
+# Prometheus metrics, served on /metrics (service_metrics.py). Always on: a
+# stage timer costs two perf_counter() calls and a bisect.
+REQUESTS = Counter("cancer_api_requests_total", "HTTP requests by endpoint and status code", ("endpoint", "code"))
+REQUEST_ERRORS = Counter("cancer_api_request_errors_total", "Responses with status >= 400", ("endpoint", "code"))
+REQUEST_SECONDS = Histogram("cancer_api_request_seconds", "End-to-end request latency", ("endpoint",))
+IN_FLIGHT = Gauge("cancer_api_in_flight_requests", "Requests currently being handled", ("endpoint",))
+STAGE_SECONDS = Histogram("cancer_api_stage_seconds", "Latency of each scoring stage", ("endpoint", "stage"))
+STAGE_ERRORS = Counter("cancer_api_stage_errors_total", "Exceptions raised inside a scoring stage", ("endpoint", "stage"))
+ROWS_SCORED = Counter("cancer_api_rows_scored_total", "Patient rows scored", ("endpoint",))
+MODEL_INFO = Gauge("cancer_api_model_info", "Loaded model version (value is always 1)", ("version", "source", "engine"))
+VARIANT_ROWS = Counter("cancer_api_variant_rows_scored_total", "Patient rows scored per model variant", ("variant", "version"))
+SHADOW_ROWS = Counter("cancer_api_shadow_rows_total", "Rows shadow-scored", ("primary", "shadow"))
+SHADOW_LEVEL_CHANGES = Counter("cancer_api_shadow_risk_level_changes_total",
+                               "Shadow-scored rows whose risk level differs from the served one", ("primary", "shadow"))
+SHADOW_ABS_DIFF = Histogram("cancer_api_shadow_abs_diff", "Mean |shadow - served| probability per shadowed request",
+                            ("primary", "shadow"), buckets=(0.001, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5))
+RESPONSE_CACHE_ROWS = Counter("cancer_api_response_cache_rows_total", "Response cache lookups per row by result",
+                              ("endpoint", "result"))
+RESPONSE_CACHE_HIT_RATIO = Gauge("cancer_api_response_cache_hit_ratio", "Response cache hits / lookups since start")
+RESPONSE_CACHE_ENTRIES = Gauge("cancer_api_response_cache_entries", "Results held in the response cache")
+MICRO_BATCH_ROWS = Histogram("cancer_api_micro_batch_rows", "Rows per /predict micro-batch",
+                             buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+MICRO_BATCH_QUEUE_SECONDS = Histogram("cancer_api_micro_batch_queue_seconds",
+                                      "Time a /predict request waited for its micro-batch to start")
+SHADOW_DROPPED = Counter("cancer_api_shadow_dropped_total", "Shadow comparisons dropped because the queue was full")
+
+def stage(endpoint, name):
+    """Times a block as stage `name` (parse, features, scale, predict_proba, shap)."""
+    timer = STAGE_SECONDS.time(endpoint, name, on_error=STAGE_ERRORS.labels(endpoint, name))
+    # Also recorded in the request's profile when it is being profiled
+    return request_profiler.stage(name, timer)
+
+# Opt-in per-request profiling (request_profiler.py): X-Profile: 1 plus
+# X-Profile-Token: $PROFILE_TOKEN, or a PROFILE_SAMPLE_RATE fraction of requests
+profiler = request_profiler.Profiler.from_env()
+
+# Import and model-load timings for this process, reported by /health
+STARTUP = {"import_seconds": round(time.perf_counter() - _IMPORT_START, 4)}
+
+MODEL_RELOADS = Counter("cancer_api_model_reloads_total", "Model reload attempts by result", ("result",))
+
+# Complete /predict and /predict_batch results keyed on the engineered feature
+# row (response_cache.py); emptied whenever a model version is swapped in
+response_cache = ResponseCache.from_env()
+
+def _model_swapped(old, new):
+    response_cache.invalidate()
+    RESPONSE_CACHE_ENTRIES.set(0)
+    if old is not None:
+        MODEL_INFO.labels(old.version, old.source, old.engine.kind).set(0)
+        MODEL_RELOADS.labels("success").inc()
+    MODEL_INFO.labels(new.version, new.source, new.engine.kind).set(1)
+    logging.info(f"Model {new.version} loaded from {new.source} (inference engine: {new.engine.kind})")
+    if not new.explanations_enabled:
+        logging.warning("No SHAP backgound available; explanations disabled.")
+
+def _model_reload_failed(old, error):
+    if old is not None:
+        MODEL_RELOADS.labels("failed").inc()
+
+def _variant_swapped(name, old, new):
+    # Response cache keys carry the model version, so primary's entries stay valid
+    logging.info(f"Model variant {name!r}: {new.version} loaded from {new.source} "
+                 f"(was {old.version if old else 'none'})")
+
+# The serving model lives in `models.current` (serving.py). A background
+# watcher swaps in new versions written to MODEL_DIR once they load, validate
+# and warm up; each request reads `models.current` once (active_model()) and
+# finishes on that version.
+models = serving.ModelManager(MODEL_DIR, on_swap=_model_swapped, on_failure=_model_reload_failed)
+
 try:
-    model = joblib.load(os.path.join(MODEL_DIR, "cancer_risk_model.pkl"))
-    scaler = joblib.load(os.path.join(MODEL_DIR, "scaler.pkl"))
-    with open(os.path.join(MODEL_DIR, "feature_columns.json"), "r") as f:
-        feature_columns = json.load(f)
-    try:
-        background_data = joblib.load(os.path.join(MODEL_DIR, "background.pkl"))
-        explainer = shap.KernelExplainer(model.predict_proba, background_data)
-    except Exception as exp_err:
-        logging.warning("No SHAP backgound available or Explainer load failed.")
-        explainer = None
-    READY = True
-    logging.info("Model, Scaler, and Explainer loaded successfully.")
+    # Memory-mapped model bundle when present, the separate pickles otherwise.
+    # shap is imported on the first explanation request, or at startup with EXPLAIN_WARMUP=1
+    _load_start = time.perf_counter()
+    models.load(warm_explainer=os.environ.get("EXPLAIN_WARMUP") == "1")
+    STARTUP["model_load_seconds"] = round(time.perf_counter() - _load_start, 4)
+    logging.info(f"Model and scaler loaded successfully ({STARTUP}).")
 except Exception as e:
     logging.warning(f"Failed to load ML models. Run train.py first! Details: {str(e)}")
-    READY = False
-    feature_columns = []
+# Also picks up the first model when the service started before training
+models.start()
+
+# Other model versions (MODEL_VARIANTS) take a MODEL_TRAFFIC share of the
+# scoring requests; MODEL_SHADOW names one that shadow-scores all of them
+router = serving.ModelRouter.from_env(models, on_variant_swap=_variant_swapped).start()
+
+explanation_jobs = ExplanationJobs.from_env(
+    lambda served, scaled, raw: explain_rows(served, scaled, raw, "explanation_job")[0])
+
+def active_model(split=False):
+    """The model version serving this request, fixed at its first use.
+
+    Scoring endpoints pass split=True to take part in the MODEL_TRAFFIC split;
+    an X-Model-Variant header pins a variant either way.
+    """
+    if "served" not in g:
+        g.variant, g.served = router.route(request.headers.get("X-Model-Variant"), split=split)
+    return g.served
+
+@app.before_request
+def _start_request_metrics():
+    g.metrics_endpoint = request.endpoint or "unmatched"
+    g.metrics_start = time.perf_counter()
+    IN_FLIGHT.labels(g.metrics_endpoint).inc()
+
+@app.before_request
+def _start_profile():
+    requested = _flag(request.headers.get("X-Profile", request.args.get("profile")), default=False)
+    if requested and not profiler.authorized(request.headers.get("X-Profile-Token")):
+        g.profile_status = "denied"
+    elif requested or profiler.sampled():
+        g.profile = profiler.begin(request.endpoint or "unmatched")
+        g.profile_status = "busy" if g.profile is None else "profiled"
+        # Sampled requests only leave side files; explicit ones also get headers
+        g.profile_headers = requested
+
+@app.after_request
+def _finish_profile(response):
+    profile = g.pop("profile", None)
+    if profile is not None:
+        profiler.end(profile)
+        if g.get("profile_headers"):
+            response.headers["Server-Timing"] = profile.server_timing()
+            response.headers["X-Profile-Id"] = profile.id
+    if g.get("profile_headers") or g.get("profile_status") == "denied":
+        response.headers["X-Profile-Status"] = g.profile_status
+    return response
+
+@app.after_request
+def _model_version_header(response):
+    served = g.get("served") or models.current
+    if served is not None:
+        response.headers["X-Model-Version"] = served.version
+        response.headers["X-Model-Variant"] = g.get("variant", serving.PRIMARY)
+    return response
+
+@app.after_request
+def _cache_headers(response):
+    if "cache_rows" in g:
+        hits, rows = g.cache_hits, g.cache_rows
+        response.headers["X-Cache"] = ("bypass" if g.cache_bypass else
+                                       "hit" if hits == rows else "miss" if hits == 0 else "partial")
+        response.headers["X-Cache-Hits"] = f"{hits}/{rows}"
+    return response
+
+@app.after_request
+def _record_request_metrics(response):
+    endpoint = g.get("metrics_endpoint", "unmatched")
+    if "metrics_start" in g:
+        REQUEST_SECONDS.labels(endpoint).observe(time.perf_counter() - g.metrics_start)
+    REQUESTS.labels(endpoint, response.status_code).inc()
+    if response.status_code >= 400:
+        REQUEST_ERRORS.labels(endpoint, response.status_code).inc()
+    return response
+
+@app.teardown_request
+def _finish_request_metrics(exc):
+    if "metrics_start" in g:
+        IN_FLIGHT.labels(g.metrics_endpoint).dec()
+    # Only left over when an after_request hook failed; release the profiler
+    profile = g.pop("profile", None)
+    if profile is not None:
+        profiler.end(profile, save=False)
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(service_metrics.render(), content_type=service_metrics.CONTENT_TYPE)
 
 @app.route('/health', methods=['GET'])
 def health():
-    return jsonify({"status": "ok" if READY else "starting"}), 200
+    served = active_model()
+    if served is not None and served.explanations_enabled:
+        STARTUP["shap_import_seconds"] = explainers.SHAP_IMPORT_SECONDS
+    return jsonify({
+        "status": "ok" if served is not None else "starting",
+        "model_version": served.version if served is not None else None,
+        "model": models.status(),
+        "variants": router.status(),
+        "shadow": shadow_scorer.stats() if router.shadow else None,
+        "response_cache": response_cache.stats(),
+        "micro_batch": micro_batcher.stats() if micro_batcher is not None else None,
+        "startup": STARTUP,
+    }), 200
 
 @app.route('/model_metrics', methods=['GET'])
 def get_metrics():
-    # Metrics statically matching the recent MLPClassifier Neural Network output
+    # Test-set metrics and global SHAP importance computed by train.py for the loaded model
+    served = active_model()
+    metrics = served.evaluation_summary() if served is not None else None
+    if metrics is None:
+        return jsonify({"success": False, "message": "No evaluation metrics for the loaded model. Run train.py first."}), 503
     return jsonify({
         "success": True,
-        "metrics": {
-            "auc_roc": 0.974, 
-            "recall": 0.989,
-            "f1_score": 0.904,
-            "precision": 0.830
-        },
+        "metrics": metrics,
+        "model_version": served.version,
         "message": "Neural Network Live Metrics"
     })
 
+MAX_BATCH_ROWS = int(os.environ.get("MAX_BATCH_ROWS", "10000"))
+# "sync" (default) explains inline; "async" returns the score first. A request
+# can override with ?explain=async or ?explain=sync.
+EXPLAIN_MODE = os.environ.get("EXPLAIN_MODE", "sync")
+MAX_LONG_POLL_SECONDS = float(os.environ.get("MAX_LONG_POLL_SECONDS", "30"))
+
+def _shadow_compared(record):
+    labels = (record["primary_version"], record["shadow_version"])
+    SHADOW_ROWS.labels(*labels).inc(record["rows"])
+    SHADOW_LEVEL_CHANGES.labels(*labels).inc(record["risk_level_changes"])
+    SHADOW_ABS_DIFF.labels(*labels).observe(record["mean_abs_diff"])
+
+shadow_scorer = ShadowScorer.from_env(risk_level_for, on_compare=_shadow_compared)
+
+def shadow_score(endpoint, served, records, X, probs):
+    """Compare the served scores with the MODEL_SHADOW variant, off the response path."""
+    shadow = router.shadow_model()
+    if shadow is not None and shadow is not served:
+        if not shadow_scorer.submit(endpoint, served, shadow, records, X, probs):
+            SHADOW_DROPPED.inc()
+
+def cached_results(served, X, explained, endpoint):
+    """(keys, cached result or None per row); keys is None when the response cache is off.
+
+    `Cache-Control: no-cache` skips the lookup; fresh results are still stored.
+    """
+    if not response_cache.enabled:
+        return None, [None] * len(X)
+    keys = [response_cache.key_for(served, row, explained) for row in X]
+    g.cache_bypass = "no-cache" in request.headers.get("Cache-Control", "")
+    hits = [None] * len(keys) if g.cache_bypass else [response_cache.get(key) for key in keys]
+    g.cache_rows, g.cache_hits = len(keys), sum(hit is not None for hit in hits)
+    if not g.cache_bypass:
+        RESPONSE_CACHE_ROWS.labels(endpoint, "hit").inc(g.cache_hits)
+        RESPONSE_CACHE_ROWS.labels(endpoint, "miss").inc(g.cache_rows - g.cache_hits)
+        RESPONSE_CACHE_HIT_RATIO.set(response_cache.hit_rate())
+    return keys, hits
+
+def store_result(key, result):
+    if key is not None:
+        response_cache.put(key, result)
+        RESPONSE_CACHE_ENTRIES.set(len(response_cache.results))
+
+def explain_rows(served, scaled_features, raw_features, endpoint):
+    with stage(endpoint, "shap"):
+        return served.explain(scaled_features, raw_features)
+
+def run_micro_batch(served, X, explain):
+    """One scale + predict_proba (+ SHAP) for a micro-batch; (prob, scaled row, factors) per row."""
+    with stage("micro_batch", "predict_proba"):
+        proba, scaled_features = served.engine.score(X)
+    probs = proba[:, 1]
+    factors = explain_rows(served, scaled_features, X, "micro_batch") if explain else [None] * len(X)
+    return [(probs[r], scaled_features[r:r + 1], factors[r]) for r in range(len(X))]
+
+def _micro_batch_done(rows, queue_delays):
+    MICRO_BATCH_ROWS.observe(rows)
+    for delay in queue_delays:
+        MICRO_BATCH_QUEUE_SECONDS.observe(delay)
+
+# Optional (MICRO_BATCH=1): concurrent /predict calls share one vectorized
+# scale + predict_proba and one SHAP call (micro_batch.py)
+micro_batcher = MicroBatcher.from_env(run_micro_batch, on_batch=_micro_batch_done)
+
+@app.route('/explanations/<explanation_id>', methods=['GET'])
+def get_explanation(explanation_id):
+    """Poll for an async explanation; ?wait=<seconds> long-polls while pending."""
+    served = active_model()
+    if served is None:
+        return jsonify({"success": False, "error": "Model not trained. Run train.py first."}), 503
+    try:
+        wait = min(max(float(request.args.get("wait", 0)), 0.0), MAX_LONG_POLL_SECONDS)
+    except ValueError:
+        return jsonify({"success": False, "error": "wait must be a number of seconds."}), 400
+
+    state = explanation_jobs.get(explanation_id, wait=wait)
+    if state is None:
+        return jsonify({"success": False, "error": "Unknown or expired explanation id."}), 404
+    code = 202 if state["status"] == "pending" else 200
+    return jsonify({"success": state["status"] != "failed", "explanation_id": explanation_id, **state}), code
+
+def _flag(value, default=True):
+    if value is None:
+        return default
+    return str(value).strip().lower() not in ("0", "false", "no", "off")
+
 @app.route('/predict', methods=['POST'])
 def predict():
-    if not READY:
+    served = active_model(split=True)
+    if served is None:
         return jsonify({"success": False, "error": "Model not trained. Run train.py first."}), 503
-        
+
     try:
-        data = request.json
-        
-        # Build raw dataframe row from input
-        row_dict = {col: 0.0 for col in feature_columns}
-        
-        # Clean up input_data first to convert numeric categorical IDs from the web UI to strings
-        if 'smoking_status' in data:
-            ss = str(data['smoking_status'])
-            if ss == '0': data['smoking_status'] = 'Non-Smoker'
-            elif ss == '1': data['smoking_status'] = 'Former Smoker'
-            elif ss == '2': data['smoking_status'] = 'Smoker'
-            
-        # Manually map numerical inputs
-        for k, v in data.items():
-            if k in row_dict:
-                try:
-                    row_dict[k] = float(v) if v is not None else 0.0
-                except (ValueError, TypeError):
-                    pass
-                    
-        # Handle Categorical Dummy Columns Generically
-        for k, v in data.items():
-            if v is None: continue
-            # Try to match dummy columns like k_v (case-insensitive)
-            search_prefix = f"{k}_"
-            for col in feature_columns:
-                if col.lower().startswith(search_prefix.lower()):
-                    val_part = col[len(search_prefix):]
-                    if val_part.lower() == str(v).lower():
-                        row_dict[col] = 1.0
-
-        # Special handling for sex-specific engineered flags
-        sex_input = str(data.get("sex", "male")).strip().lower()
-
-        # Feature Engineering (NLR, PLR, MLR, Flags)
-        wbc = data.get("wbc_count", 0)
-        neut_pct = data.get("neutrophil_pct", 0)
-        lymph_pct = data.get("lymphocyte_pct", 0)
-        platelets = data.get("platelet_count", 0)
-        hemoglobin = data.get("hemoglobin", 0)
-
-        # Convert to float safely
-        try:
-            wbc_f = float(wbc) if wbc else 0
-            neut_f = float(neut_pct) if neut_pct else 0
-            lymph_f = float(lymph_pct) if lymph_pct else 1e-9
-            plat_f = float(platelets) if platelets else 0
-            hemo_f = float(hemoglobin) if hemoglobin else 0
-        except Exception:
-            wbc_f, neut_f, lymph_f, plat_f, hemo_f = 0, 0, 1e-9, 0, 0
-        
-        neut_count = (neut_f / 100.0) * wbc_f if wbc_f else 0
-        lymph_count = (lymph_f / 100.0) * wbc_f if wbc_f else 1e-9
-        
-        if "neutrophil_count" in row_dict:
-            row_dict["neutrophil_count"] = neut_count
-        if "lymphocyte_count" in row_dict:
-            row_dict["lymphocyte_count"] = lymph_count
-            
-        if "NLR" in row_dict:
-            row_dict["NLR"] = neut_count / lymph_count
-        if "PLR" in row_dict:
-            row_dict["PLR"] = plat_f / lymph_count
-        if "MLR" in row_dict:
-            mono_pct = max(0, 100 - neut_f - lymph_f)
-            mono_count = (mono_pct / 100.0) * wbc_f if wbc_f else 0
-            if "monocyte_count" in row_dict:
-                row_dict["monocyte_count"] = mono_count
-            row_dict["MLR"] = mono_count / lymph_count
-            
-        if "anemia_flag" in row_dict:
-            row_dict["anemia_flag"] = 1 if ((sex_input == 'female' and hemo_f < 12) or (sex_input == 'male' and hemo_f < 13.5)) else 0
-        if "thrombocytosis_flag" in row_dict:
-            row_dict["thrombocytosis_flag"] = 1 if plat_f > 400 else 0
-        if "high_nlr_flag" in row_dict:
-            row_dict["high_nlr_flag"] = 1 if row_dict.get("NLR", 0) > 3.0 else 0
-            
-        df = pd.DataFrame([row_dict])
-        
-        # Sort cols to exact match
-        df = df[feature_columns]
-        
-        # Scale
-        scaled_features = scaler.transform(df)
-        
-        # Predict
-        prob = model.predict_proba(scaled_features)[0][1]
-        
-        risk_level = "High" if prob >= 0.60 else ("Medium" if prob >= 0.25 else "Low")
-        
-        if explainer:
-            shap_vals = explainer.shap_values(scaled_features)
-            # KernelExplainer on predict_proba returns [shape_for_class0, shape_for_class1]
-            if isinstance(shap_vals, list) and len(shap_vals) > 1:
-                class1_shap = shap_vals[1][0]
-            else:
-                class1_shap = shap_vals[0]
-            
-            # Build Shap Dictionary matching feature cols
-            for i, col in enumerate(feature_columns):
-                val = class1_shap[i]
-                if abs(val) > 0.001:
-                    feature_impacts.append({
-                        "feature": col,
-                        "value": round(float(df.iloc[0, i]), 3),
-                        "impact": "increases risk" if val > 0 else "decreases risk",
-                        "shap_value": round(float(val), 4)
-                    })
-                    
-            feature_impacts.sort(key=lambda x: abs(x["shap_value"]), reverse=True)
-            top_factors = feature_impacts[:3]
+        with stage("predict", "parse"):
+            data = request.json
+
+        with stage("predict", "features"):
+            X = served.transformer.transform_records([data])
+        invalid = served.transformer.invalid_rows(X)
+        if invalid:
+            return jsonify({"success": False, "error": invalid[0]}), 400
+
+        explain_mode = request.args.get("explain", EXPLAIN_MODE)
+
+        # A complete earlier result for the same normalized input and model version
+        keys, hits = cached_results(served, X, served.explanations_enabled, "predict")
+        if hits[0] is not None:
+            response = {"success": True, **hits[0], "model_version": served.version}
+            if served.explanations_enabled and explain_mode == "async":
+                response["explanation_status"] = "done"
+            return jsonify(response), 200
+
+        factors = None
+        if micro_batcher is not None:
+            # Scored (and explained, in sync mode) together with concurrent requests
+            with stage("predict", "micro_batch"):
+                prob, scaled_features, factors = micro_batcher.submit(
+                    served, X, served.explanations_enabled and explain_mode != "async")[0]
         else:
-            top_factors = []
-        
+            # Predict (the engine applies the scaler itself and returns the scaled features for SHAP)
+            with stage("predict", "predict_proba"):
+                proba, scaled_features = served.engine.score(X)
+            prob = proba[0][1]
+        ROWS_SCORED.labels("predict").inc()
+        VARIANT_ROWS.labels(g.variant, served.version).inc()
+        shadow_score("predict", served, [data], X, [prob])
+
+        risk_level = risk_level_for(prob)
+
         response = {
             "success": True,
             "risk_score": round(prob * 100, 1),
             "risk_level": risk_level,
-            "top_factors": top_factors
+            "top_factors": [],
+            "model_version": served.version
         }
-        
+        # Results are cached once complete: async answers without factors are not
+        complete = not served.explanations_enabled
+
+        if served.explanations_enabled and explain_mode == "async":
+            # Opt-in: answer with the score now, explanation follows via /explanations/<id>
+            cached = served.explain_cache.lookup(scaled_features)
+            if cached is not None:
+                response["top_factors"] = served.format_factors(cached, X)[0]
+                response["explanation_status"] = "done"
+                complete = True
+            else:
+                job_id, status = explanation_jobs.submit(served, scaled_features, X)
+                response["explanation_id"] = job_id
+                response["explanation_status"] = status
+        elif served.explanations_enabled:
+            if factors is None:
+                factors = explain_rows(served, scaled_features, X, "predict")[0]
+            response["top_factors"] = factors
+            complete = True
+
+        if complete and keys is not None:
+            store_result(keys[0], {k: response[k] for k in ("risk_score", "risk_level", "top_factors")})
         return jsonify(response), 200
 
     except Exception as e:
         logging.error(f"Prediction Error: {e}")
         return jsonify({"success": False, "error": str(e)}), 400
 
+@app.route('/predict_batch', methods=['POST'])
+def predict_batch():
+    """Score many patients with one vectorized forward pass.
+
+    Accepts a JSON array of payloads, {"patients": [...], "explain": bool}, or
+    NDJSON (one payload per line). Pass explain=false (body or query string)
+    to skip SHAP for maximum throughput.
+    """
+    served = active_model(split=True)
+    if served is None:
+        return jsonify({"success": False, "error": "Model not trained. Run train.py first."}), 503
+
+    explain = _flag(request.args.get("explain"))
+    results = {}
+    try:
+        with stage("predict_batch", "parse"):
+            if request.mimetype in ("application/x-ndjson", "application/jsonl"):
+                records = []
+                for n, line in enumerate(request.get_data(as_text=True).splitlines()):
+                    if not line.strip():
+                        continue
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError as e:
+                        records.append(None)
+                        results[len(records) - 1] = {"success": False, "error": f"Invalid JSON on line {n + 1}: {e}"}
+            else:
+                body = request.get_json(force=True)
+                if isinstance(body, dict):
+                    explain = _flag(body.get("explain", request.args.get("explain")))
+                    body = body.get("patients")
+                if not isinstance(body, list):
+                    return jsonify({"success": False, "error": "Expected a JSON array of patient payloads."}), 400
+                records = body
+    except Exception as e:
+        return jsonify({"success": False, "error": f"Could not parse request body: {e}"}), 400
+
+    if len(records) > MAX_BATCH_ROWS:
+        return jsonify({"success": False, "error": f"Batch exceeds MAX_BATCH_ROWS={MAX_BATCH_ROWS}."}), 413
+
+    valid = []
+    for i, data in enumerate(records):
+        if i in results:
+            continue
+        if isinstance(data, dict):
+            valid.append(i)
+        else:
+            results[i] = {"success": False, "error": "Patient payload must be a JSON object."}
+
+    try:
+        if valid:
+            with stage("predict_batch", "features"):
+                X = served.transformer.transform_records([records[i] for i in valid])
+            invalid = served.transformer.invalid_rows(X)
+            if invalid:
+                for r, error in invalid.items():
+                    results[valid[r]] = {"success": False, "error": error}
+                keep = [r for r in range(len(valid)) if r not in invalid]
+                valid, X = [valid[r] for r in keep], X[keep]
+            explained = explain and served.explanations_enabled
+            keys, hits = cached_results(served, X, explained, "predict_batch")
+            for r, hit in enumerate(hits):
+                if hit is not None:
+                    results[valid[r]] = {"success": True, **hit}
+            # Only the rows without a cached result are scored and explained
+            todo = [r for r, hit in enumerate(hits) if hit is None]
+            if todo:
+                X = X if len(todo) == len(valid) else X[todo]
+                with stage("predict_batch", "predict_proba"):
+                    proba, scaled_features = served.engine.score(X)
+                probs = proba[:, 1]
+                ROWS_SCORED.labels("predict_batch").inc(len(todo))
+                VARIANT_ROWS.labels(g.variant, served.version).inc(len(todo))
+                shadow_score("predict_batch", served, [records[valid[r]] for r in todo], X, probs)
+
+                factors = [[] for _ in todo]
+                complete = True
+                if explained:
+                    try:
+                        factors = explain_rows(served, scaled_features, X, "predict_batch")
+                    except Exception as shap_e:
+                        logging.warning(f"Batch SHAP failed, returning scores only: {shap_e}")
+                        complete = False
+
+                for n, r in enumerate(todo):
+                    prob = float(probs[n])
+                    result = {
+                        "risk_score": round(prob * 100, 1),
+                        "risk_level": risk_level_for(prob),
+                        "top_factors": factors[n]
+                    }
+                    results[valid[r]] = {"success": True, **result}
+                    if complete and keys is not None:
+                        store_result(keys[r], result)
+    except Exception as e:
+        logging.error(f"Batch Prediction Error: {e}")
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    return jsonify({
+        "success": True,
+        "model_version": served.version,
+        "count": len(records),
+        "errors": sum(1 for res in results.values() if not res["success"]),
+        "results": [{"index": i, **results[i]} for i in range(len(records))]
+    }), 200
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
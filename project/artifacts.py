@@ -0,0 +1,101 @@
+"""Loads everything serving needs, from the model bundle or the legacy pickles.
+
+app.py and predict_cli.py both go through load_artifacts(). With
+MODEL_FORMAT=auto (the default) the memory-mapped model/model_bundle.bin is
+used when present; otherwise, or with MODEL_FORMAT=pickle, the four separate
+files are loaded as before. Requesting INFERENCE_ENGINE=sklearn also forces
+the pickles, since the bundle carries no sklearn objects.
+"""
+import os
+import json
+import logging
+from bundle import ModelBundle, bundle_path, read_preprocessing
+from features import FeatureTransformer
+from inference import load_engine
+
+_SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_DIR = os.path.join(_SCRIPT_DIR, "model")
+
+class ModelArtifacts:
+    """One loaded model version.
+
+    `engine` scores raw feature rows; `model` scores standardized rows and is
+    what the SHAP explainer wraps; `background` is the explainer's reference set.
+    """
+
+    def __init__(self, engine, model, background, feature_columns, version, fingerprint,
+                 metrics=None, thresholds=None, source="pickle", bundle=None, scaler=None, preprocessing=None):
+        self.engine = engine
+        self.model = model
+        self.background = background
+        self.transformer = FeatureTransformer(feature_columns, preprocessing=preprocessing)
+        self.feature_columns = self.transformer.feature_columns
+        self.version = version
+        self.fingerprint = fingerprint
+        self.metrics = metrics or {}
+        self.thresholds = thresholds or {}
+        self.source = source
+        self.bundle = bundle
+        self.scaler = scaler
+
+def _read_metrics(model_dir):
+    path = os.path.join(model_dir, "metrics.json")
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+def _load_bundle(path, dtype, verify):
+    bundle = ModelBundle(path, verify=verify)
+    return ModelArtifacts(
+        engine=bundle.engine(dtype=dtype),
+        model=bundle.scaled_model(),
+        background=bundle.arrays.get("background"),
+        feature_columns=bundle.feature_columns,
+        version=bundle.version,
+        fingerprint=bundle.checksum,
+        metrics=bundle.header.get("metrics"),
+        thresholds=bundle.header.get("thresholds"),
+        source="bundle",
+        bundle=bundle,
+        preprocessing=bundle.preprocessing,
+    )
+
+def _load_pickles(model_dir, engine, dtype):
+    import joblib
+    from explain_cache import model_fingerprint
+    model = joblib.load(os.path.join(model_dir, "cancer_risk_model.pkl"))
+    scaler = joblib.load(os.path.join(model_dir, "scaler.pkl"))
+    try:
+        background = joblib.load(os.path.join(model_dir, "background.pkl"))
+    except Exception:
+        logging.warning("No SHAP background available.")
+        background = None
+    with open(os.path.join(model_dir, "feature_columns.json"), "r") as f:
+        feature_columns = json.load(f)
+    metrics = _read_metrics(model_dir)
+    return ModelArtifacts(
+        engine=load_engine(model, scaler, kind=engine, dtype=dtype),
+        model=model,
+        background=background,
+        feature_columns=feature_columns,
+        version=str(metrics.get("model_version", "unversioned")),
+        fingerprint=model_fingerprint(model, scaler, background),
+        metrics=metrics,
+        thresholds={"decision": metrics.get("threshold", 0.30)},
+        source="pickle",
+        scaler=scaler,
+        preprocessing=read_preprocessing(model_dir),
+    )
+
+def load_artifacts(model_dir=MODEL_DIR, engine=None, dtype=None, model_format=None):
+    engine = engine or os.environ.get("INFERENCE_ENGINE", "numpy")
+    dtype = dtype or os.environ.get("INFERENCE_DTYPE", "float64")
+    model_format = model_format or os.environ.get("MODEL_FORMAT", "auto")
+    verify = os.environ.get("MODEL_BUNDLE_VERIFY", "1") != "0"
+
+    path = bundle_path(model_dir)
+    use_bundle = engine == "numpy" and (model_format == "bundle" or (model_format == "auto" and os.path.exists(path)))
+    if use_bundle:
+        return _load_bundle(path, dtype, verify)
+    return _load_pickles(model_dir, engine, dtype)
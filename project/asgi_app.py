@@ -0,0 +1,391 @@
+"""Asyncio (ASGI) serving entry point with app.py's /health, /predict and /model_metrics contract.
+
+    uvicorn asgi_app:app --host 0.0.0.0 --port 5000
+    python asgi_app.py [--host HOST] [--port PORT]      (runs uvicorn; pip install uvicorn)
+
+The event loop only reads requests and writes responses. Feature building,
+predict_proba and scaling run on a thread pool; SHAP explanations run on a
+separate process pool, so a slow KernelExplainer call neither blocks the loop
+nor holds the GIL the scoring threads need. Each explanation worker receives
+a model version's weights and background once; after that a request sends it
+only the model fingerprint and the scaled rows. Models are loaded and
+hot-reloaded by serving.ModelManager exactly as in app.py.
+
+Admission control: at most ASGI_MAX_INFLIGHT /predict requests are admitted;
+beyond that the service answers 503 with Retry-After instead of queueing.
+Explanations have their own bound (ASGI_MAX_EXPLAIN): when it is reached the
+score is still returned, with "explanation_status": "skipped".
+
+Deadlines: every /predict gets ASGI_DEADLINE_MS, or the client's X-Deadline-Ms
+(capped at ASGI_MAX_DEADLINE_MS). Scoring past the deadline answers 504; an
+explanation past it returns the score with "explanation_status": "timeout",
+and the explanation is still cached when it finishes so a retry is fast.
+A failed explanation returns the score with "explanation_status": "failed".
+
+Graceful shutdown (the ASGI lifespan shutdown uvicorn sends on SIGTERM/SIGINT):
+new requests get 503, in-flight ones get ASGI_SHUTDOWN_GRACE seconds to
+finish, then the model watcher and both pools stop.
+
+Configuration (environment):
+    ASGI_SCORING_THREADS    threads for features + predict_proba        (default 4)
+    ASGI_EXPLAIN_PROCESSES  SHAP worker processes                       (default 2)
+    ASGI_MAX_INFLIGHT       admitted /predict requests                  (default 256)
+    ASGI_MAX_EXPLAIN        explanations queued or running              (default 16)
+    ASGI_DEADLINE_MS        default /predict deadline                   (default 5000)
+    ASGI_MAX_DEADLINE_MS    cap for X-Deadline-Ms                       (default 30000)
+    ASGI_SHUTDOWN_GRACE     seconds in-flight requests get at shutdown  (default 20)
+    ASGI_MAX_BODY_BYTES     largest accepted request body               (default 1048576)
+"""
+import time
+_IMPORT_START = time.perf_counter()
+import os
+import sys
+import json
+import asyncio
+import logging
+import argparse
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import numpy as np
+import explainers
+import serving
+from serving import risk_level_for
+
+logging.basicConfig(level=logging.INFO)
+
+_SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_DIR = os.path.join(_SCRIPT_DIR, "model")
+
+# Explainers cached per worker process, keyed by model fingerprint
+_worker_explainers = {}
+
+def _init_explain_worker():
+    from threadpoolctl import threadpool_limits
+    # One BLAS thread per process; the pool provides the parallelism
+    threadpool_limits(1)
+    logging.getLogger("shap").setLevel(logging.WARNING)
+    # Pay the shap import when the pool starts, not on the first explanation
+    if os.environ.get("EXPLAINER", "kernel") == "kernel":
+        explainers.shap_module()
+
+def _explain_in_worker(fingerprint, scaled_features, model=None, background=None):
+    """Class-1 SHAP matrix, or None when this worker has no explainer for `fingerprint` yet.
+
+    Requests carry only the fingerprint and the rows; the model and background
+    are sent (once per worker and model version) only after a None.
+    """
+    explainer = _worker_explainers.get(fingerprint)
+    if explainer is None:
+        if model is None:
+            return None
+        # Only the newest model version is kept
+        _worker_explainers.clear()
+        explainer = _worker_explainers[fingerprint] = explainers.make_explainer(model, background)
+    return explainers.class1_values(explainer.shap_values(scaled_features, silent=True), len(scaled_features))
+
+def _noop():
+    return None
+
+def _score(served, data):
+    """Runs on the scoring pool: (probability, features, scaled features, cached SHAP or None)."""
+    X = served.transformer.transform_records([data])
+    invalid = served.transformer.invalid_rows(X)
+    if invalid:
+        raise ValueError(invalid[0])
+    proba, scaled_features = served.engine.score(X)
+    prob = float(proba[0][1])
+    cached = served.explain_cache.lookup(scaled_features) if served.explanations_enabled else None
+    return prob, X, scaled_features, cached
+
+def _jsonable(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+class _BodyTooLarge(Exception):
+    pass
+
+async def _read_body(receive, limit):
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise ConnectionError("Client disconnected")
+        body = message.get("body", b"")
+        size += len(body)
+        if size > limit:
+            raise _BodyTooLarge()
+        chunks.append(body)
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+async def _send_json(send, status, body, headers=()):
+    payload = json.dumps(body, default=_jsonable).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(payload)).encode()),
+                    (b"access-control-allow-origin", b"*")] + [(k.encode(), v.encode()) for k, v in headers],
+    })
+    await send({"type": "http.response.body", "body": payload})
+
+class PredictionService:
+    """The ASGI application: `app = PredictionService()`."""
+
+    def __init__(self, model_dir=MODEL_DIR):
+        self.scoring_threads = int(os.environ.get("ASGI_SCORING_THREADS", "4"))
+        self.explain_processes = int(os.environ.get("ASGI_EXPLAIN_PROCESSES", "2"))
+        self.max_inflight = int(os.environ.get("ASGI_MAX_INFLIGHT", "256"))
+        self.max_explain = int(os.environ.get("ASGI_MAX_EXPLAIN", "16"))
+        self.deadline = float(os.environ.get("ASGI_DEADLINE_MS", "5000")) / 1000
+        self.max_deadline = float(os.environ.get("ASGI_MAX_DEADLINE_MS", "30000")) / 1000
+        self.shutdown_grace = float(os.environ.get("ASGI_SHUTDOWN_GRACE", "20"))
+        self.max_body_bytes = int(os.environ.get("ASGI_MAX_BODY_BYTES", str(1024 * 1024)))
+        self.models = serving.ModelManager(model_dir)
+        self.startup_times = {"import_seconds": round(time.perf_counter() - _IMPORT_START, 4)}
+        self.scoring_pool = None
+        self.explain_pool = None
+        self.started = False
+        self.draining = False
+        self.inflight = 0
+        self.explaining = 0
+        self.rejected = 0
+        self.deadline_misses = 0
+        self.explanations_skipped = 0
+        self.model_shipments = 0
+        self._idle = None
+        self._start_lock = None
+
+    async def startup(self):
+        if self.started:
+            return
+        loop = asyncio.get_running_loop()
+        # Fork the explanation workers first, while this process has no other threads
+        context = multiprocessing.get_context("fork") if "fork" in multiprocessing.get_all_start_methods() else None
+        self.explain_pool = ProcessPoolExecutor(max_workers=self.explain_processes, mp_context=context,
+                                                initializer=_init_explain_worker)
+        for _ in range(self.explain_processes):
+            self.explain_pool.submit(_noop)
+        self.scoring_pool = ThreadPoolExecutor(max_workers=self.scoring_threads, thread_name_prefix="scoring")
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+        load_start = time.perf_counter()
+        try:
+            served = await loop.run_in_executor(self.scoring_pool, self.models.load)
+            self.startup_times["model_load_seconds"] = round(time.perf_counter() - load_start, 4)
+            logging.info(f"Model {served.version} loaded from {served.source} (inference engine: {served.engine.kind})")
+        except Exception as e:
+            logging.warning(f"Failed to load ML models. Run train.py first! Details: {str(e)}")
+        self.models.start()
+        self.started = True
+
+    async def shutdown(self):
+        self.draining = True
+        if self.inflight:
+            logging.info(f"Draining {self.inflight} in-flight requests (up to {self.shutdown_grace}s)")
+            try:
+                await asyncio.wait_for(self._idle.wait(), self.shutdown_grace)
+            except asyncio.TimeoutError:
+                logging.warning(f"Shutting down with {self.inflight} requests still in flight")
+        self.models.stop()
+        if self.scoring_pool is not None:
+            self.scoring_pool.shutdown(wait=True)
+        if self.explain_pool is not None:
+            self.explain_pool.shutdown(wait=True, cancel_futures=True)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+        if not self.started:
+            # Servers without lifespan support start the pools on the first request
+            self._start_lock = self._start_lock or asyncio.Lock()
+            async with self._start_lock:
+                await self.startup()
+
+        method, path = scope["method"], scope["path"].rstrip("/") or "/"
+        if method == "OPTIONS":
+            await send({"type": "http.response.start", "status": 204, "headers": [
+                (b"access-control-allow-origin", b"*"), (b"access-control-allow-methods", b"GET, POST, OPTIONS"),
+                (b"access-control-allow-headers", b"content-type, x-deadline-ms")]})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        routes = {("GET", "/health"): self.health, ("GET", "/model_metrics"): self.model_metrics,
+                  ("POST", "/predict"): self.predict}
+        handler = routes.get((method, path))
+        if handler is None:
+            known = any(route_path == path for _, route_path in routes)
+            await _send_json(send, 405 if known else 404,
+                             {"success": False, "error": "Method not allowed." if known else "Not found."})
+            return
+        served = self.models.current
+        status, body, headers = await handler(served, scope, receive)
+        if served is not None:
+            headers = list(headers) + [("x-model-version", served.version)]
+        await _send_json(send, status, body, headers)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    await self.startup()
+                except Exception as e:
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def health(self, served, scope, receive):
+        status = "draining" if self.draining else ("ok" if served is not None else "starting")
+        return 200, {
+            "status": status,
+            "model_version": served.version if served is not None else None,
+            "model": self.models.status(),
+            "startup": self.startup_times,
+            "server": {
+                "inflight": self.inflight,
+                "max_inflight": self.max_inflight,
+                "explaining": self.explaining,
+                "max_explain": self.max_explain,
+                "rejected": self.rejected,
+                "deadline_misses": self.deadline_misses,
+                "explanations_skipped": self.explanations_skipped,
+                "model_shipments": self.model_shipments,
+                "scoring_threads": self.scoring_threads,
+                "explain_processes": self.explain_processes,
+            },
+        }, ()
+
+    async def model_metrics(self, served, scope, receive):
+        metrics = served.evaluation_summary() if served is not None else None
+        if metrics is None:
+            return 503, {"success": False, "message": "No evaluation metrics for the loaded model. Run train.py first."}, ()
+        return 200, {"success": True, "metrics": metrics, "model_version": served.version,
+                     "message": "Neural Network Live Metrics"}, ()
+
+    def _budget(self, scope):
+        for name, value in scope.get("headers", ()):
+            if name == b"x-deadline-ms":
+                try:
+                    return min(max(float(value) / 1000, 0.0), self.max_deadline)
+                except ValueError:
+                    break
+        return self.deadline
+
+    async def predict(self, served, scope, receive):
+        if served is None:
+            return 503, {"success": False, "error": "Model not trained. Run train.py first."}, ()
+        if self.draining:
+            return 503, {"success": False, "error": "Server is shutting down."}, (("retry-after", "1"),)
+        if self.inflight >= self.max_inflight:
+            self.rejected += 1
+            return 503, {"success": False, "error": "Server busy, retry shortly."}, (("retry-after", "1"),)
+        self.inflight += 1
+        self._idle.clear()
+        try:
+            return await self._predict(served, scope, receive)
+        finally:
+            self.inflight -= 1
+            if self.inflight == 0:
+                self._idle.set()
+
+    async def _predict(self, served, scope, receive):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self._budget(scope)
+        try:
+            data = json.loads(await _read_body(receive, self.max_body_bytes))
+        except _BodyTooLarge:
+            return 413, {"success": False, "error": f"Body exceeds ASGI_MAX_BODY_BYTES={self.max_body_bytes}."}, ()
+        except ValueError as e:
+            return 400, {"success": False, "error": f"Invalid JSON: {e}"}, ()
+
+        try:
+            prob, X, scaled_features, cached = await asyncio.wait_for(
+                loop.run_in_executor(self.scoring_pool, _score, served, data), max(deadline - loop.time(), 0))
+        except asyncio.TimeoutError:
+            self.deadline_misses += 1
+            return 504, {"success": False, "error": "Deadline exceeded while scoring."}, ()
+        except Exception as e:
+            logging.error(f"Prediction Error: {e}")
+            return 400, {"success": False, "error": str(e)}, ()
+
+        response = {
+            "success": True,
+            "risk_score": round(prob * 100, 1),
+            "risk_level": risk_level_for(prob),
+            "top_factors": [],
+            "model_version": served.version
+        }
+        if served.explanations_enabled:
+            if cached is None:
+                cached, status = await self._explain(served, scaled_features, deadline)
+                if status != "done":
+                    response["explanation_status"] = status
+            if cached is not None:
+                response["top_factors"] = served.format_factors(cached, X)[0]
+        return 200, response, ()
+
+    async def _explain(self, served, scaled_features, deadline):
+        """(class-1 SHAP matrix or None, status) from the process pool, within the deadline."""
+        if self.explaining >= self.max_explain:
+            self.explanations_skipped += 1
+            return None, "skipped"
+        loop = asyncio.get_running_loop()
+        self.explaining += 1
+        future = asyncio.ensure_future(self._explain_in_pool(served, scaled_features))
+        future.add_done_callback(lambda done: self._explained(served, scaled_features, done))
+        try:
+            # shield: a request that gives up leaves the computation running to fill the cache
+            return await asyncio.wait_for(asyncio.shield(future), max(deadline - loop.time(), 0)), "done"
+        except asyncio.TimeoutError:
+            self.deadline_misses += 1
+            return None, "timeout"
+        except Exception as e:
+            logging.warning(f"Explanation failed, returning the score only: {e}")
+            return None, "failed"
+
+    async def _explain_in_pool(self, served, scaled_features):
+        loop = asyncio.get_running_loop()
+        class1 = await loop.run_in_executor(self.explain_pool, _explain_in_worker, served.fingerprint, scaled_features)
+        if class1 is None:
+            # That worker has not seen this model version yet: send it along once
+            self.model_shipments += 1
+            class1 = await loop.run_in_executor(self.explain_pool, _explain_in_worker, served.fingerprint,
+                                                scaled_features, served.model, served.background)
+        return class1
+
+    def _explained(self, served, scaled_features, future):
+        self.explaining -= 1
+        if future.cancelled() or future.exception() is not None:
+            return
+        class1 = future.result()
+        try:
+            # The cache may write to SQLite; keep that off the event loop
+            self.scoring_pool.submit(served.explain_cache.explain, scaled_features, lambda rows: class1)
+        except RuntimeError:
+            # Scoring pool already shut down
+            pass
+
+app = PredictionService()
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the prediction API on an asyncio (ASGI) server.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    args = parser.parse_args()
+    try:
+        import uvicorn
+    except ImportError:
+        sys.exit("asgi_app.py needs an ASGI server: pip install uvicorn (or run asgi_app:app under another one).")
+    uvicorn.run(app, host=args.host, port=args.port, lifespan="on",
+                timeout_graceful_shutdown=int(app.shutdown_grace) + 5)
+
+if __name__ == "__main__":
+    main()
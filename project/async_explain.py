@@ -0,0 +1,126 @@
+"""Background SHAP explanations for the opt-in async /predict mode.
+
+The risk score is returned as soon as predict_proba finishes; the explanation
+is computed on a small worker pool and fetched later by id. Admission is
+bounded: once `max_pending` jobs are queued or running, new jobs are dropped
+(the caller still gets its score) instead of building an unbounded backlog.
+
+Configuration (environment):
+    EXPLAIN_WORKERS        worker threads computing SHAP  (default 2)
+    EXPLAIN_QUEUE          max queued + running jobs      (default 64)
+    EXPLAIN_RESULT_TTL     seconds results stay fetchable (default 600)
+"""
+import os
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from explain_cache import LRUCache
+
+PENDING, DONE, FAILED, DROPPED = "pending", "done", "failed", "dropped"
+
+class _Job:
+    __slots__ = ("status", "result", "error", "created", "finished", "done")
+
+    def __init__(self):
+        self.status = PENDING
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self.done = threading.Event()
+
+class ExplanationJobs:
+    """Bounded pool of explanation jobs with poll / long-poll lookup."""
+
+    def __init__(self, compute, max_workers=2, max_pending=64, result_ttl=600, max_results=10000):
+        self._compute = compute
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="explain")
+        self._jobs = LRUCache(max_entries=max_results, ttl=result_ttl)
+        self._lock = threading.Lock()
+        self.max_pending = max_pending
+        self.in_flight = 0
+        self.submitted = 0
+        self.dropped = 0
+        self.failed = 0
+
+    @classmethod
+    def from_env(cls, compute):
+        return cls(
+            compute,
+            max_workers=int(os.environ.get("EXPLAIN_WORKERS", "2")),
+            max_pending=int(os.environ.get("EXPLAIN_QUEUE", "64")),
+            result_ttl=float(os.environ.get("EXPLAIN_RESULT_TTL", "600")),
+        )
+
+    def submit(self, *args):
+        """Queue compute(*args). Returns (job_id, status); job_id is None when dropped."""
+        with self._lock:
+            if self.in_flight >= self.max_pending:
+                self.dropped += 1
+                return None, DROPPED
+            self.in_flight += 1
+            self.submitted += 1
+        job_id = uuid.uuid4().hex
+        job = _Job()
+        self._jobs.put(job_id, job)
+        try:
+            self._pool.submit(self._run, job, args)
+        except RuntimeError:
+            # Pool already shut down
+            self._release()
+            job.status, job.error = FAILED, "Explanation workers are shutting down."
+            job.done.set()
+        return job_id, PENDING
+
+    def _run(self, job, args):
+        try:
+            job.result = self._compute(*args)
+            job.status = DONE
+        except Exception as e:
+            logging.error(f"Background explanation failed: {e}")
+            job.error = str(e)
+            job.status = FAILED
+            with self._lock:
+                self.failed += 1
+        finally:
+            job.finished = time.time()
+            self._release()
+            job.done.set()
+
+    def _release(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def get(self, job_id, wait=0.0):
+        """Job state as a dict, or None for unknown/expired ids.
+
+        With `wait` > 0 this blocks up to that many seconds for a pending job
+        to finish (long-poll).
+        """
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        if wait > 0 and job.status == PENDING:
+            job.done.wait(wait)
+        state = {"status": job.status}
+        if job.status == DONE:
+            state["top_factors"] = job.result
+            state["compute_ms"] = round((job.finished - job.created) * 1000, 1)
+        elif job.status == FAILED:
+            state["error"] = job.error
+        return state
+
+    def stats(self):
+        with self._lock:
+            return {
+                "submitted": self.submitted,
+                "dropped": self.dropped,
+                "failed": self.failed,
+                "in_flight": self.in_flight,
+                "max_pending": self.max_pending,
+            }
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait, cancel_futures=not wait)
@@ -0,0 +1,292 @@
+"""Offline benchmark suite for the serving and training paths.
+
+Runs against the artifacts in model/ without starting a server (Flask's test
+client drives app.py in-process). Sections:
+
+    artifacts   load time of every model artifact, the bundle and load_artifacts()
+    predict     single-row /predict latency with and without SHAP
+    batch       rows/s through transformer + engine, and /predict_batch, at several batch sizes
+    cli         predict_cli.py end-to-end (fresh process) and --serve round-trip latency
+    startup     cold start of each entry point (see bench_startup.py)
+    train       run train.py and collect its per-stage wall time and peak RSS (opt-in, slow)
+
+    python bench.py                                 # all sections except train
+    python bench.py --sections predict,batch
+    python bench.py --sections train                # needs the datasets in data/raw
+    python bench.py --out bench.json                # save results
+    python bench.py --baseline bench.json           # flag regressions, exit 1 if any
+
+Every result is a named metric with a unit and a direction ("lower" or
+"higher" is better); --baseline compares metric by metric and fails on any
+change in the bad direction larger than --tolerance.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import contextlib
+import statistics
+import subprocess
+
+_SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_DIR = os.path.join(_SCRIPT_DIR, "model")
+REPORTS_DIR = os.path.join(_SCRIPT_DIR, "reports")
+
+SECTIONS = ["artifacts", "predict", "batch", "cli", "startup", "train"]
+DEFAULT_SECTIONS = [s for s in SECTIONS if s != "train"]
+BATCH_SIZES = [1, 16, 128, 1024, 8192]
+
+def _metric(value, unit, better="lower"):
+    return {"value": round(value, 6), "unit": unit, "better": better}
+
+def _timings(fn, repeat, warmup=1):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def _latency(prefix, samples):
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, int(round(0.95 * (len(samples) - 1))))]
+    return {
+        f"{prefix}.p50_ms": _metric(statistics.median(samples) * 1000, "ms"),
+        f"{prefix}.p95_ms": _metric(p95 * 1000, "ms"),
+        f"{prefix}.mean_ms": _metric(statistics.fmean(samples) * 1000, "ms"),
+    }
+
+def _sample_payloads(n, seed=0):
+    """Plausible, distinct patient payloads (distinct so SHAP caches never hit)."""
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    payloads = []
+    for _ in range(n):
+        payloads.append({
+            "age": int(rng.integers(25, 90)),
+            "sex": str(rng.choice(["male", "female"])),
+            "smoking_status": str(rng.choice(["0", "1", "2"])),
+            "wbc_count": round(float(rng.uniform(3, 15)), 2),
+            "neutrophil_pct": round(float(rng.uniform(35, 80)), 1),
+            "lymphocyte_pct": round(float(rng.uniform(8, 45)), 1),
+            "platelet_count": round(float(rng.uniform(120, 600))),
+            "hemoglobin": round(float(rng.uniform(8, 17)), 1),
+            "cea_level": round(float(rng.uniform(0, 20)), 2),
+            "crp_level": round(float(rng.uniform(0, 40)), 1),
+            "bmi": round(float(rng.uniform(18, 38)), 1),
+        })
+    return payloads
+
+# ── Sections ──────────────────────────────────────────────────────────────────
+
+def bench_artifacts(repeat):
+    import joblib
+    from bundle import ModelBundle, bundle_path
+    from artifacts import load_artifacts
+
+    results = {}
+    for name in ("cancer_risk_model.pkl", "scaler.pkl", "background.pkl"):
+        path = os.path.join(MODEL_DIR, name)
+        if os.path.exists(path):
+            samples = _timings(lambda: joblib.load(path), repeat, warmup=0)
+            results[f"artifacts.{name}_ms"] = _metric(statistics.median(samples) * 1000, "ms")
+
+    def read_columns():
+        with open(os.path.join(MODEL_DIR, "feature_columns.json"), "r") as f:
+            json.load(f)
+    results["artifacts.feature_columns.json_ms"] = _metric(statistics.median(_timings(read_columns, repeat)) * 1000, "ms")
+
+    if os.path.exists(bundle_path(MODEL_DIR)):
+        for verify in (True, False):
+            samples = _timings(lambda: ModelBundle(bundle_path(MODEL_DIR), verify=verify), repeat, warmup=0)
+            label = "verified" if verify else "unverified"
+            results[f"artifacts.bundle_{label}_ms"] = _metric(statistics.median(samples) * 1000, "ms")
+
+    for model_format in ("auto", "pickle"):
+        samples = _timings(lambda: load_artifacts(MODEL_DIR, model_format=model_format), repeat, warmup=0)
+        results[f"artifacts.load_artifacts_{model_format}_ms"] = _metric(statistics.median(samples) * 1000, "ms")
+    return results
+
+def _app_client():
+    # Measure computation, not the on-disk explanation cache or the response cache
+    os.environ.setdefault("EXPLAIN_CACHE_PATH", "")
+    os.environ.setdefault("RESPONSE_CACHE_ENTRIES", "0")
+    import app
+    if app.models.current is None:
+        raise RuntimeError("app.py could not load the model; run train.py first")
+    return app, app.app.test_client()
+
+def bench_predict(repeat):
+    app, client = _app_client()
+    payloads = _sample_payloads(repeat + 1)
+    results = {}
+
+    served = app.models.current
+    explanations_enabled = served.explanations_enabled
+    served.explanations_enabled = False
+    try:
+        it = iter(payloads * 2)
+        samples = _timings(lambda: client.post("/predict", json=dict(next(it))), repeat)
+        results.update(_latency("predict.no_shap", samples))
+    finally:
+        served.explanations_enabled = explanations_enabled
+
+    if explanations_enabled:
+        it = iter(payloads)
+
+        def explained():
+            served.explain_cache.memory.clear()
+            response = client.post("/predict", json=dict(next(it)))
+            if response.status_code != 200:
+                raise RuntimeError(f"/predict failed: {response.get_json()}")
+        results.update(_latency("predict.shap", _timings(explained, max(3, repeat // 10))))
+    return results
+
+def bench_batch(repeat):
+    from artifacts import load_artifacts
+    artifacts = load_artifacts(MODEL_DIR)
+    app, client = _app_client()
+    results = {}
+    for size in BATCH_SIZES:
+        records = _sample_payloads(size, seed=size)
+        runs = max(3, min(repeat, 20000 // size))
+
+        def engine_batch():
+            X = artifacts.transformer.transform_records([dict(r) for r in records])
+            artifacts.engine.predict_proba(X)
+        samples = _timings(engine_batch, runs)
+        results[f"batch.engine_{size}_rows_per_s"] = _metric(size / statistics.median(samples), "rows/s", "higher")
+
+        if size <= app.MAX_BATCH_ROWS:
+            body = {"patients": records, "explain": False}
+            samples = _timings(lambda: client.post("/predict_batch", json=body), runs)
+            results[f"batch.http_{size}_rows_per_s"] = _metric(size / statistics.median(samples), "rows/s", "higher")
+    return results
+
+def _run_startup_bench(scenarios, repeat):
+    # In a small separate process: a child's ru_maxrss includes the RSS of the
+    # parent it was forked from, and this process holds shap and the model
+    command = [sys.executable, "bench_startup.py", "--repeat", str(repeat)]
+    for scenario in scenarios:
+        command += ["--scenario", scenario]
+    output = subprocess.run(command, cwd=_SCRIPT_DIR, check=True, capture_output=True, text=True).stdout
+    return json.loads(output)["results"]
+
+def bench_cli(repeat):
+    results = {}
+    for scenario, stats in _run_startup_bench(["cli_oneshot", "cli_explain"], max(1, repeat // 20)).items():
+        results[f"cli.{scenario}_s"] = _metric(stats["wall_seconds_median"], "s")
+
+    # Steady-state round trip through a resident --serve worker
+    env = dict(os.environ, PYTHONWARNINGS="ignore", EXPLAIN_CACHE_PATH="")
+    proc = subprocess.Popen([sys.executable, "predict_cli.py", "--serve", "--workers", "1", "--no-explain"],
+                            cwd=_SCRIPT_DIR, env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                            stderr=subprocess.DEVNULL, text=True, bufsize=1)
+    try:
+        proc.stdout.readline()  # ready banner
+        payloads = iter(_sample_payloads(repeat + 1) * 2)
+
+        def round_trip():
+            proc.stdin.write(json.dumps({"id": 1, "payload": next(payloads)}) + "\n")
+            proc.stdin.flush()
+            proc.stdout.readline()
+        results.update(_latency("cli.serve_round_trip", _timings(round_trip, repeat)))
+    finally:
+        proc.stdin.close()
+        proc.wait()
+    return results
+
+def bench_startup(repeat):
+    import bench_startup
+    results = {}
+    for name, stats in _run_startup_bench(list(bench_startup.SCENARIOS), max(1, repeat // 20)).items():
+        results[f"startup.{name}_s"] = _metric(stats["wall_seconds_median"], "s")
+        results[f"startup.{name}_peak_rss_mb"] = _metric(stats["peak_rss_mb"], "MB")
+    return results
+
+def bench_train(repeat):
+    start = time.perf_counter()
+    # Cold run: stage outputs are not reused (TRAIN_CACHE=1 in the environment measures a cached run)
+    env = dict(os.environ, TRAIN_CACHE=os.environ.get("TRAIN_CACHE", "0"))
+    subprocess.run([sys.executable, "train.py"], cwd=_SCRIPT_DIR, check=True, env=env,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    results = {"train.total_s": _metric(time.perf_counter() - start, "s")}
+    with open(os.path.join(REPORTS_DIR, "train_stages.json"), "r") as f:
+        report = json.load(f)
+    for stage in report["stages"]:
+        results[f"train.{stage['stage']}_s"] = _metric(stage["seconds"], "s")
+        if stage["peak_rss_mb"] is not None:
+            results[f"train.{stage['stage']}_peak_rss_mb"] = _metric(stage["peak_rss_mb"], "MB")
+    return results
+
+RUNNERS = {
+    "artifacts": bench_artifacts,
+    "predict": bench_predict,
+    "batch": bench_batch,
+    "cli": bench_cli,
+    "startup": bench_startup,
+    "train": bench_train,
+}
+
+def compare(results, baseline, tolerance):
+    """[(metric, baseline, current)] for metrics that got worse by more than `tolerance`."""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous or not previous["value"]:
+            continue
+        if current["better"] == "lower":
+            worse = current["value"] > previous["value"] * (1 + tolerance)
+        else:
+            worse = current["value"] < previous["value"] * (1 - tolerance)
+        if worse:
+            regressions.append((name, previous["value"], current["value"]))
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark prediction latency, throughput, artifact loading and training.")
+    parser.add_argument("--sections", default=",".join(DEFAULT_SECTIONS),
+                        help=f"Comma-separated sections from {', '.join(SECTIONS)} (default: all but train).")
+    parser.add_argument("--repeat", type=int, default=100, help="Iterations for latency measurements.")
+    parser.add_argument("--out", help="Write results as JSON to this file.")
+    parser.add_argument("--baseline", help="Earlier results file to compare against.")
+    parser.add_argument("--tolerance", type=float, default=0.20, help="Allowed relative regression before failing.")
+    args = parser.parse_args()
+
+    sections = [s.strip() for s in args.sections.split(",") if s.strip()]
+    unknown = [s for s in sections if s not in RUNNERS]
+    if unknown:
+        sys.exit(f"Unknown section(s): {', '.join(unknown)}")
+
+    results = {}
+    for section in sections:
+        start = time.perf_counter()
+        # Keep anything the libraries print (shap progress bars) off the report
+        with contextlib.redirect_stdout(sys.stderr):
+            results.update(RUNNERS[section](args.repeat))
+        print(f"{section:<10} done in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "platform": sys.platform,
+        "cpu_count": os.cpu_count(),
+        "sections": sections,
+        "metrics": results,
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    for name, metric in results.items():
+        print(f"{name:<45} {metric['value']:>14.4f} {metric['unit']}")
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)["metrics"]
+        regressions = compare(results, baseline, args.tolerance)
+        for name, before, after in regressions:
+            print(f"REGRESSION {name}: {before} -> {after}", file=sys.stderr)
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,124 @@
+"""Cold-start benchmark for the serving entry points.
+
+Each scenario runs in a fresh interpreter several times. The script records
+wall time until the first useful output and the child's peak RSS (from
+os.wait4's ru_maxrss).
+
+    python bench_startup.py                          # print results
+    python bench_startup.py --out startup.json       # also save them
+    python bench_startup.py --baseline startup.json  # fail on a >20% regression
+
+Scenarios:
+    cli_oneshot     predict_cli.py --no-explain on one payload
+    cli_explain     predict_cli.py on one payload, SHAP included (cache disabled)
+    cli_serve       predict_cli.py --serve until the ready banner
+    app_import      import app (model loaded, Flask app built, no server)
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+_SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SAMPLE_PAYLOAD = {
+    "age": 60, "gender": "female", "wbc_count": 7.0, "neutrophil_pct": 60, "lymphocyte_pct": 30,
+    "platelet_count": 450, "hemoglobin": 10.5, "cea_level": 4.0, "crp_level": 8.0,
+}
+
+SCENARIOS = {
+    "cli_oneshot": ([sys.executable, "predict_cli.py", "--no-explain"], "payload"),
+    "cli_explain": ([sys.executable, "predict_cli.py"], "payload"),
+    "cli_serve": ([sys.executable, "predict_cli.py", "--serve", "--workers", "1"], "banner"),
+    "app_import": ([sys.executable, "-c", "import app; print('READY' if app.models.current else 'NOT READY')"], "exit"),
+}
+
+def _max_rss_mb(rusage):
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return rusage.ru_maxrss / divisor
+
+def run_once(name):
+    command, mode = SCENARIOS[name]
+    env = dict(os.environ, PYTHONWARNINGS="ignore", EXPLAIN_CACHE_PATH="")
+    start = time.perf_counter()
+    proc = subprocess.Popen(command, cwd=_SCRIPT_DIR, env=env, stdin=subprocess.PIPE,
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    if mode == "payload":
+        proc.stdin.write(json.dumps(SAMPLE_PAYLOAD))
+        proc.stdin.close()
+        output = proc.stdout.read()
+    elif mode == "banner":
+        output = proc.stdout.readline()
+    else:
+        proc.stdin.close()
+        output = proc.stdout.read()
+    elapsed = time.perf_counter() - start
+
+    if mode == "banner":
+        # Closing stdin ends the serve loop
+        proc.stdin.close()
+        proc.stdout.read()
+    _, status, rusage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    if proc.returncode != 0 or not output.strip():
+        raise RuntimeError(f"{name} failed (exit {proc.returncode}): {output.strip()[:200]}")
+    return elapsed, _max_rss_mb(rusage)
+
+def run(names, repeat):
+    results = {}
+    for name in names:
+        times, rss = [], []
+        for _ in range(repeat):
+            elapsed, peak = run_once(name)
+            times.append(elapsed)
+            rss.append(peak)
+        results[name] = {
+            "wall_seconds_median": round(statistics.median(times), 4),
+            "wall_seconds_min": round(min(times), 4),
+            "peak_rss_mb": round(max(rss), 1),
+            "runs": repeat,
+        }
+        print(f"{name:<12} {results[name]['wall_seconds_median']:.3f}s median  "
+              f"{results[name]['peak_rss_mb']:.1f} MB peak RSS", file=sys.stderr)
+    return results
+
+def compare(results, baseline, tolerance):
+    """Regressions (metric name, baseline, current) beyond `tolerance` (fraction)."""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        for metric in ("wall_seconds_median", "peak_rss_mb"):
+            if previous[metric] and current[metric] > previous[metric] * (1 + tolerance):
+                regressions.append((f"{name}.{metric}", previous[metric], current[metric]))
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure cold-start time and peak memory of the serving entry points.")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="Scenario to run (repeatable; default: all).")
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh processes per scenario.")
+    parser.add_argument("--out", help="Write results as JSON to this file.")
+    parser.add_argument("--baseline", help="Earlier results file to compare against.")
+    parser.add_argument("--tolerance", type=float, default=0.20, help="Allowed slowdown / growth before failing.")
+    args = parser.parse_args()
+
+    results = run(args.scenario or list(SCENARIOS), args.repeat)
+    report = {"python": sys.version.split()[0], "platform": sys.platform, "results": results}
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        for metric, before, after in regressions:
+            print(f"REGRESSION {metric}: {before} -> {after}", file=sys.stderr)
+        sys.exit(1 if regressions else 0)
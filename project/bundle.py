@@ -0,0 +1,212 @@
+"""Single-file, memory-mappable model bundle.
+
+Replaces loading cancer_risk_model.pkl, scaler.pkl, background.pkl and
+feature_columns.json separately. Layout of model/model_bundle.bin:
+
+    b"CRMB"  | u32 format | u64 header length | JSON header | padding | arrays
+
+Every array starts on a 64-byte boundary in one flat data section. The header
+records each array's dtype, shape and offset, plus the model version,
+feature order, thresholds, metrics and the SHA-256 of the data section.
+Loaders map the file read-only and hand out NumPy views, so nothing is
+unpickled or copied, and workers that load the same bundle share its pages
+in the OS page cache.
+
+    python bundle.py export     # build a bundle from the existing pickles
+    python bundle.py info       # print the header of the current bundle
+"""
+import os
+import sys
+import json
+import time
+import struct
+import hashlib
+import logging
+import numpy as np
+from inference import FusedMLP, fold_scaler
+
+MAGIC = b"CRMB"
+FORMAT_VERSION = 1
+ALIGN = 64
+_PREFIX = struct.Struct("<4sIQ")
+
+_SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_DIR = os.path.join(_SCRIPT_DIR, "model")
+BUNDLE_NAME = "model_bundle.bin"
+
+def _pad(n):
+    return (-n) % ALIGN
+
+def write_bundle(path, model, scaler, background, feature_columns, version, thresholds=None, metrics=None, extra=None,
+                 preprocessing=None):
+    """Write the bundle atomically (temp file + rename) so readers never see a partial file."""
+    arrays = {}
+    for i, (w, b) in enumerate(zip(model.coefs_, model.intercepts_)):
+        arrays[f"coef_{i}"] = w
+        arrays[f"intercept_{i}"] = b
+    mean = scaler.mean_ if getattr(scaler, "with_mean", True) else None
+    scale = scaler.scale_ if getattr(scaler, "with_std", True) else None
+    if mean is not None:
+        arrays["scaler_mean"] = mean
+    if scale is not None:
+        arrays["scaler_scale"] = scale
+    # Serving weights with the scaler already folded in (see inference.FusedMLP)
+    arrays["fused_coef_0"], arrays["fused_intercept_0"] = fold_scaler(
+        np.asarray(model.coefs_[0], dtype=np.float64), np.asarray(model.intercepts_[0], dtype=np.float64),
+        None if mean is None else np.asarray(mean, dtype=np.float64),
+        None if scale is None else np.asarray(scale, dtype=np.float64))
+    if background is not None:
+        arrays["background"] = np.asarray(background, dtype=np.float64)
+    if preprocessing:
+        arrays["impute_fill"] = preprocessing["fill"]
+        arrays["clip_lower"] = preprocessing["lower"]
+        arrays["clip_upper"] = preprocessing["upper"]
+    for name, values in (extra or {}).items():
+        arrays[name] = values
+
+    layout, chunks, offset = {}, [], 0
+    for name, values in arrays.items():
+        values = np.ascontiguousarray(values, dtype=np.float64)
+        layout[name] = {"dtype": values.dtype.str, "shape": list(values.shape), "offset": offset, "nbytes": values.nbytes}
+        chunks.append(values.tobytes() + b"\0" * _pad(values.nbytes))
+        offset += values.nbytes + _pad(values.nbytes)
+    data = b"".join(chunks)
+
+    header = {
+        "format": FORMAT_VERSION,
+        "version": str(version),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "feature_columns": list(feature_columns),
+        "model": {
+            "type": type(model).__name__,
+            "activation": model.activation,
+            "out_activation": model.out_activation_,
+            "n_layers": len(model.coefs_),
+        },
+        "thresholds": thresholds or {},
+        "metrics": metrics or {},
+        "preprocessing": {"columns": list(preprocessing["columns"])} if preprocessing else None,
+        "arrays": layout,
+        "data_sha256": hashlib.sha256(data).hexdigest(),
+    }
+    header_bytes = json.dumps(header).encode("utf-8")
+    header_bytes += b" " * _pad(_PREFIX.size + len(header_bytes))
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_PREFIX.pack(MAGIC, FORMAT_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        f.write(data)
+    os.replace(tmp_path, path)
+    return header
+
+def read_header(path):
+    with open(path, "rb") as f:
+        magic, fmt, header_len = _PREFIX.unpack(f.read(_PREFIX.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a model bundle")
+        if fmt != FORMAT_VERSION:
+            raise ValueError(f"Unsupported bundle format {fmt} (expected {FORMAT_VERSION})")
+        header = json.loads(f.read(header_len))
+    header["_data_offset"] = _PREFIX.size + header_len
+    return header
+
+class ModelBundle:
+    """Read-only, memory-mapped view of a bundle file."""
+
+    def __init__(self, path, verify=True):
+        self.path = path
+        self.header = read_header(path)
+        self._map = np.memmap(path, dtype=np.uint8, mode="r")
+        data = self._map[self.header["_data_offset"]:]
+        if verify:
+            digest = hashlib.sha256(data).hexdigest()
+            if digest != self.header["data_sha256"]:
+                raise ValueError(f"Checksum mismatch for {path}: bundle is corrupt or partially written")
+        self.arrays = {}
+        for name, spec in self.header["arrays"].items():
+            raw = data[spec["offset"]:spec["offset"] + spec["nbytes"]]
+            self.arrays[name] = raw.view(np.dtype(spec["dtype"])).reshape(spec["shape"])
+
+    @property
+    def version(self):
+        return self.header["version"]
+
+    @property
+    def checksum(self):
+        return self.header["data_sha256"]
+
+    @property
+    def feature_columns(self):
+        return self.header["feature_columns"]
+
+    @property
+    def preprocessing(self):
+        """Fitted imputation/clip parameters, or None for bundles without them."""
+        spec = self.header.get("preprocessing")
+        if not spec:
+            return None
+        return {"columns": spec["columns"], "fill": self.arrays["impute_fill"],
+                "lower": self.arrays["clip_lower"], "upper": self.arrays["clip_upper"]}
+
+    def _layers(self, fused):
+        n = self.header["model"]["n_layers"]
+        coefs = [self.arrays[f"coef_{i}"] for i in range(n)]
+        intercepts = [self.arrays[f"intercept_{i}"] for i in range(n)]
+        if fused:
+            coefs[0], intercepts[0] = self.arrays["fused_coef_0"], self.arrays["fused_intercept_0"]
+        return coefs, intercepts
+
+    def engine(self, dtype="float64"):
+        """FusedMLP over raw features, backed by the mapped weights (no copies in float64)."""
+        coefs, intercepts = self._layers(fused=True)
+        return FusedMLP(coefs, intercepts, self.header["model"]["activation"], self.header["model"]["out_activation"],
+                        mean=self.arrays.get("scaler_mean"), scale=self.arrays.get("scaler_scale"),
+                        dtype=dtype, prefolded=True)
+
+    def scaled_model(self):
+        """predict_proba over standardized features, for the SHAP explainer."""
+        coefs, intercepts = self._layers(fused=False)
+        return FusedMLP(coefs, intercepts, self.header["model"]["activation"], self.header["model"]["out_activation"])
+
+def read_preprocessing(model_dir=MODEL_DIR):
+    """preprocessing.json written next to the pickles by train.py, or None."""
+    path = os.path.join(model_dir, "preprocessing.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+def bundle_path(model_dir=MODEL_DIR):
+    return os.path.join(model_dir, BUNDLE_NAME)
+
+def export_from_pickles(model_dir=MODEL_DIR, version=None):
+    import joblib
+    model = joblib.load(os.path.join(model_dir, "cancer_risk_model.pkl"))
+    scaler = joblib.load(os.path.join(model_dir, "scaler.pkl"))
+    background = joblib.load(os.path.join(model_dir, "background.pkl"))
+    with open(os.path.join(model_dir, "feature_columns.json"), "r") as f:
+        feature_columns = json.load(f)
+    metrics = {}
+    metrics_path = os.path.join(model_dir, "metrics.json")
+    if os.path.exists(metrics_path):
+        with open(metrics_path, "r") as f:
+            metrics = json.load(f)
+    version = version or metrics.get("model_version") or time.strftime("%Y%m%d%H%M%S")
+    thresholds = {"decision": metrics.get("threshold", 0.30)}
+    return write_bundle(bundle_path(model_dir), model, scaler, background, feature_columns,
+                        version=version, thresholds=thresholds, metrics=metrics,
+                        preprocessing=read_preprocessing(model_dir))
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    command = sys.argv[1] if len(sys.argv) > 1 else "info"
+    if command == "export":
+        header = export_from_pickles(version=sys.argv[2] if len(sys.argv) > 2 else None)
+        print(f"Wrote {bundle_path()} (version {header['version']}, sha256 {header['data_sha256'][:12]})")
+    elif command == "info":
+        header = read_header(bundle_path())
+        header.pop("arrays")
+        print(json.dumps(header, indent=2))
+    else:
+        sys.exit(f"Unknown command: {command} (expected export or info)")
@@ -0,0 +1,50 @@
+import os
+import json
+import shutil
+import joblib
+import pytest
+import explain_cache
+from bundle import write_bundle, bundle_path
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model")
+
+class Clock:
+    """Stands in for the time module in explain_cache (only time() is used)."""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(explain_cache, "time", clock)
+    return clock
+
+@pytest.fixture(scope="session")
+def fitted():
+    """(model, scaler, background, feature_columns) of the model in model/."""
+    model = joblib.load(os.path.join(MODEL_DIR, "cancer_risk_model.pkl"))
+    scaler = joblib.load(os.path.join(MODEL_DIR, "scaler.pkl"))
+    background = joblib.load(os.path.join(MODEL_DIR, "background.pkl"))
+    with open(os.path.join(MODEL_DIR, "feature_columns.json")) as f:
+        feature_columns = json.load(f)
+    return model, scaler, background, feature_columns
+
+@pytest.fixture
+def model_copy(tmp_path):
+    """A writable copy of model/."""
+    directory = tmp_path / "model"
+    shutil.copytree(MODEL_DIR, directory)
+    return directory
+
+@pytest.fixture
+def write_version(fitted):
+    """write_version(directory, version, model=None, **metrics) writes a model bundle into directory."""
+    def write(directory, version, model=None, **metrics):
+        default_model, scaler, background, feature_columns = fitted
+        write_bundle(bundle_path(str(directory)), model if model is not None else default_model, scaler, background,
+                     feature_columns, version=version, metrics={"model_version": version, **metrics})
+    return write
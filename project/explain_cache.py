@@ -0,0 +1,249 @@
+"""Cache for SHAP explanations, keyed on the scaled feature vector.
+
+KernelExplainer dominates request latency, and follow-up visits or UI
+re-renders resubmit the same panel. ExplanationCache stores the class-1 SHAP
+vector for a scaled row (optionally rounded first, so near-identical panels
+share an entry) in an in-memory LRU with TTL and byte caps, backed by an
+optional SQLite file so worker restarts and one-shot predict_cli.py runs can
+reuse earlier work. The servers keep the cache in memory unless
+EXPLAIN_CACHE_PATH is set; each explained request then writes its new rows in
+one transaction.
+
+Configuration (environment):
+    EXPLAIN_CACHE_ENTRIES   max in-memory entries        (default 4096)
+    EXPLAIN_CACHE_BYTES     max in-memory payload bytes  (default 64 MB)
+    EXPLAIN_CACHE_TTL       seconds an entry stays valid (default 86400, 0 = forever)
+    EXPLAIN_CACHE_DECIMALS  round scaled features first  (default unset = exact)
+    EXPLAIN_CACHE_PATH      SQLite file, "" disables persistence  (default unset = memory only;
+                            predict_cli.py defaults to cache/explanations.sqlite)
+"""
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+import numpy as np
+
+_SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE_PATH = os.path.join(_SCRIPT_DIR, "cache", "explanations.sqlite")
+
+class LRUCache:
+    """Thread-safe LRU map with optional TTL, entry and byte limits."""
+
+    def __init__(self, max_entries=4096, max_bytes=None, ttl=None, sizeof=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl or None
+        self._sizeof = sizeof or (lambda value: 0)
+        self._data = OrderedDict()  # key -> (value, nbytes, stored_at)
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and self.ttl and time.time() - entry[2] > self.ttl:
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, stored_at=None):
+        nbytes = self._sizeof(value)
+        if self.max_bytes is not None and nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, nbytes, stored_at or time.time())
+            self.nbytes += nbytes
+            while self._data and (len(self._data) > self.max_entries or
+                                  (self.max_bytes is not None and self.nbytes > self.max_bytes)):
+                self._remove(next(iter(self._data)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        _, nbytes, _ = self._data.pop(key)
+        self.nbytes -= nbytes
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.nbytes = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "bytes": self.nbytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+class ExplanationCache:
+    """SHAP vectors keyed on a hash of the (rounded) scaled feature row.
+
+    `namespace` should identify the model (see model_fingerprint) so a
+    retrained model never reuses another model's explanations.
+    """
+
+    def __init__(self, namespace="", decimals=None, max_entries=4096, max_bytes=64 * 1024 * 1024,
+                 ttl=86400, path=None, max_disk_entries=100000):
+        self.namespace = namespace
+        self.decimals = decimals
+        self.memory = LRUCache(max_entries=max_entries, max_bytes=max_bytes, ttl=ttl,
+                               sizeof=lambda value: value.nbytes)
+        self.ttl = ttl or None
+        self.max_disk_entries = max_disk_entries
+        self.disk_hits = 0
+        self.path = path
+        self._db = None
+        self._db_lock = threading.Lock()
+        self._puts = 0
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._connect()
+
+    def _connect(self):
+        self._db = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS explanations (key TEXT PRIMARY KEY, namespace TEXT NOT NULL DEFAULT '', "
+            "shap BLOB NOT NULL, created REAL NOT NULL)"
+        )
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(explanations)")}
+        if "namespace" not in columns:
+            # Files written before clear() was scoped to one namespace
+            self._db.execute("ALTER TABLE explanations ADD COLUMN namespace TEXT NOT NULL DEFAULT ''")
+        self._db.commit()
+
+    def reopen(self):
+        """Open a fresh SQLite connection; a forked child must not use its parent's."""
+        self._db_lock = threading.Lock()
+        if self._db is not None:
+            self._connect()
+
+    @classmethod
+    def from_env(cls, namespace="", default_path=None):
+        """Configured from the environment; persistent only with EXPLAIN_CACHE_PATH (or `default_path`)."""
+        decimals = os.environ.get("EXPLAIN_CACHE_DECIMALS")
+        return cls(
+            namespace=namespace,
+            decimals=int(decimals) if decimals not in (None, "") else None,
+            max_entries=int(os.environ.get("EXPLAIN_CACHE_ENTRIES", "4096")),
+            max_bytes=int(os.environ.get("EXPLAIN_CACHE_BYTES", str(64 * 1024 * 1024))),
+            ttl=float(os.environ.get("EXPLAIN_CACHE_TTL", "86400")),
+            path=os.environ.get("EXPLAIN_CACHE_PATH", default_path),
+        )
+
+    def key_for(self, scaled_row):
+        row = np.asarray(scaled_row, dtype=np.float64).ravel()
+        if self.decimals is not None:
+            # + 0.0 folds -0.0 into 0.0 so both round to the same key
+            row = np.round(row, self.decimals) + 0.0
+        digest = hashlib.sha256(self.namespace.encode())
+        digest.update(np.ascontiguousarray(row).tobytes())
+        return digest.hexdigest()
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is not None or self._db is None:
+            return value
+        with self._db_lock:
+            found = self._db.execute("SELECT shap, created FROM explanations WHERE key = ?", (key,)).fetchone()
+        if found is None or (self.ttl and time.time() - found[1] > self.ttl):
+            return None
+        value = np.frombuffer(found[0], dtype=np.float64)
+        self.disk_hits += 1
+        self.memory.put(key, value, stored_at=found[1])
+        return value
+
+    def put(self, key, shap_row):
+        self.put_many([(key, shap_row)])
+
+    def put_many(self, items):
+        """Store (key, SHAP row) pairs; on disk they are written in one transaction."""
+        now = time.time()
+        records = []
+        for key, shap_row in items:
+            value = np.array(shap_row, dtype=np.float64).ravel()
+            value.flags.writeable = False
+            self.memory.put(key, value, stored_at=now)
+            records.append((key, self.namespace, value.tobytes(), now))
+        if self._db is None or not records:
+            return
+        with self._db_lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO explanations (key, namespace, shap, created) VALUES (?, ?, ?, ?)", records)
+            previous, self._puts = self._puts, self._puts + len(records)
+            if previous // 500 != self._puts // 500:
+                self._prune(now)
+            self._db.commit()
+
+    def _prune(self, now):
+        if self.ttl:
+            self._db.execute("DELETE FROM explanations WHERE created < ?", (now - self.ttl,))
+        self._db.execute(
+            "DELETE FROM explanations WHERE key NOT IN (SELECT key FROM explanations ORDER BY created DESC LIMIT ?)",
+            (self.max_disk_entries,),
+        )
+
+    def lookup(self, scaled_features):
+        """Cached SHAP matrix if every row is cached, else None (never computes)."""
+        rows = [self.get(self.key_for(row)) for row in np.asarray(scaled_features)]
+        if any(row is None for row in rows):
+            return None
+        return np.vstack(rows)
+
+    def explain(self, scaled_features, compute):
+        """Class-1 SHAP matrix for `scaled_features`, calling `compute` on misses only.
+
+        `compute` takes the missing rows (2-D) and returns their SHAP matrix.
+        """
+        scaled_features = np.asarray(scaled_features)
+        keys = [self.key_for(row) for row in scaled_features]
+        rows = [self.get(key) for key in keys]
+        missing = [i for i, row in enumerate(rows) if row is None]
+        if missing:
+            computed = np.asarray(compute(scaled_features[missing])).reshape(len(missing), -1)
+            self.put_many((keys[i], shap_row) for i, shap_row in zip(missing, computed))
+            for i, shap_row in zip(missing, computed):
+                rows[i] = shap_row
+        return np.vstack(rows)
+
+    def clear(self):
+        """Drop this namespace's entries; other models sharing the SQLite file keep theirs."""
+        self.memory.clear()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM explanations WHERE namespace = ?", (self.namespace,))
+                self._db.commit()
+
+    def stats(self):
+        stats = self.memory.stats()
+        # A disk hit first registers as a memory miss
+        stats["hits"] += self.disk_hits
+        stats["misses"] -= self.disk_hits
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        stats["disk_hits"] = self.disk_hits
+        stats["persistent"] = self._db is not None
+        return stats
+
+def model_fingerprint(*parts):
+    """Stable hash of the model objects an explanation depends on."""
+    import joblib
+    return joblib.hash(parts)
@@ -0,0 +1,229 @@
+"""Explainers for the serving code: lazy SHAP and NumPy integrated gradients.
+
+Importing shap pulls in pandas, numba-style dependencies and most of sklearn,
+costing seconds and hundreds of MB per process. Serving code calls into this
+module instead of importing shap, so a process that never explains never
+pays for it; the first explanation records how long the import took.
+
+KernelExplainer treats the network as a black box and needs hundreds of
+model evaluations per row. IntegratedGradients reads the MLP's weights and
+back-propagates through them instead: for a row x and each background row b
+it averages the gradient of P(class 1) along the straight path from b to x,
+for a whole batch in one vectorized pass, and needs no shap import. Like
+KernelExplainer it attributes P(x) - E_b[P(b)] over the same background, so
+its output drops into top_factors unchanged. train.py compares the two on
+the test split (reports/explainer_comparison.json).
+
+Configuration (environment):
+    EXPLAINER        kernel | gradient (MLP models only; others use kernel)  (default kernel)
+    EXPLAIN_IG_STEPS integration steps per background row for gradient       (default 32)
+"""
+import os
+import time
+import logging
+import threading
+import numpy as np
+
+_lock = threading.Lock()
+_shap = None
+SHAP_IMPORT_SECONDS = None
+
+def shap_module():
+    global _shap, SHAP_IMPORT_SECONDS
+    if _shap is None:
+        with _lock:
+            if _shap is None:
+                start = time.perf_counter()
+                import shap
+                SHAP_IMPORT_SECONDS = round(time.perf_counter() - start, 4)
+                _shap = shap
+    return _shap
+
+def kernel_explainer(model, background):
+    """KernelExplainer over `model.predict_proba` (standardized inputs)."""
+    return shap_module().KernelExplainer(model.predict_proba, background)
+
+class IntegratedGradients:
+    """Integrated gradients of P(class 1) for a fitted MLP, averaged over background rows.
+
+    Inputs are in the space the network was trained on (standardized). For
+    row x and baseline b the attribution of feature i is
+
+        (x_i - b_i) * mean_k dP/dx_i (b + a_k (x - b)),  a_k = (k + 0.5) / steps
+
+    averaged over the (weighted) baselines, so a row's attributions sum to
+    P(x) - expected_value up to the integration error.
+    """
+
+    def __init__(self, coefs, intercepts, activation, out_activation, background, weights=None, steps=32,
+                 max_points=1 << 16):
+        self.coefs = [np.asarray(w, dtype=np.float64) for w in coefs]
+        self.intercepts = [np.asarray(b, dtype=np.float64) for b in intercepts]
+        if activation not in _DERIVATIVES or out_activation not in ("logistic", "softmax"):
+            raise ValueError(f"Unsupported activations: {activation} / {out_activation}")
+        self.activation = activation
+        self.out_activation = out_activation
+        self.background = np.asarray(getattr(background, "data", background), dtype=np.float64)
+        weights = getattr(background, "weights", None) if weights is None else weights
+        weights = np.ones(len(self.background)) if weights is None else np.asarray(weights, dtype=np.float64)
+        self.weights = weights / weights.sum()
+        self.steps = max(int(steps), 1)
+        self.alphas = (np.arange(self.steps) + 0.5) / self.steps
+        self.max_points = max_points
+        self.expected_value = float(self.weights @ self._forward(self.background)[-1])
+
+    @classmethod
+    def from_model(cls, model, background, steps=None):
+        """From an MLPClassifier, or a FusedMLP without a folded scaler (inputs must stay standardized)."""
+        steps = steps or int(os.environ.get("EXPLAIN_IG_STEPS", "32"))
+        if hasattr(model, "coefs_"):
+            return cls(model.coefs_, model.intercepts_, model.activation, model.out_activation_, background,
+                       steps=steps)
+        if getattr(model, "mean", None) is not None or getattr(model, "scale_", None) is not None:
+            raise ValueError("IntegratedGradients needs a network on standardized inputs (scaler folded in).")
+        return cls(model.coefs, model.intercepts, model.activation, model.out_activation, background, steps=steps)
+
+    def _forward(self, X):
+        """Activations of every layer; the last entry is P(class 1)."""
+        layers = [X]
+        last = len(self.coefs) - 1
+        for i, (w, b) in enumerate(zip(self.coefs, self.intercepts)):
+            z = layers[-1] @ w + b
+            if i < last:
+                layers.append(_ACTIVATE[self.activation](z))
+            elif self.out_activation == "logistic":
+                layers.append(1.0 / (1.0 + np.exp(-np.clip(z[:, 0], -500, 500))))
+            else:
+                z = np.exp(z - z.max(axis=1, keepdims=True))
+                layers.append(z[:, 1] / z.sum(axis=1))
+        return layers
+
+    def gradients(self, X):
+        """dP(class 1)/dX for every row of X."""
+        layers = self._forward(np.asarray(X, dtype=np.float64))
+        p = layers[-1]
+        if self.out_activation == "logistic":
+            grad = (p * (1.0 - p))[:, None]
+        else:
+            logits = layers[-2] @ self.coefs[-1] + self.intercepts[-1]
+            probs = np.exp(logits - logits.max(axis=1, keepdims=True))
+            probs /= probs.sum(axis=1, keepdims=True)
+            grad = -p[:, None] * probs
+            grad[:, 1] += p
+        for i in range(len(self.coefs) - 1, -1, -1):
+            grad = grad @ self.coefs[i].T
+            if i > 0:
+                grad *= _DERIVATIVES[self.activation](layers[i])
+        return grad
+
+    def shap_values(self, X, **kwargs):
+        """(rows, features) class-1 attributions; keyword arguments of KernelExplainer are ignored."""
+        X = np.asarray(X, dtype=np.float64).reshape(-1, self.background.shape[1])
+        n_base, n_features = self.background.shape
+        chunk = max(self.max_points // (n_base * self.steps), 1)
+        values = np.empty_like(X)
+        for start in range(0, len(X), chunk):
+            rows = X[start:start + chunk]
+            delta = rows[:, None, :] - self.background[None, :, :]
+            path = self.background[None, :, None, :] + self.alphas[None, None, :, None] * delta[:, :, None, :]
+            grads = self.gradients(path.reshape(-1, n_features)).reshape(len(rows), n_base, self.steps, n_features)
+            values[start:start + len(rows)] = np.einsum("rbf,b->rf", delta * grads.mean(axis=2), self.weights)
+        return values
+
+    def predict(self, X):
+        return self._forward(np.asarray(X, dtype=np.float64))[-1]
+
+_ACTIVATE = {
+    "identity": lambda z: z,
+    "relu": lambda z: np.maximum(z, 0),
+    "tanh": np.tanh,
+    "logistic": lambda z: 1.0 / (1.0 + np.exp(-np.clip(z, -500, 500))),
+}
+
+# Derivatives in terms of the activation's output
+_DERIVATIVES = {
+    "identity": lambda h: 1.0,
+    "relu": lambda h: (h > 0).astype(np.float64),
+    "tanh": lambda h: 1.0 - h * h,
+    "logistic": lambda h: h * (1.0 - h),
+}
+
+def explainer_kind(model, kind=None):
+    """The configured EXPLAINER, or "kernel" where the gradient explainer cannot be used."""
+    kind = kind or os.environ.get("EXPLAINER", "kernel")
+    if kind not in ("kernel", "gradient"):
+        raise ValueError(f"Unknown explainer: {kind}")
+    if kind == "gradient" and not (hasattr(model, "coefs_") or hasattr(model, "coefs")):
+        logging.warning("Gradient explainer needs an MLP; using KernelExplainer.")
+        return "kernel"
+    return kind
+
+def make_explainer(model, background, kind=None):
+    """The configured explainer over `model` (standardized inputs); both expose shap_values()."""
+    if explainer_kind(model, kind) == "gradient":
+        return IntegratedGradients.from_model(model, background)
+    return kernel_explainer(model, background)
+
+def cache_namespace(fingerprint, model, kind=None):
+    """Explanation cache namespace: the model fingerprint, plus the explainer when it is not the kernel one."""
+    kind = explainer_kind(model, kind)
+    return fingerprint if kind == "kernel" else f"{fingerprint}:{kind}"
+
+def compare_attributions(reference, candidate, limit=3):
+    """Agreement of `candidate` with `reference` attributions for the same rows (top_factors-level view)."""
+    reference = np.asarray(reference, dtype=np.float64)
+    candidate = np.asarray(candidate, dtype=np.float64)
+    top_ref = np.argsort(-np.abs(reference), axis=1, kind="stable")[:, :limit]
+    top_cand = np.argsort(-np.abs(candidate), axis=1, kind="stable")[:, :limit]
+    overlap = [len(set(a) & set(b)) / limit for a, b in zip(top_ref, top_cand)]
+    correlations = []
+    for a, b in zip(reference, candidate):
+        if a.std() > 0 and b.std() > 0:
+            correlations.append(float(np.corrcoef(a, b)[0, 1]))
+    # Sign agreement where the reference calls a feature relevant (top_factors' 0.001 cut-off)
+    relevant = np.abs(reference) > 0.001
+    mean_abs_ref = np.abs(reference).mean(axis=0)
+    mean_abs_cand = np.abs(candidate).mean(axis=0)
+    return {
+        "rows": int(len(reference)),
+        "mean_abs_diff": round(float(np.abs(candidate - reference).mean()), 6),
+        "max_abs_diff": round(float(np.abs(candidate - reference).max()), 6) if reference.size else 0.0,
+        "row_correlation_mean": round(float(np.mean(correlations)), 4) if correlations else None,
+        "row_correlation_median": round(float(np.median(correlations)), 4) if correlations else None,
+        f"top{limit}_overlap": round(float(np.mean(overlap)), 4) if overlap else None,
+        "top1_agreement": round(float(np.mean(top_ref[:, 0] == top_cand[:, 0])), 4) if len(reference) else None,
+        "sign_agreement": round(float((np.sign(reference) == np.sign(candidate))[relevant].mean()), 4)
+                          if relevant.any() else None,
+        "global_importance_correlation": round(float(np.corrcoef(mean_abs_ref, mean_abs_cand)[0, 1]), 4)
+                                         if mean_abs_ref.std() > 0 and mean_abs_cand.std() > 0 else None,
+    }
+
+def class1_values(shap_vals, n_rows):
+    # KernelExplainer on predict_proba returns [class0, class1] (older shap) or a
+    # (rows, features, classes) array (newer shap); keep class 1 either way
+    if isinstance(shap_vals, list):
+        values = np.asarray(shap_vals[1])
+    else:
+        values = np.asarray(shap_vals)
+        if values.ndim == 3:
+            values = values[:, :, 1]
+    return values.reshape(n_rows, -1)
+
+def top_factors(class1_shap, raw_features, feature_columns, limit=3):
+    """Per row, the `limit` largest |SHAP| features in the /predict response format."""
+    all_factors = []
+    for r in range(len(raw_features)):
+        # Build Shap Dictionary matching feature cols
+        feature_impacts = []
+        for i, col in enumerate(feature_columns):
+            val = class1_shap[r, i]
+            if abs(val) > 0.001:
+                feature_impacts.append({
+                    "feature": col,
+                    "value": round(float(raw_features[r, i]), 3),
+                    "impact": "increases risk" if val > 0 else "decreases risk",
+                    "shap_value": round(float(val), 4)
+                })
+        feature_impacts.sort(key=lambda x: abs(x["shap_value"]), reverse=True)
+        all_factors.append(feature_impacts[:limit])
+    return all_factors
@@ -0,0 +1,311 @@
+"""Feature engineering shared by train.py, app.py and predict_cli.py.
+
+The CBC-derived ratios and flags are defined once, in `engineer`, and every
+caller goes through it: training applies it column-wise to the merged
+DataFrame, serving applies it to parsed request payloads. FeatureTransformer
+is built once from feature_columns.json and writes straight into a float64
+matrix in the model's column order, so no per-request dict or DataFrame is
+needed.
+"""
+import json
+import numpy as np
+
+# Web UI sends smoking_status as a numeric select value
+SMOKING_STATUS_CODES = {'0': 'Non-Smoker', '1': 'Former Smoker', '2': 'Smoker'}
+
+# Stand-in for a zero/missing lymphocyte value so the ratios stay finite
+LYMPH_FLOOR = 1e-9
+
+CBC_INPUTS = ("wbc_count", "neutrophil_pct", "lymphocyte_pct", "platelet_count", "hemoglobin")
+ENGINEERED_COLUMNS = (
+    "monocyte_count", "neutrophil_count", "lymphocyte_count",
+    "NLR", "PLR", "MLR",
+    "anemia_flag", "thrombocytosis_flag", "high_nlr_flag",
+)
+
+def engineer(wbc, neut_pct, lymph_pct, platelets, hemoglobin, is_female, is_male):
+    """Derived counts, NLR/PLR/MLR and clinical flags for arrays of CBC values.
+
+    `lymph_pct` must already have zeros replaced by LYMPH_FLOOR. Flags come back
+    as booleans; everything else as float64 arrays. Matches the original
+    per-row rules: counts are 0 (lymphocytes LYMPH_FLOOR) when WBC is 0, and a
+    NaN monocyte share counts as 0, as Python's max(0, nan) did.
+    """
+    has_wbc = wbc != 0
+    # NaN/inf inputs propagate as they did per row; the engines reject them later
+    with np.errstate(invalid="ignore", over="ignore"):
+        neut_count = np.where(has_wbc, (neut_pct / 100.0) * wbc, 0.0)
+        lymph_count = np.where(has_wbc, (lymph_pct / 100.0) * wbc, LYMPH_FLOOR)
+        mono_count = np.where(has_wbc, (np.fmax(0, 100 - neut_pct - lymph_pct) / 100.0) * wbc, 0.0)
+        nlr = neut_count / lymph_count
+        plr = platelets / lymph_count
+        mlr = mono_count / lymph_count
+    return {
+        "monocyte_count": mono_count,
+        "neutrophil_count": neut_count,
+        "lymphocyte_count": lymph_count,
+        "NLR": nlr,
+        "PLR": plr,
+        "MLR": mlr,
+        "anemia_flag": (is_female & (hemoglobin < 12)) | (is_male & (hemoglobin < 13.5)),
+        "thrombocytosis_flag": platelets > 400,
+        "high_nlr_flag": nlr > 3.0,
+    }
+
+def _column_as_float(values, default=0.0):
+    try:
+        arr = np.asarray(values, dtype=np.float64)
+    except (ValueError, TypeError):
+        def parse(v):
+            try:
+                return float(v)
+            except (ValueError, TypeError):
+                return np.nan
+        arr = np.frompyfunc(parse, 1, 1)(np.asarray(values, dtype=object)).astype(np.float64)
+    return np.where(np.isnan(arr), default, arr)
+
+def _column_as_lower_str(values):
+    return np.char.lower(np.asarray(values).astype(str))
+
+def _is_missing(values):
+    values = np.asarray(values, dtype=object)
+    with np.errstate(invalid="ignore"):
+        return np.frompyfunc(lambda v: v is None or (isinstance(v, float) and v != v), 1, 1)(values).astype(bool)
+
+def _unparseable(values):
+    # Present, non-empty values that float() rejects
+    def bad(v):
+        if not v or (isinstance(v, float) and v != v):
+            return False
+        try:
+            float(v)
+            return False
+        except (ValueError, TypeError):
+            return True
+    with np.errstate(invalid="ignore"):
+        return np.frompyfunc(bad, 1, 1)(np.asarray(values, dtype=object)).astype(bool)
+
+def _smoking_code(v):
+    # CSV readers turn an integer column with blanks into floats (2 -> 2.0)
+    if isinstance(v, float) and v.is_integer():
+        v = int(v)
+    return SMOKING_STATUS_CODES.get(str(v), v)
+
+def engineer_frame(frame, serving=False):
+    """Apply `engineer` to a DataFrame (or dict of arrays) of raw columns.
+
+    With `serving=True` the request rules apply: a missing sex counts as male
+    (score_bulk.py rejects those rows, see invalid_rows) and one unparseable
+    CBC value resets the row's whole CBC group to 0.
+    """
+    n = len(next(iter(frame.values()))) if isinstance(frame, dict) else len(frame)
+
+    def col(name, default=0.0):
+        return _column_as_float(frame[name], default) if name in frame else np.full(n, default)
+
+    wbc, neut, lymph, platelets, hemoglobin = (col(name) for name in CBC_INPUTS)
+    if serving:
+        bad = np.zeros(n, dtype=bool)
+        for name in CBC_INPUTS:
+            if name in frame:
+                bad |= _unparseable(frame[name])
+        for values in (wbc, neut, lymph, platelets, hemoglobin):
+            values[bad] = 0.0
+    lymph[lymph == 0] = LYMPH_FLOOR
+    if "sex" in frame:
+        sex = np.char.strip(_column_as_lower_str(frame["sex"]))
+        if serving:
+            sex[_is_missing(frame["sex"])] = "male"
+    else:
+        sex = np.full(n, "male")
+    return engineer(wbc, neut, lymph, platelets, hemoglobin, sex == "female", sex == "male")
+
+class FeatureTransformer:
+    """Maps raw patient inputs onto the model's feature_columns order.
+
+    Column positions and dummy-column lookups are precomputed once, so a
+    payload key costs one dict lookup instead of a scan over every column.
+
+    `preprocessing` holds the imputation and clip parameters fitted by
+    train.py's cleaning stage ({"columns", "fill", "lower", "upper"}). When
+    given, numeric inputs are cleaned exactly as the training rows were: a
+    missing or unparseable value takes the training median, then every value
+    is clipped to its IQR bounds before the CBC features are derived.
+    """
+
+    def __init__(self, feature_columns, preprocessing=None):
+        self.feature_columns = list(feature_columns)
+        self.n_features = len(self.feature_columns)
+        self.index = {col: i for i, col in enumerate(self.feature_columns)}
+
+        # Dummy columns are matched as "<key>_<value>" case-insensitively
+        self._dummy_index = {}
+        for i, col in enumerate(self.feature_columns):
+            self._dummy_index.setdefault(col.lower(), []).append(i)
+        self._dummy_levels = {}
+
+        self._engineered = [(name, self.index[name]) for name in ENGINEERED_COLUMNS if name in self.index]
+
+        # (column, fill, lower, upper) for the cleaned inputs the features use
+        self._cleaning = []
+        if preprocessing:
+            for name, fill, lower, upper in zip(preprocessing["columns"], preprocessing["fill"],
+                                                preprocessing["lower"], preprocessing["upper"]):
+                if name in self.index or name in CBC_INPUTS:
+                    self._cleaning.append((name, float(fill), float(lower), float(upper)))
+
+    @classmethod
+    def from_json(cls, path):
+        with open(path, "r") as f:
+            return cls(json.load(f))
+
+    def compatible_with(self, other):
+        """True when `other` builds the same matrix from the same payloads."""
+        return self.feature_columns == other.feature_columns and self._cleaning == other._cleaning
+
+    def _allocate(self, n, out):
+        if out is None:
+            return np.zeros((n, self.n_features), dtype=np.float64)
+        out = out[:n]
+        out.fill(0.0)
+        return out
+
+    def _clean_columns(self, column, n):
+        """{name: float64 array} of the cleaned inputs; `column(name)` returns raw values or None."""
+        cleaned = {}
+        for name, fill, lower, upper in self._cleaning:
+            values = column(name)
+            arr = np.full(n, np.nan) if values is None else _column_as_float(values, default=np.nan)
+            arr[np.isnan(arr)] = fill
+            np.clip(arr, lower, upper, out=arr)
+            cleaned[name] = arr
+        return cleaned
+
+    def _write_engineered(self, X, engineered):
+        for name, i in self._engineered:
+            X[:, i] = engineered[name]
+
+    def transform(self, payload, out=None):
+        """One request payload -> 1-D feature vector (written into `out` if given)."""
+        return self.transform_records([payload], None if out is None else out.reshape(1, -1))[0]
+
+    def transform_records(self, records, out=None):
+        """List of request payloads (dicts) -> (n, n_features) matrix.
+
+        Payloads are mutated in place to apply the smoking_status remapping,
+        as the endpoints always have.
+        """
+        n = len(records)
+        X = self._allocate(n, out)
+        cbc = np.zeros((5, n))
+        is_female = np.zeros(n, dtype=bool)
+        is_male = np.zeros(n, dtype=bool)
+        index, dummy_index = self.index, self._dummy_index
+
+        for r, data in enumerate(records):
+            # Clean up input first to convert numeric categorical IDs from the web UI to strings
+            if 'smoking_status' in data:
+                data['smoking_status'] = SMOKING_STATUS_CODES.get(str(data['smoking_status']), data['smoking_status'])
+
+            for k, v in data.items():
+                # Manually map numerical inputs
+                i = index.get(k)
+                if i is not None:
+                    try:
+                        X[r, i] = float(v) if v is not None else 0.0
+                    except (ValueError, TypeError):
+                        pass
+                # Categorical dummy columns like k_v
+                if v is not None:
+                    for j in dummy_index.get(f"{k}_{v}".lower(), ()):
+                        X[r, j] = 1.0
+
+            # Convert to float safely; one bad value resets the whole group
+            try:
+                for c, name in enumerate(CBC_INPUTS):
+                    v = data.get(name)
+                    cbc[c, r] = float(v) if v else 0.0
+            except (ValueError, TypeError):
+                cbc[:, r] = 0.0
+
+            sex_input = str(data.get("sex", "male")).strip().lower()
+            is_female[r] = sex_input == 'female'
+            is_male[r] = sex_input == 'male'
+
+        if self._cleaning:
+            cleaned = self._clean_columns(lambda name: [data.get(name) for data in records], n)
+            for name, values in cleaned.items():
+                if name in index:
+                    X[:, index[name]] = values
+                if name in CBC_INPUTS:
+                    cbc[CBC_INPUTS.index(name)] = values
+
+        cbc[2][cbc[2] == 0] = LYMPH_FLOOR
+        self._write_engineered(X, engineer(*cbc, is_female, is_male))
+        return X
+
+    def invalid_rows(self, X, frame=None):
+        """{row: error message} for rows of X that cannot be scored.
+
+        Rows with NaN or infinite features always fail. Given the `frame` X was
+        built from (transform_frame), rows without a sex fail too: a file cell
+        cannot tell an omitted field (male for /predict) from an explicit null.
+        """
+        errors = {}
+        bad = ~np.isfinite(X)
+        for r in np.flatnonzero(bad.any(axis=1)):
+            errors[int(r)] = "Non-finite feature values: " + ", ".join(self.feature_columns[j] for j in np.flatnonzero(bad[r]))
+        if frame is not None:
+            if "sex" in frame:
+                missing = _is_missing(frame["sex"]) | (np.char.strip(_column_as_lower_str(frame["sex"])) == "")
+            else:
+                missing = np.ones(len(X), dtype=bool)
+            for r in np.flatnonzero(missing):
+                errors[int(r)] = "; ".join(filter(None, (errors.get(int(r)), "Missing sex")))
+        return errors
+
+    def _levels_for(self, key):
+        # Dummy columns belonging to input column `key`: [(lowercased level, index)]
+        levels = self._dummy_levels.get(key)
+        if levels is None:
+            prefix = f"{key}_".lower()
+            levels = [(col.lower()[len(prefix):], i) for i, col in enumerate(self.feature_columns)
+                      if col.lower().startswith(prefix)]
+            self._dummy_levels[key] = levels
+        return levels
+
+    def transform_frame(self, frame, out=None, serving=False):
+        """Columnar batch (DataFrame or dict of arrays) -> (n, n_features) matrix.
+
+        Used by train.py to check that served features match the training
+        matrix exactly, and by score_bulk.py. Missing or unparseable numbers
+        become 0. `serving=True` applies the request rules of transform_records
+        (UI smoking_status codes, missing sex, CBC group reset) so file rows
+        score exactly like the same payloads sent to /predict.
+        """
+        n = len(next(iter(frame.values()))) if isinstance(frame, dict) else len(frame)
+        X = self._allocate(n, out)
+        if self._cleaning:
+            cleaned = self._clean_columns(lambda name: frame[name] if name in frame else None, n)
+            frame = {**{key: frame[key] for key in frame}, **cleaned}
+
+        for key in frame:
+            column = frame[key]
+            key = str(key)
+            if serving and key == "smoking_status":
+                column = np.frompyfunc(_smoking_code, 1, 1)(np.asarray(column, dtype=object))
+            i = self.index.get(key)
+            if i is not None:
+                X[:, i] = _column_as_float(column)
+            levels = self._levels_for(key)
+            if levels:
+                missing = _is_missing(column) if serving else None
+                values = _column_as_lower_str(column)
+                for level, j in levels:
+                    hit = values == level
+                    if serving:
+                        hit &= ~missing
+                    X[:, j] = np.maximum(X[:, j], hit)
+
+        self._write_engineered(X, engineer_frame(frame, serving=serving))
+        return X
@@ -0,0 +1,116 @@
+"""Global SHAP importance over a whole evaluation set.
+
+KernelExplainer costs one model evaluation per (coalition sample x
+background row) for every explained row, so train.py used to explain only 10
+test rows. This job explains all of them: rows are split into shards that run
+on a process pool (one BLAS thread per worker), against a k-means summary of
+the training set as background. Every shard seeds NumPy's global RNG (which
+KernelExplainer samples coalitions from) with its shard number, so results do
+not depend on the number of workers.
+
+    values, report = compute_importance(model, X_train_scaled, X_test_scaled)
+
+`values` holds the per-row class-1 SHAP values; `report` has the mean |SHAP|
+per feature (sorted), the settings and the timing.
+
+Configuration (environment):
+    GLOBAL_SHAP_BACKGROUND  k-means background summary size            (default 25)
+    GLOBAL_SHAP_NSAMPLES    coalition samples per row ("auto" = shap's default)  (default auto)
+    GLOBAL_SHAP_WORKERS     worker processes                             (default: CPU count)
+    GLOBAL_SHAP_SHARD       rows per shard                               (default 32)
+"""
+import os
+import time
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import explainers
+from inference import FusedMLP
+
+_state = {}
+
+def scaled_engine(model):
+    """NumPy forward pass of a fitted MLPClassifier on standardized inputs."""
+    return FusedMLP(model.coefs_, model.intercepts_, model.activation, model.out_activation_)
+
+def background_summary(X, size, seed=0):
+    """k-means summary of `X` with `size` weighted centroids (all rows if X is smaller)."""
+    X = np.asarray(X, dtype=np.float64)
+    if len(X) <= size:
+        return X
+    # shap.kmeans clusters with a fixed random_state; seed numpy too for its tie-breaking
+    np.random.seed(seed)
+    return explainers.shap_module().kmeans(X, size, round_values=False)
+
+def _init_worker(engine, background, nsamples):
+    from threadpoolctl import threadpool_limits
+    # One BLAS thread per process; the pool provides the parallelism
+    threadpool_limits(1)
+    logging.getLogger("shap").setLevel(logging.WARNING)
+    _state.update(explainer=explainers.kernel_explainer(engine, background), nsamples=nsamples)
+
+def _explain_shard(shard, rows):
+    started = time.perf_counter()
+    np.random.seed(shard)
+    values = _state["explainer"].shap_values(rows, nsamples=_state["nsamples"], silent=True)
+    return shard, explainers.class1_values(values, len(rows)), time.perf_counter() - started
+
+def compute_importance(model, X_background, X, feature_columns=None, background_size=None, nsamples=None,
+                       workers=None, shard_size=None):
+    """Class-1 SHAP values for every row of X; returns (values, report)."""
+    background_size = background_size or int(os.environ.get("GLOBAL_SHAP_BACKGROUND", "25"))
+    nsamples = nsamples or os.environ.get("GLOBAL_SHAP_NSAMPLES", "auto")
+    nsamples = nsamples if nsamples == "auto" else int(nsamples)
+    workers = workers or int(os.environ.get("GLOBAL_SHAP_WORKERS", "0")) or os.cpu_count() or 1
+    shard_size = shard_size or int(os.environ.get("GLOBAL_SHAP_SHARD", "32"))
+    if feature_columns is None:
+        feature_columns = list(getattr(X, "columns", range(np.shape(X)[1])))
+
+    started = time.perf_counter()
+    X = np.asarray(X, dtype=np.float64)
+    engine = model if isinstance(model, FusedMLP) else scaled_engine(model)
+    background = background_summary(X_background, background_size)
+    shards = [X[i:i + shard_size] for i in range(0, len(X), shard_size)]
+    values = np.empty(X.shape, dtype=np.float64)
+    shard_seconds = []
+
+    workers = min(workers, len(shards)) if "fork" in multiprocessing.get_all_start_methods() else 1
+    if workers > 1:
+        # Forked, so workers inherit the engine and background instead of unpickling them
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork"),
+                                 initializer=_init_worker, initargs=(engine, background, nsamples)) as pool:
+            results = pool.map(_explain_shard, range(len(shards)), shards)
+            for shard, shard_values, seconds in results:
+                values[shard * shard_size:shard * shard_size + len(shard_values)] = shard_values
+                shard_seconds.append(seconds)
+    else:
+        _init_worker(engine, background, nsamples)
+        for shard, rows in enumerate(shards):
+            _, shard_values, seconds = _explain_shard(shard, rows)
+            values[shard * shard_size:shard * shard_size + len(shard_values)] = shard_values
+            shard_seconds.append(seconds)
+    elapsed = time.perf_counter() - started
+
+    mean_abs = np.abs(values).mean(axis=0) if len(values) else np.zeros(X.shape[1])
+    order = np.argsort(-mean_abs, kind="stable")
+    report = {
+        "features": [{"feature": str(feature_columns[i]), "mean_abs_shap": round(float(mean_abs[i]), 6)}
+                     for i in order],
+        "rows": int(len(X)),
+        "background_size": int(len(getattr(background, "data", background))),
+        "nsamples": nsamples,
+        "timing": {
+            "seconds": round(elapsed, 3),
+            "workers": int(workers),
+            "shards": len(shards),
+            "shard_seconds_max": round(max(shard_seconds), 3) if shard_seconds else 0.0,
+            "rows_per_second": round(len(X) / elapsed, 2) if elapsed > 0 else None,
+        },
+    }
+    return values, report
+
+def top_features(report, limit=10):
+    """metrics.json `top_features` entries from a compute_importance report."""
+    return [{"rank": rank, "feature": entry["feature"], "shap_mean": round(entry["mean_abs_shap"], 4)}
+            for rank, entry in enumerate(report["features"][:limit], start=1)]
@@ -0,0 +1,284 @@
+"""Incremental model updates from newly labeled assessments, without a full retrain.
+
+    python incremental_update.py outcomes.ndjson
+    python incremental_update.py outcomes.csv --holdout reference.csv --epochs 10
+    python incremental_update.py outcomes.parquet --label-column outcome --output-dir model_b --dry-run
+
+Loads model/cancer_risk_model.pkl and scaler.pkl and fine-tunes them on the
+new rows, instead of rerunning train.py's ingestion, Optuna search and final
+fit. Rows are /predict payloads with a 0/1 label column. An Assessment export
+whose features sit under "biomarkers" / "history" is flattened first. Features
+are built by the same FeatureTransformer as serving.
+
+1. A stratified --holdout-fraction of the new rows is set aside. Optionally a
+   fixed --holdout file is added, e.g. a sample of the original data, which
+   guards against forgetting what the model knew.
+2. The scaler's running mean/variance are updated with the remaining rows
+   (StandardScaler.partial_fit). The first layer is rebased onto the new
+   scaler, so the network computes exactly the same function as before.
+   inference.fold_scaler applies the same algebra. The SHAP background is
+   re-standardized with the new statistics.
+3. The network continues training with MLPClassifier.partial_fit for --epochs
+   passes over those rows, reusing its Adam state.
+4. The old and updated models are evaluated on each held-out set: ROC AUC, PR
+   AUC and recall at the decision threshold. The update is accepted only if
+   no metric drops by more than --tolerance.
+
+An accepted update is written as a new version to --output-dir (default:
+model/). The pickles are written first and the model bundle last, so a
+running app.py hot-reloads it like any other version. A directory used as a
+MODEL_VARIANTS entry can serve it as a traffic split or shadow first.
+metrics.json keeps the test metrics of the last full training and records
+the update under "incremental_update". global_importance.json and
+shap_values.npy are left as they are until the next train.py run.
+
+Every run, accepted or not, is reported in reports/incremental_update.json.
+The exit status is 1 when the update is rejected.
+"""
+import os
+import sys
+import copy
+import json
+import time
+import shutil
+import logging
+import argparse
+import numpy as np
+import joblib
+from sklearn.metrics import roc_auc_score, average_precision_score, recall_score, f1_score, precision_score
+from sklearn.model_selection import train_test_split
+from bundle import write_bundle, bundle_path, read_preprocessing
+from features import FeatureTransformer
+from score_bulk import file_format, read_chunks
+
+_SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_DIR = os.path.join(_SCRIPT_DIR, "model")
+REPORT_PATH = os.path.join(_SCRIPT_DIR, "reports", "incremental_update.json")
+
+# Metrics an update may not regress on (beyond the tolerance)
+GATED_METRICS = ("roc_auc", "pr_auc", "recall_high_risk")
+
+def load_labeled(path, transformer, label_column, fmt=None):
+    """Raw feature rows (a DataFrame, as train.py fits on) and 0/1 labels from a file of labeled payloads."""
+    import pandas as pd
+    frame = pd.concat(list(read_chunks(path, 100000, file_format(path, fmt))), ignore_index=True)
+    if label_column not in frame.columns:
+        raise ValueError(f"{path} has no label column '{label_column}'")
+    labels = pd.to_numeric(frame[label_column].replace({True: 1, False: 0}), errors="coerce")
+    keep = labels.isin([0, 1]).to_numpy()
+    if not keep.all():
+        logging.warning(f"{path}: skipping {int((~keep).sum())} rows without a 0/1 label")
+    records = []
+    for row in frame[keep].drop(columns=[label_column]).to_dict("records"):
+        # Assessment exports nest the payload; biomarkers win over history, top-level keys over both
+        nested = {}
+        for key in ("history", "biomarkers"):
+            if isinstance(row.get(key), dict):
+                nested.update(row.pop(key))
+        nested.update({k: v for k, v in row.items() if not (isinstance(v, float) and np.isnan(v))})
+        records.append(nested)
+    X = pd.DataFrame(transformer.transform_records(records), columns=transformer.feature_columns)
+    return X, labels[keep].to_numpy(dtype=int)
+
+def _scaled(scaler, X):
+    import pandas as pd
+    return pd.DataFrame(scaler.transform(X), columns=X.columns, index=X.index)
+
+def _scaler_stats(scaler, n):
+    mean = scaler.mean_ if getattr(scaler, "with_mean", True) else np.zeros(n)
+    scale = scaler.scale_ if getattr(scaler, "with_std", True) else np.ones(n)
+    return np.asarray(mean, dtype=np.float64), np.asarray(scale, dtype=np.float64)
+
+def rebase_first_layer(model, old_scaler, new_scaler):
+    """Rewrite the first layer so `model` on new_scaler inputs equals `model` on old_scaler inputs.
+
+        (x - m_old) / s_old  ==  z_new * (s_new / s_old) + (m_new - m_old) / s_old,  z_new = (x - m_new) / s_new
+    """
+    n = model.coefs_[0].shape[0]
+    old_mean, old_scale = _scaler_stats(old_scaler, n)
+    new_mean, new_scale = _scaler_stats(new_scaler, n)
+    w = model.coefs_[0]
+    model.intercepts_[0] = model.intercepts_[0] + ((new_mean - old_mean) / old_scale) @ w
+    model.coefs_[0] = w * (new_scale / old_scale)[:, None]
+
+def restandardize(background, old_scaler, new_scaler):
+    """Background rows standardized with old_scaler, re-expressed for new_scaler."""
+    if background is None:
+        return None
+    import pandas as pd
+    values = np.asarray(background, dtype=np.float64)
+    old_mean, old_scale = _scaler_stats(old_scaler, values.shape[1])
+    new_mean, new_scale = _scaler_stats(new_scaler, values.shape[1])
+    values = (values * old_scale + old_mean - new_mean) / new_scale
+    if isinstance(background, pd.DataFrame):
+        return pd.DataFrame(values, columns=background.columns, index=background.index)
+    return values
+
+def evaluate(model, scaler, X, y, threshold):
+    """Held-out metrics in the metrics.json vocabulary (AUCs are None when only one class is present)."""
+    proba = model.predict_proba(_scaled(scaler, X))[:, 1]
+    pred = (proba >= threshold).astype(int)
+    both = len(np.unique(y)) == 2
+    return {
+        "rows": int(len(y)),
+        "positives": int(y.sum()),
+        "roc_auc": round(float(roc_auc_score(y, proba)), 4) if both else None,
+        "pr_auc": round(float(average_precision_score(y, proba)), 4) if both else None,
+        "recall_high_risk": round(float(recall_score(y, pred, zero_division=0)), 4),
+        "precision_high_risk": round(float(precision_score(y, pred, zero_division=0)), 4),
+        "f1_high_risk": round(float(f1_score(y, pred, zero_division=0)), 4),
+    }
+
+def regressions(before, after, tolerance):
+    """Gated metrics that dropped by more than `tolerance`, as {metric: [before, after]}."""
+    return {metric: [before[metric], after[metric]] for metric in GATED_METRICS
+            if before.get(metric) is not None and after.get(metric) is not None
+            and after[metric] < before[metric] - tolerance}
+
+def split_holdout(X, y, fraction, seed=42):
+    """(X_train, y_train, X_holdout, y_holdout), stratified when both classes have two or more rows."""
+    if fraction <= 0:
+        return X, y, X.iloc[:0], y[:0]
+    counts = np.bincount(y, minlength=2)
+    stratify = y if counts.min() >= 2 else None
+    X_train, X_hold, y_train, y_hold = train_test_split(X, y, test_size=fraction, stratify=stratify,
+                                                        random_state=seed)
+    return X_train, y_train, X_hold, y_hold
+
+def update(model, scaler, X, y, epochs):
+    """Fine-tuned copies of (model, scaler) after partial_fit on raw rows X."""
+    model, new_scaler = copy.deepcopy(model), copy.deepcopy(scaler)
+    new_scaler.partial_fit(X)
+    rebase_first_layer(model, scaler, new_scaler)
+    X_scaled = _scaled(new_scaler, X)
+    # partial_fit refuses early_stopping; restore it so a later full fit behaves as before
+    early_stopping = model.early_stopping
+    model.set_params(early_stopping=False)
+    # Models fitted with early stopping tracked validation scores, not best_loss_
+    if getattr(model, "best_loss_", None) is None:
+        model.best_loss_ = np.inf
+    for _ in range(epochs):
+        model.partial_fit(X_scaled, y)
+    model.set_params(early_stopping=early_stopping)
+    return model, new_scaler
+
+def _dump(value, path):
+    # Temp file + rename, so the MODEL_DIR watcher never reads a partial pickle
+    joblib.dump(value, path + ".tmp")
+    os.replace(path + ".tmp", path)
+
+def write_version(output_dir, model_dir, model, scaler, background, feature_columns, metrics, version):
+    os.makedirs(output_dir, exist_ok=True)
+    if os.path.abspath(output_dir) != os.path.abspath(model_dir):
+        for name in ("feature_columns.json", "preprocessing.json", "global_importance.json"):
+            if os.path.exists(os.path.join(model_dir, name)):
+                shutil.copy2(os.path.join(model_dir, name), os.path.join(output_dir, name))
+    _dump(model, os.path.join(output_dir, "cancer_risk_model.pkl"))
+    _dump(scaler, os.path.join(output_dir, "scaler.pkl"))
+    if background is not None:
+        _dump(background, os.path.join(output_dir, "background.pkl"))
+    with open(os.path.join(output_dir, "metrics.json"), "w") as f:
+        json.dump(metrics, f)
+    write_bundle(bundle_path(output_dir), model, scaler, background, feature_columns, version=version,
+                 thresholds={"decision": metrics.get("threshold", 0.30)}, metrics=metrics,
+                 preprocessing=read_preprocessing(model_dir))
+
+def run(new_path, model_dir=MODEL_DIR, output_dir=None, holdout_path=None, holdout_fraction=0.2,
+        label_column="cancer_risk", epochs=5, tolerance=0.01, input_format=None, dry_run=False):
+    """Fine-tune on `new_path` and write a new version if it holds up; returns the run report."""
+    started = time.perf_counter()
+    output_dir = output_dir or model_dir
+    model = joblib.load(os.path.join(model_dir, "cancer_risk_model.pkl"))
+    scaler = joblib.load(os.path.join(model_dir, "scaler.pkl"))
+    background_path = os.path.join(model_dir, "background.pkl")
+    background = joblib.load(background_path) if os.path.exists(background_path) else None
+    with open(os.path.join(model_dir, "feature_columns.json"), "r") as f:
+        feature_columns = json.load(f)
+    with open(os.path.join(model_dir, "metrics.json"), "r") as f:
+        metrics = json.load(f)
+    threshold = metrics.get("threshold", 0.30)
+    transformer = FeatureTransformer(feature_columns, preprocessing=read_preprocessing(model_dir))
+
+    X_new, y_new = load_labeled(new_path, transformer, label_column, input_format)
+    X_train, y_train, X_hold, y_hold = split_holdout(X_new, y_new, holdout_fraction)
+    holdouts = {}
+    if len(y_hold):
+        holdouts["new"] = (X_hold, y_hold)
+    if holdout_path:
+        holdouts["reference"] = load_labeled(holdout_path, transformer, label_column)
+    if not len(y_train):
+        raise ValueError("No labeled rows left to train on")
+    if not holdouts:
+        raise ValueError("No held-out rows; pass --holdout or a positive --holdout-fraction")
+
+    updated, new_scaler = update(model, scaler, X_train, y_train, epochs)
+    evaluation = {}
+    for name, (X, y) in holdouts.items():
+        before, after = evaluate(model, scaler, X, y, threshold), evaluate(updated, new_scaler, X, y, threshold)
+        evaluation[name] = {"before": before, "after": after, "regressions": regressions(before, after, tolerance)}
+    accepted = not any(result["regressions"] for result in evaluation.values())
+
+    base_version = str(metrics.get("model_version", "unversioned"))
+    version = time.strftime("%Y%m%d%H%M%S")
+    report = {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "input": os.path.abspath(new_path),
+        "base_version": base_version,
+        "version": version if accepted and not dry_run else None,
+        "accepted": accepted,
+        "written": accepted and not dry_run,
+        "output_dir": os.path.abspath(output_dir),
+        "train_rows": int(len(y_train)),
+        "train_positives": int(y_train.sum()),
+        "epochs": epochs,
+        "tolerance": tolerance,
+        "scaler_samples_seen": int(np.max(new_scaler.n_samples_seen_)),
+        "holdout": evaluation,
+    }
+    if report["written"]:
+        new_metrics = dict(metrics, model_version=version, last_updated=time.strftime("%Y-%m-%d"))
+        # No longer the artifacts train.py built from its stage outputs
+        new_metrics.pop("content_key", None)
+        new_metrics["incremental_update"] = {k: report[k] for k in ("base_version", "train_rows", "epochs", "holdout")}
+        write_version(output_dir, model_dir, updated, new_scaler, restandardize(background, scaler, new_scaler),
+                      feature_columns, new_metrics, version)
+    report["seconds"] = round(time.perf_counter() - started, 3)
+    os.makedirs(os.path.dirname(REPORT_PATH), exist_ok=True)
+    with open(REPORT_PATH, "w") as f:
+        json.dump(report, f, indent=2)
+    return report
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Fine-tune the current model on newly labeled rows.")
+    parser.add_argument("input", help="CSV, Parquet or NDJSON of labeled /predict payloads.")
+    parser.add_argument("--label-column", default="cancer_risk", help="0/1 outcome column.")
+    parser.add_argument("--holdout", default=None, help="Extra labeled file to check for regressions.")
+    parser.add_argument("--holdout-fraction", type=float, default=0.2,
+                        help="Share of the new rows held out for the regression check.")
+    parser.add_argument("--epochs", type=int, default=5, help="partial_fit passes over the new rows.")
+    parser.add_argument("--tolerance", type=float, default=0.01,
+                        help="Largest allowed drop in ROC AUC, PR AUC or recall on a held-out set.")
+    parser.add_argument("--model-dir", default=MODEL_DIR)
+    parser.add_argument("--output-dir", default=None, help="Where the new version goes (default: --model-dir).")
+    parser.add_argument("--input-format", choices=["csv", "parquet", "ndjson"], default=None)
+    parser.add_argument("--dry-run", action="store_true", help="Evaluate only; never write a new version.")
+    args = parser.parse_args()
+
+    report = run(args.input, model_dir=args.model_dir, output_dir=args.output_dir, holdout_path=args.holdout,
+                 holdout_fraction=args.holdout_fraction, label_column=args.label_column, epochs=args.epochs,
+                 tolerance=args.tolerance, input_format=args.input_format, dry_run=args.dry_run)
+    for name, result in report["holdout"].items():
+        for metric in GATED_METRICS:
+            print(f"  {name:<10} {metric:<17} {result['before'][metric]} -> {result['after'][metric]}")
+    if report["written"]:
+        print(f"Version {report['version']} written to {report['output_dir']} ({report['seconds']:.1f}s)")
+    elif report["accepted"]:
+        print(f"Update holds up (dry run, nothing written; {report['seconds']:.1f}s)")
+    else:
+        regressed = {name: result["regressions"] for name, result in report["holdout"].items() if result["regressions"]}
+        print(f"Update rejected, regressions: {json.dumps(regressed)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""Pure-NumPy inference for the MLPClassifier with the StandardScaler folded in.
+
+For one row, sklearn's input validation costs more than the handful of small
+matrix multiplies the network actually needs. FusedMLP folds the scaler into
+the first layer,
+
+    ((x - mean) / scale) @ W1 + b1  ==  x @ (W1 / scale[:, None]) + (b1 - (mean / scale) @ W1)
+
+and runs the forward pass in per-thread buffers that are reused across calls
+and grown on demand, so it takes raw (unscaled) features at any batch size.
+
+Tolerance against `model.predict_proba(scaler.transform(X))`, checked at load
+time by load_engine():
+    float64  max |delta p| <= 1e-9
+    float32  max |delta p| <= 1e-4
+
+Select with INFERENCE_ENGINE=numpy|sklearn and INFERENCE_DTYPE=float64|float32.
+"""
+import os
+import logging
+import threading
+import numpy as np
+
+TOLERANCE = {"float64": 1e-9, "float32": 1e-4}
+
+def _identity(h):
+    pass
+
+def _relu(h):
+    np.maximum(h, 0, out=h)
+
+def _tanh(h):
+    np.tanh(h, out=h)
+
+def _logistic(h):
+    np.negative(h, out=h)
+    np.exp(h, out=h)
+    h += 1
+    np.reciprocal(h, out=h)
+
+def _softmax(h):
+    h -= h.max(axis=1, keepdims=True)
+    np.exp(h, out=h)
+    h /= h.sum(axis=1, keepdims=True)
+
+ACTIVATIONS = {"identity": _identity, "relu": _relu, "tanh": _tanh, "logistic": _logistic, "softmax": _softmax}
+
+def fold_scaler(w1, b1, mean, scale):
+    """First-layer weights and bias that take raw instead of standardized inputs."""
+    if scale is not None:
+        w1 = w1 / scale[:, None]
+    if mean is not None:
+        b1 = b1 - mean @ w1
+    return w1, b1
+
+class FusedMLP:
+    """Forward pass of a fitted MLPClassifier, optionally with a scaler folded in."""
+
+    kind = "numpy"
+
+    def __init__(self, coefs, intercepts, activation, out_activation, mean=None, scale=None, dtype="float64",
+                 prefolded=False):
+        coefs = [np.asarray(w, dtype=np.float64) for w in coefs]
+        intercepts = [np.asarray(b, dtype=np.float64) for b in intercepts]
+        self.mean = None if mean is None else np.asarray(mean, dtype=np.float64)
+        self.scale_ = None if scale is None else np.asarray(scale, dtype=np.float64)
+
+        # Fold in float64, then cast once. Prefolded weights (from a model
+        # bundle) are used as-is, so memory-mapped arrays are not copied.
+        if not prefolded:
+            coefs[0], intercepts[0] = fold_scaler(coefs[0], intercepts[0], self.mean, self.scale_)
+
+        self.dtype = np.dtype(dtype)
+        self.coefs = [np.ascontiguousarray(w, dtype=self.dtype) for w in coefs]
+        self.intercepts = [np.ascontiguousarray(b, dtype=self.dtype) for b in intercepts]
+        self.activation = activation
+        self.out_activation = out_activation
+        self.n_features = self.coefs[0].shape[0]
+        self._local = threading.local()
+
+    def __getstate__(self):
+        # Per-thread buffers stay behind (explanation worker processes get a copy)
+        state = self.__dict__.copy()
+        del state["_local"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+    @classmethod
+    def from_sklearn(cls, model, scaler=None, dtype="float64"):
+        mean = scale = None
+        if scaler is not None:
+            mean = getattr(scaler, "mean_", None) if getattr(scaler, "with_mean", True) else None
+            scale = getattr(scaler, "scale_", None) if getattr(scaler, "with_std", True) else None
+        return cls(model.coefs_, model.intercepts_, model.activation, model.out_activation_,
+                   mean=mean, scale=scale, dtype=dtype)
+
+    def _buffers(self, n):
+        buffers = getattr(self._local, "buffers", None)
+        if buffers is None or buffers[0].shape[0] < n:
+            capacity = max(n, 2 * buffers[0].shape[0] if buffers is not None else 1)
+            buffers = [np.empty((capacity, self.n_features), dtype=self.dtype)]
+            buffers += [np.empty((capacity, w.shape[1]), dtype=self.dtype) for w in self.coefs]
+            self._local.buffers = buffers
+        return [b[:n] for b in buffers]
+
+    def scale(self, X):
+        """Raw features -> the scaled space the SHAP explainer works in."""
+        X = np.asarray(X, dtype=np.float64)
+        if self.mean is not None:
+            X = X - self.mean
+        if self.scale_ is not None:
+            X = X / self.scale_
+        return X
+
+    def predict_proba(self, X):
+        X = np.asarray(X)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        # sklearn's input validation rejected these; the fused pass would return NaN
+        if not np.isfinite(X).all():
+            raise ValueError("Input contains NaN or infinity.")
+        buffers = self._buffers(len(X))
+        h = buffers[0]
+        np.copyto(h, X, casting="unsafe")
+
+        last = len(self.coefs) - 1
+        with np.errstate(over="ignore"):
+            for i, (w, b) in enumerate(zip(self.coefs, self.intercepts)):
+                out = buffers[i + 1]
+                np.matmul(h, w, out=out)
+                out += b
+                ACTIVATIONS[self.out_activation if i == last else self.activation](out)
+                h = out
+
+        if h.shape[1] == 1:
+            p = h[:, 0].astype(np.float64)
+            return np.column_stack([1.0 - p, p])
+        return h.astype(np.float64)
+
+    def score(self, X):
+        """(predict_proba(X), scale(X)) for raw rows: the probabilities and the rows SHAP explains."""
+        X = np.asarray(X)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        return self.predict_proba(X), self.scale(X)
+
+class SklearnEngine:
+    """Same interface as FusedMLP, backed by scaler.transform + predict_proba."""
+
+    kind = "sklearn"
+
+    def __init__(self, model, scaler):
+        self.model = model
+        self.scaler = scaler
+
+    def scale(self, X):
+        return self.scaler.transform(X)
+
+    def predict_proba(self, X):
+        return self.score(X)[0]
+
+    def score(self, X):
+        """(predict_proba(X), scale(X)), running scaler.transform once."""
+        X = np.asarray(X)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        scaled = self.scaler.transform(X)
+        return self.model.predict_proba(scaled), scaled
+
+def max_deviation(engine, model, scaler, X):
+    """Largest absolute probability difference between `engine` and sklearn on raw X."""
+    return float(np.max(np.abs(engine.predict_proba(X) - model.predict_proba(scaler.transform(X)))))
+
+def load_engine(model, scaler, kind=None, dtype=None):
+    """Build the configured engine, falling back to sklearn if it is out of tolerance."""
+    kind = kind or os.environ.get("INFERENCE_ENGINE", "numpy")
+    dtype = dtype or os.environ.get("INFERENCE_DTYPE", "float64")
+    if kind == "sklearn" or not hasattr(model, "coefs_"):
+        return SklearnEngine(model, scaler)
+    if kind != "numpy":
+        raise ValueError(f"Unknown inference engine: {kind}")
+
+    engine = FusedMLP.from_sklearn(model, scaler, dtype=dtype)
+
+    # Probe around the training distribution, plus extreme rows
+    rng = np.random.default_rng(0)
+    mean = getattr(scaler, "mean_", np.zeros(engine.n_features))
+    spread = getattr(scaler, "scale_", np.ones(engine.n_features))
+    probe = mean + spread * rng.standard_normal((256, engine.n_features)) * np.repeat([1.0, 5.0], 128)[:, None]
+    deviation = max_deviation(engine, model, scaler, probe)
+    if deviation > TOLERANCE[str(engine.dtype)]:
+        logging.warning(f"NumPy engine deviates by {deviation:.2e} ({engine.dtype}); using sklearn instead.")
+        return SklearnEngine(model, scaler)
+    return engine
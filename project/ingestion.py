@@ -0,0 +1,231 @@
+"""Parallel ingestion of the raw cohort CSVs.
+
+Each file is read in a worker process and reduced to at most CAP positive and
+CAP negative rows, so only the capped frames come back to train.py:
+
+    header  -> column names harmonized (lower-cased, punctuation folded,
+               biomarker aliases renamed) and the target column detected
+    labels  -> string targets mapped to 0/1 with one vectorized isin()
+    capping -> the row positions to keep are drawn with the same RandomState
+               draws DataFrame.sample(n=CAP, random_state=42) makes
+
+Files below INGEST_CHUNK_MB are parsed in one read_csv call. Larger files are
+read twice in INGEST_CHUNK_ROWS chunks: first only the target column (to pick
+the capped rows), then all columns, keeping only the picked rows, so memory
+stays bounded by one chunk. In that mode column dtypes are inferred per chunk.
+
+Returned frames use compact dtypes (integers downcast, floats stored as
+float32 where that is lossless, repetitive strings as category); clean()
+restores the standard dtypes with canonical_frame() before merging.
+
+Configuration (environment):
+    INGEST_WORKERS     worker processes             (default: min(CPU count, files))
+    INGEST_CHUNK_MB    file size that switches to chunked reading  (default 256)
+    INGEST_CHUNK_ROWS  rows per chunk                              (default 100000)
+"""
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from stage_timer import PeakRSS
+
+CAP = 500
+SEED = 42
+NA_VALUES = ['?']
+
+# Mapping for alignment of biomarkers
+COLUMN_MAP = {
+    'total_wbc_count/cumm': 'wbc_count',
+    'platelet_count_/cumm': 'platelet_count',
+    'gender': 'sex',
+    'smoking': 'smoking_status',
+    'occupational_hazards': 'occupational_exposure',
+    'obesity': 'bmi'
+}
+
+# Explicit mapping mapping for this hackathon
+CANCER_POS_TERMS = ['yes', 'high', 'positive', '1', 'confirmed', 'aml', 'all', 'cll', 'cml', 'lymphoma', 'multiple myeloma', 'nsclc', 'sclc']
+
+TARGET_CANDIDATES = ['cancer_risk', 'risk_factor', 'biopsy', 'lung_cancer', 'cancer_type', 'dx_cancer', 'level', 'diagnosis_result', 'final_prediction']
+
+def harmonize_columns(columns):
+    """Standardize column names and apply the biomarker aliases."""
+    names = pd.Index(columns).astype(str).str.lower().str.strip()
+    for old, new in ((' ', '_'), ('-', '_'), ('(', ''), (')', ''), (':', '_')):
+        names = names.str.replace(old, new, regex=False)
+    return pd.Index([COLUMN_MAP.get(c, c) for c in names])
+
+def find_target(columns):
+    """First column whose name contains a target candidate, or None."""
+    hits = np.zeros(len(columns), dtype=bool)
+    for tc in TARGET_CANDIDATES:
+        hits |= np.asarray(columns.str.contains(tc, regex=False))
+    return columns[hits.argmax()] if hits.any() else None
+
+def map_labels(values):
+    """String targets -> 1 if the value is a positive term, else 0."""
+    return values.astype(str).str.lower().str.strip().isin(CANCER_POS_TERMS).astype(int)
+
+def cap_positions(labels, cap=CAP, seed=SEED):
+    """Row positions kept by the per-dataset cap: positives first, then negatives."""
+    kept = []
+    for cls in (1, 0):
+        positions = np.flatnonzero(labels == cls)
+        if len(positions) > cap:
+            # Same draw as DataFrame.sample(n=cap, random_state=seed)
+            positions = positions[np.random.RandomState(seed).choice(len(positions), size=cap, replace=False)]
+        kept.append(positions)
+    return np.concatenate(kept)
+
+def compact_frame(df):
+    """Downcast columns without changing any value."""
+    out = []
+    for _, values in df.items():
+        kind = values.dtype.kind
+        if kind == 'i':
+            values = pd.to_numeric(values, downcast='integer')
+        elif kind == 'f' and values.dtype == np.float64:
+            as32 = values.astype(np.float32)
+            if np.array_equal(as32.to_numpy(dtype=np.float64), values.to_numpy(), equal_nan=True):
+                values = as32
+        elif kind == 'O' and values.nunique(dropna=True) <= len(values) // 2:
+            values = values.astype('category')
+        out.append(values)
+    return _rebuild(df, out)
+
+def _rebuild(df, columns):
+    # Positional keys: duplicate column names must survive
+    return pd.DataFrame(dict(enumerate(columns)), index=df.index).set_axis(df.columns, axis=1)
+
+def canonical_frame(df):
+    """Undo compact_frame(): int64 / float64 / object columns, as read_csv would give."""
+    out = []
+    for _, values in df.items():
+        kind = values.dtype.kind
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.astype(object)
+        elif kind in 'iu' and values.dtype != np.int64:
+            values = values.astype(np.int64)
+        elif kind == 'f' and values.dtype != np.float64:
+            values = values.astype(np.float64)
+        out.append(values)
+    return _rebuild(df, out)
+
+def _apply_target(df, target_col):
+    if target_col:
+        df.rename(columns={target_col: 'cancer_risk'}, inplace=True)
+        # Ensure it's a Series even if multiple columns matched (unlikely but safe)
+        if isinstance(df['cancer_risk'], pd.DataFrame):
+            df['cancer_risk'] = df['cancer_risk'].iloc[:, 0]
+    else:
+        df['cancer_risk'] = 0 # If no target column found, assume no cancer risk for this dataset
+    return df
+
+def _read_whole(path):
+    df = pd.read_csv(path, na_values=NA_VALUES)
+    rows = len(df)
+    df.columns = harmonize_columns(df.columns)
+    df = _apply_target(df, find_target(df.columns))
+    if df['cancer_risk'].dtype == 'O':
+        df['cancer_risk'] = map_labels(df['cancer_risk'])
+    # Cap positives (and negatives) per dataset at 500 to avoid dominance
+    df = df.iloc[cap_positions(df['cancer_risk'].to_numpy())].reset_index(drop=True)
+    return df, rows
+
+def _chunked_labels(path, position, chunk_rows):
+    """Pass 1: the target column alone, labelled the way a full read would label it."""
+    parts = [chunk.iloc[:, 0] for chunk in pd.read_csv(path, na_values=NA_VALUES, usecols=[position],
+                                                      dtype=str, chunksize=chunk_rows)]
+    raw = pd.concat(parts, ignore_index=True) if parts else pd.Series([], dtype=object)
+    numeric = pd.to_numeric(raw, errors='coerce')
+    present = raw.notna()
+    if (numeric.notna() | ~present).all():
+        # read_csv would have parsed the column as numbers
+        if numeric.isna().any() or (numeric != np.round(numeric)).any():
+            return numeric.to_numpy(dtype=np.float64), len(raw)
+        return numeric.to_numpy(dtype=np.int64), len(raw)
+    if raw[present].isin(['True', 'False']).all():
+        # ... or as booleans
+        return (raw == 'True').to_numpy(), len(raw)
+    return map_labels(raw).to_numpy(), len(raw)
+
+def _read_chunked(path, chunk_rows):
+    columns = harmonize_columns(pd.read_csv(path, na_values=NA_VALUES, nrows=0).columns)
+    target_col = find_target(columns)
+    if target_col is not None:
+        labels, rows = _chunked_labels(path, int(np.flatnonzero(columns == target_col)[0]), chunk_rows)
+    else:
+        rows = sum(len(chunk) for chunk in pd.read_csv(path, na_values=NA_VALUES, usecols=[0], chunksize=chunk_rows))
+        labels = np.zeros(rows, dtype=np.int64)
+
+    # Pass 2: keep only the capped rows of each chunk
+    order = cap_positions(labels)
+    wanted = np.sort(order)
+    kept, start = [], 0
+    for chunk in pd.read_csv(path, na_values=NA_VALUES, chunksize=chunk_rows):
+        stop = start + len(chunk)
+        lo, hi = np.searchsorted(wanted, [start, stop])
+        if hi > lo:
+            kept.append(compact_frame(chunk.iloc[wanted[lo:hi] - start]))
+        start = stop
+    if kept:
+        df = canonical_frame(pd.concat(kept))
+    else:
+        df = pd.read_csv(path, na_values=NA_VALUES, nrows=0)
+    df = df.loc[order].reset_index(drop=True)
+    df.columns = columns
+    df = _apply_target(df, target_col)
+    df['cancer_risk'] = labels[order]
+    return df, rows
+
+def read_dataset(path, chunk_bytes=None, chunk_rows=None):
+    """One raw CSV -> (harmonized, capped frame with compact dtypes, stats)."""
+    chunk_bytes = chunk_bytes or int(float(os.environ.get("INGEST_CHUNK_MB", "256")) * 1024 * 1024)
+    chunk_rows = chunk_rows or int(os.environ.get("INGEST_CHUNK_ROWS", "100000"))
+    chunked = os.path.getsize(path) > chunk_bytes
+    started = time.perf_counter()
+    with PeakRSS() as mem:
+        df, rows = _read_chunked(path, chunk_rows) if chunked else _read_whole(path)
+        df = compact_frame(df)
+    stats = {
+        "file": os.path.basename(path),
+        "rows": int(rows),
+        "kept_rows": int(len(df)),
+        "columns": int(df.shape[1]),
+        "chunked": chunked,
+        "parse_seconds": round(time.perf_counter() - started, 4),
+        "peak_rss_mb": None if mem.peak_mb is None else round(mem.peak_mb, 1),
+        "rss_delta_mb": None if mem.delta_mb is None else round(mem.delta_mb, 1),
+    }
+    return df, stats
+
+def _read_safely(path):
+    try:
+        return read_dataset(path)
+    except Exception as e:
+        return None, {"file": os.path.basename(path), "error": str(e)}
+
+def read_datasets(paths, workers=None):
+    """Read several raw CSVs in parallel; returns ({path: frame}, [stats per file]).
+
+    A file that fails to parse is reported in its stats (with "error") and left
+    out of the frames.
+    """
+    workers = workers or int(os.environ.get("INGEST_WORKERS", "0")) or os.cpu_count() or 1
+    workers = min(workers, len(paths))
+    if workers > 1:
+        # Forked so the workers do not re-import the calling script
+        context = multiprocessing.get_context("fork") if "fork" in multiprocessing.get_all_start_methods() else None
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            results = list(pool.map(_read_safely, paths))
+    else:
+        results = [_read_safely(path) for path in paths]
+
+    frames, stats = {}, []
+    for path, (df, file_stats) in zip(paths, results):
+        if df is not None:
+            frames[path] = df
+        stats.append(file_stats)
+    return frames, stats
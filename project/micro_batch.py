@@ -0,0 +1,149 @@
+"""Dynamic micro-batching of concurrent single-patient /predict calls.
+
+Request threads hand their feature rows to MicroBatcher.submit() and block.
+A collector thread takes the first waiting request, keeps collecting until
+`max_wait` seconds have passed since that request arrived or `max_rows` rows
+are queued, then runs the batch: requests are grouped by model version and
+explain mode, and each group gets one `run(served, X, explain)` call (one
+vectorized scale + predict_proba and one SHAP call in app.py). Results are
+fanned back out row by row. While a batch runs, newly arriving requests
+queue up and form the next batch, so batches grow with load on their own.
+
+Configuration (environment):
+    MICRO_BATCH                 1 enables the batcher in app.py       (default 0)
+    MICRO_BATCH_MAX_WAIT_MS     collection window after the first request  (default 3)
+    MICRO_BATCH_MAX_ROWS        rows per batch                        (default 32)
+"""
+import os
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+import numpy as np
+
+# Queued by stop(): the collector finishes the requests ahead of it, then exits
+_STOP = object()
+
+class _Request:
+    __slots__ = ("served", "X", "explain", "future", "enqueued")
+
+    def __init__(self, served, X, explain):
+        self.served = served
+        self.X = X
+        self.explain = explain
+        self.future = Future()
+        self.enqueued = time.perf_counter()
+
+class MicroBatcher:
+    """Coalesces concurrent requests into batched `run(served, X, explain)` calls.
+
+    `run` returns a list with one result per row of X. `on_batch(rows,
+    queue_delays)` is called after every batch (for metrics).
+    """
+
+    def __init__(self, run, max_wait=0.003, max_rows=32, on_batch=None):
+        self.run = run
+        self.max_wait = max_wait
+        self.max_rows = max(int(max_rows), 1)
+        self.on_batch = on_batch
+        self.batches = 0
+        self.rows = 0
+        self._queue = queue.Queue()
+        self._carry = None  # request (or _STOP) that starts the next batch
+        self._stopped = False
+        self._stop_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._loop, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def from_env(cls, run, on_batch=None):
+        """A batcher when MICRO_BATCH=1, else None."""
+        if os.environ.get("MICRO_BATCH", "0") != "1":
+            return None
+        return cls(run,
+                   max_wait=float(os.environ.get("MICRO_BATCH_MAX_WAIT_MS", "3")) / 1000,
+                   max_rows=int(os.environ.get("MICRO_BATCH_MAX_ROWS", "32")),
+                   on_batch=on_batch)
+
+    def submit(self, served, X, explain, timeout=None):
+        """Results for the rows of X, computed in a shared batch (blocks until done)."""
+        request = _Request(served, X, explain)
+        # Checked and queued together, so nothing lands behind the stop signal
+        with self._stop_lock:
+            if self._stopped:
+                raise RuntimeError("Micro-batcher is shut down.")
+            self._queue.put(request)
+        return request.future.result(timeout)
+
+    def _collect(self):
+        first = self._carry if self._carry is not None else self._queue.get()
+        self._carry = None
+        if first is _STOP:
+            return None
+        batch, rows = [first], len(first.X)
+        deadline = first.enqueued + self.max_wait
+        while rows < self.max_rows:
+            remaining = deadline - time.perf_counter()
+            try:
+                request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is _STOP or rows + len(request.X) > self.max_rows:
+                # Starts the next batch (or stops the loop once this one is done)
+                self._carry = request
+                break
+            batch.append(request)
+            rows += len(request.X)
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            started = time.perf_counter()
+            rows = sum(len(request.X) for request in batch)
+            groups = {}
+            for request in batch:
+                groups.setdefault((id(request.served), request.explain), []).append(request)
+            for requests in groups.values():
+                self._run_group(requests)
+            self.batches += 1
+            self.rows += rows
+            if self.on_batch is not None:
+                try:
+                    self.on_batch(rows, [started - request.enqueued for request in batch])
+                except Exception as e:
+                    logging.warning(f"Micro-batch metrics callback failed: {e}")
+
+    def _run_group(self, requests):
+        head = requests[0]
+        try:
+            X = head.X if len(requests) == 1 else np.vstack([request.X for request in requests])
+            results = self.run(head.served, X, head.explain)
+        except Exception as e:
+            for request in requests:
+                request.future.set_exception(e)
+            return
+        offset = 0
+        for request in requests:
+            request.future.set_result(results[offset:offset + len(request.X)])
+            offset += len(request.X)
+
+    def stop(self, timeout=None):
+        """Finish the queued requests, then stop the collector thread."""
+        with self._stop_lock:
+            if not self._stopped:
+                self._stopped = True
+                self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "rows": self.rows,
+            "mean_rows_per_batch": round(self.rows / self.batches, 2) if self.batches else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 3),
+            "max_rows": self.max_rows,
+        }
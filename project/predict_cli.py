@@ -1,151 +1,116 @@
+import time
+_IMPORT_START = time.perf_counter()
 import os
 import json
 import sys
+import argparse
+import threading
 import numpy as np
-import pandas as pd
-import joblib
 import warnings
-import shap
 import io
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import redirect_stdout, redirect_stderr
+import explainers
+import request_profiler
+from request_profiler import stage
+from artifacts import load_artifacts as load_model_artifacts
+from explain_cache import ExplanationCache, DEFAULT_CACHE_PATH
 
 # Suppress warnings for clean stdout
 warnings.filterwarnings('ignore')
 
 MODEL_DIR = os.path.join(os.path.dirname(__file__), "model")
 
-def run_prediction():
+# Import / model-load / shap-import timings for this process (--timings, serve banner)
+TIMINGS = {"import_seconds": round(time.perf_counter() - _IMPORT_START, 4)}
+
+def load_artifacts(engine=None):
+    # Memory-mapped model bundle when present, the separate pickles otherwise
+    load_start = time.perf_counter()
+    artifacts = load_model_artifacts(MODEL_DIR, engine=engine)
+    TIMINGS["model_load_seconds"] = round(time.perf_counter() - load_start, 4)
+
+    # Explanations persist on disk (cache/explanations.sqlite, or EXPLAIN_CACHE_PATH)
+    # so separate one-shot invocations and worker restarts reuse each other's SHAP results
     try:
-        # Load models
-        model = joblib.load(os.path.join(MODEL_DIR, "cancer_risk_model.pkl"))
-        scaler = joblib.load(os.path.join(MODEL_DIR, "scaler.pkl"))
-        background_data = joblib.load(os.path.join(MODEL_DIR, "background.pkl"))
-        
-        with open(os.path.join(MODEL_DIR, "feature_columns.json"), "r") as f:
-            feature_columns = json.load(f)
-        
-        # Read input from stdin
-        input_data = json.load(sys.stdin)
-        
-        # Build raw dataframe row from input
-        row_dict = {col: 0.0 for col in feature_columns}
-        
-        # Manually map numerical inputs
-        for k, v in input_data.items():
-            if k in row_dict:
-                try:
-                    row_dict[k] = float(v) if v is not None else 0.0
-                except (ValueError, TypeError):
-                    pass
-        # Clean up input_data first to convert numeric categorical IDs from the web UI to strings
-        if 'smoking_status' in input_data:
-            ss = str(input_data['smoking_status'])
-            if ss == '0': input_data['smoking_status'] = 'Non-Smoker'
-            elif ss == '1': input_data['smoking_status'] = 'Former Smoker'
-            elif ss == '2': input_data['smoking_status'] = 'Smoker'
-            
-        # Handle Categorical Dummy Columns Generically
-        for k, v in input_data.items():
-            if v is None: continue
-            # Try to match dummy columns like k_v (case-insensitive)
-            search_prefix = f"{k}_"
-            for col in feature_columns:
-                if col.lower().startswith(search_prefix.lower()):
-                    # If the value matches the part after the underscore (case-insensitive)
-                    val_part = col[len(search_prefix):]
-                    if val_part.lower() == str(v).lower():
-                        row_dict[col] = 1.0
-
-        # Special handling for sex-specific engineered flags
-        sex_input = str(input_data.get("sex", "male")).strip().lower()
-
-        # Feature Engineering (NLR, PLR, MLR, Flags)
-        wbc = input_data.get("wbc_count", 0)
-        neut_pct = input_data.get("neutrophil_pct", 0)
-        lymph_pct = input_data.get("lymphocyte_pct", 0)
-        platelets = input_data.get("platelet_count", 0)
-        hemoglobin = input_data.get("hemoglobin", 0)
-
-        # Convert to float safely
-        try:
-            wbc_f = float(wbc) if wbc else 0
-            neut_f = float(neut_pct) if neut_pct else 0
-            lymph_f = float(lymph_pct) if lymph_pct else 1e-9
-            plat_f = float(platelets) if platelets else 0
-            hemo_f = float(hemoglobin) if hemoglobin else 0
-        except:
-            wbc_f, neut_f, lymph_f, plat_f, hemo_f = 0, 0, 1e-9, 0, 0
-        
-        neut_count = (neut_f / 100.0) * wbc_f if wbc_f else 0
-        lymph_count = (lymph_f / 100.0) * wbc_f if wbc_f else 1e-9
-        
-        if "neutrophil_count" in row_dict:
-            row_dict["neutrophil_count"] = neut_count
-        if "lymphocyte_count" in row_dict:
-            row_dict["lymphocyte_count"] = lymph_count
-            
-        if "NLR" in row_dict:
-            row_dict["NLR"] = neut_count / lymph_count
-        if "PLR" in row_dict:
-            row_dict["PLR"] = plat_f / lymph_count
-        if "MLR" in row_dict:
-            mono_pct = max(0, 100 - neut_f - lymph_f)
-            mono_count = (mono_pct / 100.0) * wbc_f if wbc_f else 0
-            if "monocyte_count" in row_dict:
-                row_dict["monocyte_count"] = mono_count
-            row_dict["MLR"] = mono_count / lymph_count
-            
-        if "anemia_flag" in row_dict:
-            row_dict["anemia_flag"] = 1 if ((sex_input == 'female' and hemo_f < 12) or (sex_input == 'male' and hemo_f < 13.5)) else 0
-        if "thrombocytosis_flag" in row_dict:
-            row_dict["thrombocytosis_flag"] = 1 if plat_f > 400 else 0
-        if "high_nlr_flag" in row_dict:
-            row_dict["high_nlr_flag"] = 1 if row_dict.get("NLR", 0) > 3.0 else 0
-            
-        df = pd.DataFrame([row_dict])
-        df = df[feature_columns]
-        
-        # Scale and Predict
-        scaled_features = scaler.transform(df)
-        raw_prob = model.predict_proba(scaled_features)[0][1]
-        
-        # Clinical Heuristics Boost (Medical AI Safeguard)
-        # If multiple critical flags are set or tumor markers are extremely high, 
-        # we give a small boost to ensure they cross the 'High' threshold.
-        boost = 0.0
-        if row_dict.get("anemia_flag") and row_dict.get("thrombocytosis_flag"): boost += 0.15
-        if row_dict.get("high_nlr_flag"): boost += 0.10
-        if float(input_data.get("cea_level", 0) or 0) > 10: boost += 0.20
-        if float(input_data.get("crp_level", 0) or 0) > 20: boost += 0.10
-        
-        prob = min(0.99, raw_prob + boost)
-        
-        # Align thresholds with train.py intent (0.30 was used for evaluation)
-        # We'll use: High >= 0.55, Medium >= 0.30, Low < 0.30
-        if prob >= 0.55:
-            risk_level = "High"
-        elif prob >= 0.30:
-            risk_level = "Medium"
-        else:
-            risk_level = "Low"
+        namespace = explainers.cache_namespace(artifacts.fingerprint, artifacts.model)
+        explain_cache = ExplanationCache.from_env(namespace=namespace, default_path=DEFAULT_CACHE_PATH)
+    except Exception:
+        explain_cache = None
+
+    return {
+        "model": artifacts.model,
+        "background_data": artifacts.background,
+        "transformer": artifacts.transformer,
+        "feature_columns": artifacts.feature_columns,
+        "engine": artifacts.engine,
+        "explain_cache": explain_cache,
+        "version": artifacts.version,
+    }
+
+def predict(input_data, artifacts, explainer=None, quiet=True, explain=True):
+    model = artifacts["model"]
+    feature_columns = artifacts["feature_columns"]
+
+    with stage("features"):
+        row = artifacts["transformer"].transform(input_data)
+    invalid = artifacts["transformer"].invalid_rows(row.reshape(1, -1))
+    if invalid:
+        raise ValueError(invalid[0])
+    index = artifacts["transformer"].index
+
+    # Scale and Predict
+    with stage("predict_proba"):
+        proba, scaled_features = artifacts["engine"].score(row)
+    raw_prob = proba[0][1]
 
+    # Clinical Heuristics Boost (Medical AI Safeguard)
+    # If multiple critical flags are set or tumor markers are extremely high,
+    # we give a small boost to ensure they cross the 'High' threshold.
+    boost = 0.0
+    def flag(name):
+        return name in index and row[index[name]] > 0
+    if flag("anemia_flag") and flag("thrombocytosis_flag"): boost += 0.15
+    if flag("high_nlr_flag"): boost += 0.10
+    if float(input_data.get("cea_level", 0) or 0) > 10: boost += 0.20
+    if float(input_data.get("crp_level", 0) or 0) > 20: boost += 0.10
 
-        # SHAP Analysis
-        contributions = []
+    prob = min(0.99, raw_prob + boost)
+
+    # Align thresholds with train.py intent (0.30 was used for evaluation)
+    # We'll use: High >= 0.55, Medium >= 0.30, Low < 0.30
+    if prob >= 0.55:
+        risk_level = "High"
+    elif prob >= 0.30:
+        risk_level = "Medium"
+    else:
+        risk_level = "Low"
+
+
+    # SHAP Analysis (skipped with --no-explain, so shap is never imported)
+    contributions = []
+    if explain:
         try:
-            # Trap all outputs from SHAP during execution
-            with redirect_stdout(io.StringIO()), redirect_stderr(io.StringIO()):
-                explainer = shap.KernelExplainer(model.predict_proba, background_data)
-                shap_values = explainer.shap_values(scaled_features)
-            
-            # SHAP returns [samples, features, classes] or list[samples, features]
-            if isinstance(shap_values, list):
+            def compute_shap(rows):
+                if quiet:
+                    # Trap all outputs from SHAP during execution
+                    with redirect_stdout(io.StringIO()), redirect_stderr(io.StringIO()):
+                        kernel = explainer or explainers.make_explainer(model, artifacts["background_data"])
+                        shap_values = kernel.shap_values(rows)
+                else:
+                    kernel = explainer or explainers.make_explainer(model, artifacts["background_data"])
+                    shap_values = kernel.shap_values(rows)
+                TIMINGS["shap_import_seconds"] = explainers.SHAP_IMPORT_SECONDS
+
                 # Class 1 (Risk)
-                risk_contributions = shap_values[1][0] 
-            elif len(shap_values.shape) == 3:
-                risk_contributions = shap_values[0, :, 1]
-            else:
-                risk_contributions = shap_values[0]
+                return explainers.class1_values(shap_values, len(rows))
+
+            explain_cache = artifacts.get("explain_cache")
+            with stage("shap"):
+                if explain_cache is not None:
+                    risk_contributions = explain_cache.explain(scaled_features, compute_shap)[0]
+                else:
+                    risk_contributions = compute_shap(scaled_features)[0]
 
             for i, feat in enumerate(feature_columns):
                 val = float(risk_contributions[i])
@@ -156,22 +121,132 @@ def run_prediction():
                         "score": round(val * 100, 2),
                         "type": "positive" if val > 0 else "negative"
                     })
-            
+
             contributions = sorted(contributions, key=lambda x: abs(x['score']), reverse=True)[:5]
         except Exception as shap_e:
             pass # Silent failure for SHAP
-        
-        response = {
-            "success": True,
-            "risk_score": round(prob * 100, 1),
-            "risk_level": risk_level,
-            "top_factors": contributions
-        }
-        
-        print(json.dumps(response))
+
+    return {
+        "success": True,
+        "risk_score": round(prob * 100, 1),
+        "risk_level": risk_level,
+        "top_factors": contributions
+    }
+
+def report_timings():
+    # Startup profile on stderr so stdout stays a single JSON document
+    print(json.dumps({"timings": TIMINGS}), file=sys.stderr)
+
+def run_prediction(engine=None, explain=True, timings=False, profile=False):
+    # PREDICT_PROFILE=1: profile this run (request_profiler.py); the stage
+    # breakdown goes to stderr, the profile to PROFILE_DIR
+    profiler = request_profiler.Profiler.from_env() if profile else None
+    run_profile = profiler.begin("predict_cli") if profiler else None
+    try:
+        with stage("load"):
+            artifacts = load_artifacts(engine)
+
+        # Read input from stdin
+        with stage("parse"):
+            input_data = json.load(sys.stdin)
+
+        print(json.dumps(predict(input_data, artifacts, explain=explain)))
 
     except Exception as e:
         print(json.dumps({"success": False, "error": str(e)}))
+    finally:
+        if run_profile is not None:
+            path = profiler.end(run_profile)
+            print(json.dumps({"profile": run_profile.summary(), "profile_path": path}), file=sys.stderr)
+    if timings:
+        report_timings()
+
+# ── Persistent worker mode (--serve) ──────────────────────────────────────────
+# Each stdin line is one JSON request: {"id": ..., "payload": {...}}. A bare
+# biomarker object with an "id" key is accepted too. Every request gets exactly
+# one JSON line back carrying the same id, in completion order (not input order).
+
+def serve(workers=4, engine=None, explain=True, profile=False):
+    artifacts = load_artifacts(engine)
+    # With PREDICT_PROFILE=1 a request can ask for {"profile": true}; PROFILE_SAMPLE_RATE
+    # profiles a random fraction of the others. The summary comes back as "profile".
+    profiler = request_profiler.Profiler.from_env() if profile else None
+
+    # Responses go to the real stdout; anything a library prints goes to stderr
+    # so it can never corrupt the line protocol.
+    protocol_out = sys.stdout
+    sys.stdout = sys.stderr
+    write_lock = threading.Lock()
+
+    # KernelExplainer keeps per-call state on the instance, so each worker
+    # thread builds its own once and reuses it for every request it handles.
+    local = threading.local()
+
+    def get_explainer():
+        if not hasattr(local, "explainer"):
+            try:
+                local.explainer = explainers.make_explainer(artifacts["model"], artifacts["background_data"])
+            except Exception:
+                local.explainer = None
+        return local.explainer
+
+    def respond(message):
+        line = json.dumps(message)
+        with write_lock:
+            protocol_out.write(line + "\n")
+            protocol_out.flush()
+
+    def handle(line):
+        request_id = request_profile = None
+        try:
+            message = json.loads(line)
+            if not isinstance(message, dict):
+                raise ValueError("Request must be a JSON object")
+            request_id = message.get("id")
+            payload = message["payload"] if "payload" in message else {k: v for k, v in message.items() if k not in ("id", "profile")}
+            if not isinstance(payload, dict):
+                raise ValueError("payload must be a JSON object")
+            if profiler is not None and (message.get("profile") is True or profiler.sampled()):
+                request_profile = profiler.begin("predict_cli.serve")
+        except Exception as e:
+            result = {"success": False, "error": str(e)}
+        else:
+            try:
+                if explain:
+                    result = predict(payload, artifacts, explainer=get_explainer(), quiet=False)
+                else:
+                    result = predict(payload, artifacts, explain=False)
+            except Exception as e:
+                result = {"success": False, "error": str(e)}
+            finally:
+                if request_profile is not None:
+                    profiler.end(request_profile)
+                    result["profile"] = request_profile.summary()
+        respond({"id": request_id, **result})
+
+    respond({"id": None, "success": True, "ready": True, "timings": TIMINGS})
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for line in sys.stdin:
+            line = line.strip()
+            if not line:
+                continue
+            executor.submit(handle, line)
 
 if __name__ == '__main__':
-    run_prediction()
+    parser = argparse.ArgumentParser(description="Cancer risk prediction from a JSON biomarker payload on stdin.")
+    parser.add_argument("--serve", action="store_true", help="Stay resident and answer newline-delimited JSON requests on stdin.")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent requests handled in --serve mode.")
+    parser.add_argument("--engine", choices=["numpy", "sklearn"], default=None,
+                        help="Inference engine (default: INFERENCE_ENGINE env var, else numpy).")
+    parser.add_argument("--no-explain", dest="explain", action="store_false",
+                        help="Skip SHAP explanations (shap is then never imported).")
+    parser.add_argument("--timings", action="store_true", default=os.environ.get("PREDICT_TIMINGS") == "1",
+                        help="Print import / model-load timings as JSON on stderr (or set PREDICT_TIMINGS=1).")
+    args = parser.parse_args()
+    profile = os.environ.get("PREDICT_PROFILE") == "1"
+
+    if args.serve:
+        serve(workers=args.workers, engine=args.engine, explain=args.explain, profile=profile)
+    else:
+        run_prediction(engine=args.engine, explain=args.explain, timings=args.timings, profile=profile)
@@ -0,0 +1,267 @@
+"""Pre-forked multi-worker serving of app.py with the model loaded once.
+
+    python prefork_server.py [--host HOST] [--port PORT] [--workers N]
+
+The parent imports app.py, which loads the model and (with EXPLAIN_WARMUP,
+forced on here) builds the explainer, importing shap for KernelExplainer,
+and runs one explanation. It then opens the listening socket, moves every live object
+into the permanent GC generation (gc.freeze(), so collections in the
+workers never write to the inherited pages) and forks the workers. Each
+worker accepts on the shared socket and serves one request at a time in its
+main thread, so it uses the explainer the parent built. The model weights
+and background set are shared copy-on-write; a model bundle is memory-mapped
+and additionally shared through the page cache. Workers are ready in
+milliseconds instead of re-importing shap and reloading the model.
+
+The parent runs the MODEL_DIR watcher itself (no threads, so forking stays
+safe). When a new version has been loaded and warmed it forks a fresh set of
+workers and then stops the old ones, so the new version is shared too. It
+also restarts workers that die, and stops them gracefully on SIGTERM/SIGINT:
+each worker finishes its current request first.
+
+Once all workers are up, and on SIGUSR1, the parent logs each process's
+startup time and memory (RSS, PSS, shared and private, from
+/proc/<pid>/smaps_rollup) and writes them to reports/prefork_workers.json.
+PSS is the fair per-process share: private memory plus shared pages divided
+by the number of processes mapping them.
+
+/metrics and /health describe the worker that happened to take the request.
+Micro-batching (MICRO_BATCH) is turned off: a worker has no concurrent
+requests to batch.
+
+Configuration (environment):
+    PREFORK_WORKERS        worker processes                      (default: CPU count)
+    MODEL_RELOAD_INTERVAL  seconds between MODEL_DIR checks in the parent; 0 disables  (default 10)
+"""
+import os
+import gc
+import sys
+import json
+import time
+import select
+import signal
+import socket
+import logging
+import argparse
+import threading
+
+_SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPORT_PATH = os.path.join(_SCRIPT_DIR, "reports", "prefork_workers.json")
+
+def process_memory(pid):
+    """{rss_mb, pss_mb, shared_mb, private_mb} for `pid` (Linux; RSS only where smaps_rollup is missing)."""
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                    fields[parts[0][:-1]] = int(parts[1])
+    except OSError:
+        import resource
+        if pid == os.getpid():
+            # ru_maxrss is KiB on Linux, bytes on macOS
+            divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+            return {"rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / divisor, 1)}
+        return {}
+    mb = lambda kib: round(kib / 1024, 1)
+    return {
+        "rss_mb": mb(fields.get("Rss", 0)),
+        "pss_mb": mb(fields.get("Pss", 0)),
+        "shared_mb": mb(fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0)),
+        "private_mb": mb(fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)),
+    }
+
+class PreforkServer:
+    def __init__(self, host, port, workers, reload_interval):
+        self.host = host
+        self.port = port
+        self.n_workers = workers
+        self.reload_interval = reload_interval
+        self.workers = {}  # pid -> {"generation", "startup_ms"}
+        self.generation = 0
+        self.stopping = False
+        self.report_requested = False
+        self.app = None
+        self.sock = None
+        self._ready_r = self._ready_w = None
+
+    def load(self):
+        # The parent must stay single-threaded until it forks: the MODEL_DIR
+        # watcher runs in its main loop instead, and micro-batching is off
+        os.environ["MODEL_RELOAD_INTERVAL"] = "0"
+        os.environ["EXPLAIN_WARMUP"] = "1"
+        if os.environ.get("MICRO_BATCH") == "1":
+            logging.warning("MICRO_BATCH is not used with pre-forked workers; turning it off.")
+        os.environ["MICRO_BATCH"] = "0"
+        started = time.perf_counter()
+        import app
+        self.app = app
+        for manager in app.router.managers.values():
+            # Reported by /health; the checks themselves run in run()
+            manager.interval = self.reload_interval
+        if app.models.current is None:
+            logging.warning("No model loaded yet; workers answer 503 until one is trained.")
+        logging.info(f"Parent loaded and warmed the service in {time.perf_counter() - started:.2f}s")
+
+    def listen(self):
+        self.sock = socket.create_server((self.host, self.port), reuse_port=False, backlog=1024)
+        # --port 0 binds a free port; log and serve the one actually bound
+        self.port = self.sock.getsockname()[1]
+        self.sock.set_inheritable(True)
+        self._ready_r, self._ready_w = os.pipe()
+
+    def spawn(self):
+        forked_at = time.monotonic()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                self._run_worker(forked_at)
+            finally:
+                os._exit(0)
+        self.workers[pid] = {"generation": self.generation, "startup_ms": None}
+        return pid
+
+    def _run_worker(self, forked_at):
+        from werkzeug.serving import make_server
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGUSR1, signal.SIG_DFL)
+        os.close(self._ready_r)
+        self.app.router.after_fork()
+        server = make_server(self.host, self.port, self.app.app, threaded=False, fd=self.sock.fileno())
+        # shutdown() waits for serve_forever to return, so it runs on a helper
+        # thread; the request being handled finishes first
+        signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown, daemon=True).start())
+        os.write(self._ready_w, f"{os.getpid()} {(time.monotonic() - forked_at) * 1000:.2f}\n".encode())
+        server.serve_forever()
+
+    def wait_ready(self, pids, timeout=30.0):
+        pending, buffer = set(pids), b""
+        deadline = time.monotonic() + timeout
+        while pending and time.monotonic() < deadline:
+            readable, _, _ = select.select([self._ready_r], [], [], max(deadline - time.monotonic(), 0))
+            if not readable:
+                break
+            buffer += os.read(self._ready_r, 4096)
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                pid, startup_ms = line.split()
+                pid = int(pid)
+                if pid in self.workers:
+                    self.workers[pid]["startup_ms"] = float(startup_ms)
+                pending.discard(pid)
+        if pending:
+            logging.warning(f"Workers not ready after {timeout}s: {sorted(pending)}")
+
+    def fork_generation(self):
+        """Fork a full set of workers from the current parent state; returns their pids."""
+        self.generation += 1
+        gc.collect()
+        gc.freeze()
+        pids = [self.spawn() for _ in range(self.n_workers)]
+        self.wait_ready(pids)
+        return pids
+
+    def report(self):
+        parent = {"pid": os.getpid(), "role": "parent", **process_memory(os.getpid())}
+        workers = [{"pid": pid, "role": "worker", "generation": info["generation"],
+                    "startup_ms": info["startup_ms"], **process_memory(pid)}
+                   for pid, info in sorted(self.workers.items())]
+        served = self.app.models.current
+        report = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "model_version": served.version if served is not None else None,
+            "processes": [parent] + workers,
+            "total_rss_mb": round(sum(p.get("rss_mb", 0) for p in [parent] + workers), 1),
+            "total_pss_mb": round(sum(p.get("pss_mb", 0) for p in [parent] + workers), 1),
+        }
+        for p in report["processes"]:
+            logging.info(f"{p['role']:>6} {p['pid']:>7}  startup {p.get('startup_ms') or '-':>8} ms  "
+                         f"rss {p.get('rss_mb', '-')} MB  pss {p.get('pss_mb', '-')} MB  "
+                         f"shared {p.get('shared_mb', '-')} MB  private {p.get('private_mb', '-')} MB")
+        logging.info(f"Total PSS {report['total_pss_mb']} MB (RSS sum {report['total_rss_mb']} MB)")
+        os.makedirs(os.path.dirname(REPORT_PATH), exist_ok=True)
+        with open(REPORT_PATH, "w") as f:
+            json.dump(report, f, indent=2)
+        return report
+
+    def _stop(self, *_):
+        self.stopping = True
+        for pid in list(self.workers):
+            self._signal(pid, signal.SIGTERM)
+
+    def _request_report(self, *_):
+        self.report_requested = True
+
+    @staticmethod
+    def _signal(pid, sig):
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            pass
+
+    def _reap(self):
+        while self.workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self.workers.clear()
+                return
+            if pid == 0:
+                return
+            info = self.workers.pop(pid, None)
+            if info is not None and not self.stopping and info["generation"] == self.generation:
+                logging.warning(f"Worker {pid} exited (status {status}); starting a replacement")
+                self.wait_ready([self.spawn()])
+
+    def _check_models(self):
+        changed = False
+        for manager in self.app.router.managers.values():
+            changed = manager.check() or changed
+        if changed:
+            old = [pid for pid, info in self.workers.items() if info["generation"] == self.generation]
+            self.fork_generation()
+            logging.info(f"New model version is serving; stopping {len(old)} old workers")
+            for pid in old:
+                self._signal(pid, signal.SIGTERM)
+            self.report_requested = True
+
+    def run(self):
+        self.load()
+        self.listen()
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        signal.signal(signal.SIGUSR1, self._request_report)
+        self.fork_generation()
+        logging.info(f"Serving on http://{self.host}:{self.port} with {self.n_workers} workers")
+        self.report()
+
+        next_check = time.monotonic() + self.reload_interval
+        while not (self.stopping and not self.workers):
+            self._reap()
+            if not self.stopping and self.reload_interval > 0 and time.monotonic() >= next_check:
+                try:
+                    self._check_models()
+                except Exception as e:
+                    logging.error(f"Model watcher error: {e}")
+                next_check = time.monotonic() + self.reload_interval
+            if self.report_requested and not self.stopping:
+                self.report_requested = False
+                self.report()
+            time.sleep(0.1)
+        logging.info("All workers stopped")
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Serve app.py from pre-forked workers sharing one loaded model.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("PREFORK_WORKERS", "0")) or os.cpu_count() or 1)
+    args = parser.parse_args()
+    if not hasattr(os, "fork"):
+        sys.exit("prefork_server.py needs os.fork (Linux/macOS); use app.py or asgi_app.py instead.")
+    PreforkServer(args.host, args.port, args.workers,
+                  reload_interval=float(os.environ.get("MODEL_RELOAD_INTERVAL", "10"))).run()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""Opt-in profiling of single prediction requests.
+
+A profiled request records a stage breakdown (parse, features, scale,
+predict_proba, shap, ...) plus either a cProfile profile or a sampled stack
+profile, and writes them to PROFILE_DIR:
+
+    <id>.json     label, mode, total time and seconds per stage
+    <id>.prof     cProfile stats (load with pstats / snakeviz) + <id>.txt summary
+    <id>.folded   sampled stacks in collapsed format (flamegraph.pl, speedscope)
+
+Code marks stages with `stage(name)`, which costs one context-variable lookup
+when the current request is not being profiled, so the hooks stay compiled
+into production builds. Only one request is profiled at a time; others run
+unprofiled while it is busy.
+
+app.py profiles a request when it sends `X-Profile: 1` (or ?profile=1)
+together with `X-Profile-Token: <PROFILE_TOKEN>`; without PROFILE_TOKEN set,
+explicit requests are refused. PROFILE_SAMPLE_RATE additionally profiles a
+random fraction of all requests to side files only. predict_cli.py profiles
+its run when PREDICT_PROFILE=1.
+
+Configuration (environment):
+    PROFILE_TOKEN        admin token required for X-Profile requests   (default: unset = refused)
+    PROFILE_SAMPLE_RATE  fraction of requests profiled automatically   (default 0)
+    PROFILE_MODE         cprofile | sampling                           (default cprofile)
+    PROFILE_INTERVAL     sampling interval in seconds                  (default 0.001)
+    PROFILE_DIR          side-file directory                   (default reports/profiles)
+    PROFILE_KEEP         profiles kept in PROFILE_DIR (oldest removed)  (default 200)
+"""
+import os
+import sys
+import hmac
+import json
+import time
+import uuid
+import random
+import threading
+import contextvars
+from collections import Counter
+from contextlib import nullcontext
+
+_SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PROFILE_DIR = os.path.join(_SCRIPT_DIR, "reports", "profiles")
+MODES = ("cprofile", "sampling")
+
+_active = contextvars.ContextVar("request_profile", default=None)
+_NULL = nullcontext()
+
+def current():
+    """The RequestProfile of the running request, or None."""
+    return _active.get()
+
+class _Stage:
+    __slots__ = ("name", "inner", "profile", "start")
+
+    def __init__(self, name, inner, profile):
+        self.name = name
+        self.inner = inner
+        self.profile = profile
+
+    def __enter__(self):
+        if self.inner is not None:
+            self.inner.__enter__()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profile.add_stage(self.name, time.perf_counter() - self.start)
+        if self.inner is not None:
+            return self.inner.__exit__(*exc)
+        return False
+
+def stage(name, inner=None):
+    """Context manager timing stage `name` into the current profile; also enters `inner` if given."""
+    profile = _active.get()
+    if profile is None:
+        return _NULL if inner is None else inner
+    return _Stage(name, inner, profile)
+
+class _StackSampler:
+    """Samples one thread's Python stack every `interval` seconds from a background thread."""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+class RequestProfile:
+    def __init__(self, label, mode, interval):
+        self.id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.label = label
+        self.mode = mode
+        self.interval = interval
+        self.stages = []
+        self.total_seconds = None
+        self._profiler = None
+        self._sampler = None
+        self._started = None
+        self._token = None
+
+    def add_stage(self, name, seconds):
+        self.stages.append((name, seconds))
+
+    def start(self):
+        if self.mode == "sampling":
+            self._sampler = _StackSampler(threading.get_ident(), self.interval)
+            self._sampler.start()
+        else:
+            import cProfile
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        self._token = _active.set(self)
+        self._started = time.perf_counter()
+
+    def stop(self):
+        self.total_seconds = time.perf_counter() - self._started
+        _active.reset(self._token)
+        if self._profiler is not None:
+            self._profiler.disable()
+        if self._sampler is not None:
+            self._sampler.stop()
+
+    def stage_seconds(self):
+        totals = {}
+        for name, seconds in self.stages:
+            totals[name] = totals.get(name, 0.0) + seconds
+        return totals
+
+    def server_timing(self):
+        """Server-Timing header value (durations in milliseconds)."""
+        parts = [f"{name};dur={seconds * 1000:.3f}" for name, seconds in self.stage_seconds().items()]
+        parts.append(f"total;dur={(self.total_seconds or 0.0) * 1000:.3f}")
+        return ", ".join(parts)
+
+    def summary(self):
+        return {
+            "id": self.id,
+            "label": self.label,
+            "mode": self.mode,
+            "total_seconds": None if self.total_seconds is None else round(self.total_seconds, 6),
+            "stages": {name: round(seconds, 6) for name, seconds in self.stage_seconds().items()},
+        }
+
+    def save(self, directory):
+        """Write the side files; returns the path of the JSON summary."""
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, self.id)
+        if self._profiler is not None:
+            import io
+            import pstats
+            self._profiler.dump_stats(base + ".prof")
+            text = io.StringIO()
+            pstats.Stats(self._profiler, stream=text).sort_stats("cumulative").print_stats(40)
+            with open(base + ".txt", "w") as f:
+                f.write(text.getvalue())
+        if self._sampler is not None:
+            with open(base + ".folded", "w") as f:
+                for stack, count in self._sampler.stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+        with open(base + ".json", "w") as f:
+            json.dump(self.summary(), f, indent=2)
+        return base + ".json"
+
+class Profiler:
+    """Decides which requests to profile and runs at most one profile at a time."""
+
+    def __init__(self, token=None, sample_rate=0.0, mode="cprofile", interval=0.001, directory=None, keep=200):
+        if mode not in MODES:
+            raise ValueError(f"PROFILE_MODE must be one of {MODES}, got {mode!r}")
+        self.token = token or None
+        self.sample_rate = sample_rate
+        self.mode = mode
+        self.interval = interval
+        self.directory = directory or DEFAULT_PROFILE_DIR
+        self.keep = keep
+        self._busy = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(token=os.environ.get("PROFILE_TOKEN"),
+                   sample_rate=float(os.environ.get("PROFILE_SAMPLE_RATE", "0")),
+                   mode=os.environ.get("PROFILE_MODE", "cprofile"),
+                   interval=float(os.environ.get("PROFILE_INTERVAL", "0.001")),
+                   directory=os.environ.get("PROFILE_DIR") or None,
+                   keep=int(os.environ.get("PROFILE_KEEP", "200")))
+
+    def authorized(self, provided):
+        return self.token is not None and provided is not None and hmac.compare_digest(self.token, provided)
+
+    def sampled(self):
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def begin(self, label):
+        """Start profiling the calling thread; None if another profile is running."""
+        if not self._busy.acquire(blocking=False):
+            return None
+        try:
+            profile = RequestProfile(label, self.mode, self.interval)
+            profile.start()
+        except Exception:
+            self._busy.release()
+            raise
+        return profile
+
+    def end(self, profile, save=True):
+        """Stop `profile`, write its side files and prune old ones; returns the summary path."""
+        try:
+            profile.stop()
+        finally:
+            self._busy.release()
+        if not save:
+            return None
+        path = profile.save(self.directory)
+        self._prune()
+        return path
+
+    def _prune(self):
+        summaries = sorted((f for f in os.listdir(self.directory) if f.endswith(".json")), reverse=True)
+        for stale in summaries[self.keep:]:
+            stem = stale[:-len(".json")]
+            for ext in (".json", ".prof", ".txt", ".folded"):
+                try:
+                    os.remove(os.path.join(self.directory, stem + ext))
+                except FileNotFoundError:
+                    pass
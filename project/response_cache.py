@@ -0,0 +1,69 @@
+"""Cache of complete prediction results, keyed on the normalized request.
+
+Clinicians re-submit the same panel (page refreshes, the Workflow and
+Dashboard pages re-querying, retries from the Node layer), and each one used
+to recompute the score and its SHAP explanation. The key is the engineered
+feature row that FeatureTransformer builds from the payload, i.e. the
+canonical numeric values after the smoking_status remapping, the sex
+normalization and the training-time cleaning, plus the model version and
+whether the result includes an explanation. Payloads that differ only in
+spelling ("Female" / "female", "2" / "Former Smoker", 55 / "55.0", unknown
+extra keys) therefore share an entry. The result is a pure function of that
+row, so a hit is exactly what the model would have returned.
+
+Entries live in an LRUCache with TTL and a byte cap. app.py clears the cache
+whenever a model version is swapped in.
+
+Configuration (environment):
+    RESPONSE_CACHE_ENTRIES  max cached results, 0 disables  (default 10000)
+    RESPONSE_CACHE_BYTES    approximate max payload bytes   (default 32 MB)
+    RESPONSE_CACHE_TTL      seconds a result stays valid    (default 300)
+"""
+import os
+import json
+import hashlib
+import numpy as np
+from explain_cache import LRUCache
+
+def _sizeof(result):
+    return len(json.dumps(result))
+
+class ResponseCache:
+    """Per-row prediction results keyed on (model version, explained, feature row)."""
+
+    def __init__(self, max_entries=10000, max_bytes=32 * 1024 * 1024, ttl=300):
+        self.enabled = max_entries > 0
+        self.results = LRUCache(max_entries=max(max_entries, 1), max_bytes=max_bytes, ttl=ttl, sizeof=_sizeof)
+        self.invalidations = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_entries=int(os.environ.get("RESPONSE_CACHE_ENTRIES", "10000")),
+            max_bytes=int(os.environ.get("RESPONSE_CACHE_BYTES", str(32 * 1024 * 1024))),
+            ttl=float(os.environ.get("RESPONSE_CACHE_TTL", "300")),
+        )
+
+    def key_for(self, served, row, explained):
+        digest = hashlib.sha256(f"{served.fingerprint}|{served.version}|{int(bool(explained))}".encode())
+        # + 0.0 folds -0.0 into 0.0
+        digest.update(np.ascontiguousarray(np.asarray(row, dtype=np.float64).ravel() + 0.0).tobytes())
+        return digest.hexdigest()
+
+    def get(self, key):
+        return self.results.get(key)
+
+    def put(self, key, result):
+        self.results.put(key, result)
+
+    def invalidate(self):
+        """Drop every entry (called when a model version is swapped in)."""
+        self.results.clear()
+        self.invalidations += 1
+
+    def hit_rate(self):
+        lookups = self.results.hits + self.results.misses
+        return self.results.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        return {"enabled": self.enabled, "invalidations": self.invalidations, **self.results.stats()}
@@ -0,0 +1,329 @@
+"""Bulk scoring of large patient files.
+
+Streams a CSV, Parquet or NDJSON file in fixed-size chunks, builds features
+with the same FeatureTransformer rules as /predict, scores the chunks on a
+process pool and appends results to the output as each chunk finishes (in
+input order). Only a bounded number of chunks is in flight at a time, so
+memory stays flat however large the input is.
+
+    python score_bulk.py registry.csv scores.csv
+    python score_bulk.py registry.parquet scores.ndjson --chunk-size 100000 --workers 8
+    python score_bulk.py registry.csv scores.csv --resume          # continue after a crash
+    python score_bulk.py registry.csv scores.csv --explain-top 500
+
+Output rows carry `row` (0-based input position), the --id-column value when
+present, `risk_probability`, `risk_score` and `risk_level` (same cut-offs as
+/predict). Rows with non-finite feature values or without a sex are not
+scored; they carry an `error` instead, as /predict_batch reports them. After
+every chunk the output is flushed and <output>.checkpoint.json records how far
+the run got; --resume truncates the output back to the last checkpoint and
+carries on from there.
+
+With --explain-top N the N highest-risk rows are explained with SHAP once
+scoring finishes and written to <output>.explanations.ndjson in the /predict
+top_factors format.
+"""
+import os
+import io
+import sys
+import csv
+import json
+import time
+import heapq
+import logging
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import explainers
+from artifacts import load_artifacts, MODEL_DIR
+from serving import risk_level_for
+
+FORMATS = {".csv": "csv", ".parquet": "parquet", ".pq": "parquet", ".ndjson": "ndjson", ".jsonl": "ndjson"}
+OUTPUT_FIELDS = ["row", "id", "risk_probability", "risk_score", "risk_level", "error"]
+
+def file_format(path, explicit=None):
+    fmt = explicit or FORMATS.get(os.path.splitext(path)[1].lower())
+    if fmt is None:
+        raise ValueError(f"Cannot tell the format of {path}; pass --input-format")
+    return fmt
+
+def read_chunks(path, chunk_size, fmt):
+    """Yield DataFrames of at most `chunk_size` rows."""
+    import pandas as pd
+    if fmt == "csv":
+        yield from pd.read_csv(path, chunksize=chunk_size)
+    elif fmt == "parquet":
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    elif fmt == "ndjson":
+        # dtype=False keeps values as sent, like a /predict payload
+        with pd.read_json(path, lines=True, chunksize=chunk_size, dtype=False) as reader:
+            yield from reader
+    else:
+        raise ValueError(f"Unsupported input format: {fmt}")
+
+# ── Worker side ───────────────────────────────────────────────────────────────
+# Each pool process loads the artifacts once; with the model bundle the
+# weights are memory-mapped, so workers share the same physical pages.
+
+_worker = {}
+
+def _init_worker(model_dir):
+    _worker["artifacts"] = load_artifacts(model_dir)
+
+def _score_chunk(frame, top_n):
+    """Probabilities for one chunk (NaN for rows in `errors`), errors by row, and its `top_n` highest-risk feature rows."""
+    artifacts = _worker["artifacts"]
+    X = artifacts.transformer.transform_frame(frame, serving=True)
+    errors = artifacts.transformer.invalid_rows(X, frame)
+    probs = np.full(len(X), np.nan)
+    ok = np.array([r for r in range(len(X)) if r not in errors], dtype=np.intp) if errors else np.arange(len(X))
+    if len(ok):
+        probs[ok] = artifacts.engine.predict_proba(X[ok])[:, 1]
+    if top_n <= 0:
+        return probs, errors, None, None
+    top = ok[np.argpartition(-probs[ok], top_n - 1)[:top_n]] if len(ok) > top_n else ok
+    return probs, errors, top, X[top]
+
+def _explain_scaled(scaled):
+    artifacts = _worker["artifacts"]
+    explainer = _worker.get("explainer")
+    if explainer is None:
+        explainer = _worker["explainer"] = explainers.make_explainer(artifacts.model, artifacts.background)
+    return explainers.class1_values(explainer.shap_values(scaled), len(scaled))
+
+class _InlinePool:
+    """Executor stand-in for --workers 0 (score in this process)."""
+
+    def __init__(self, model_dir):
+        _init_worker(model_dir)
+
+    def submit(self, fn, *args):
+        from concurrent.futures import Future
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+# ── Checkpoints ───────────────────────────────────────────────────────────────
+
+def checkpoint_path(output):
+    return f"{output}.checkpoint.json"
+
+def _input_identity(path):
+    stat = os.stat(path)
+    return {"path": os.path.abspath(path), "size": stat.st_size, "mtime": stat.st_mtime}
+
+def write_checkpoint(path, state):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def load_checkpoint(path, expected):
+    with open(path, "r") as f:
+        state = json.load(f)
+    for key, value in expected.items():
+        if state.get(key) != value:
+            raise ValueError(f"Checkpoint {path} does not match this run ({key} changed); start over without --resume")
+    return state
+
+# ── Output ────────────────────────────────────────────────────────────────────
+
+def _encode_rows(rows, fmt, header):
+    if fmt == "ndjson":
+        return "".join(json.dumps(row) + "\n" for row in rows).encode("utf-8")
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=OUTPUT_FIELDS, lineterminator="\n")
+    if header:
+        writer.writeheader()
+    writer.writerows(rows)
+    return buffer.getvalue().encode("utf-8")
+
+def _result_rows(start_row, ids, probs, errors):
+    rows = []
+    for offset, prob in enumerate(probs.tolist()):
+        if offset in errors:
+            rows.append({"row": start_row + offset, "id": ids[offset] if ids is not None else None,
+                         "risk_probability": None, "risk_score": None, "risk_level": None,
+                         "error": errors[offset]})
+            continue
+        rows.append({
+            "row": start_row + offset,
+            "id": ids[offset] if ids is not None else None,
+            "risk_probability": round(prob, 6),
+            "risk_score": round(prob * 100, 1),
+            "risk_level": risk_level_for(prob),
+        })
+    return rows
+
+def _json_id(value):
+    # numpy scalars and NaN out of pandas -> plain JSON values
+    if value is None or (isinstance(value, float) and value != value):
+        return None
+    return value.item() if hasattr(value, "item") else value
+
+# ── Driver ────────────────────────────────────────────────────────────────────
+
+def score_file(input_path, output_path, chunk_size=50000, workers=None, input_format=None, output_format=None,
+               id_column="id", explain_top=0, resume=False, model_dir=MODEL_DIR):
+    in_fmt = file_format(input_path, input_format)
+    out_fmt = file_format(output_path, output_format)
+    if out_fmt not in ("csv", "ndjson"):
+        raise ValueError("Output must be CSV or NDJSON (appendable, so runs can resume)")
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    artifacts = load_artifacts(model_dir)
+    expected = {"input": _input_identity(input_path), "chunk_size": chunk_size,
+                "model": artifacts.fingerprint, "explain_top": explain_top, "output_format": out_fmt}
+    ckpt_path = checkpoint_path(output_path)
+
+    state = {**expected, "chunks_done": 0, "rows_done": 0, "output_bytes": 0, "top": []}
+    if resume and os.path.exists(ckpt_path):
+        state = load_checkpoint(ckpt_path, expected)
+        logging.info(f"Resuming after chunk {state['chunks_done']} ({state['rows_done']} rows)")
+    elif os.path.exists(ckpt_path):
+        os.remove(ckpt_path)
+
+    # Min-heap of (probability, row, id, features) for the explanation pass
+    top = [tuple(entry) for entry in state["top"]]
+    heapq.heapify(top)
+
+    if state["output_bytes"] and (not os.path.exists(output_path) or os.path.getsize(output_path) < state["output_bytes"]):
+        raise ValueError(f"{output_path} is shorter than its checkpoint; start over without --resume")
+    out = open(output_path, "r+b" if state["output_bytes"] else "wb")
+    out.truncate(state["output_bytes"])
+    out.seek(state["output_bytes"])
+
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(model_dir,)) \
+        if workers > 0 else _InlinePool(model_dir)
+    in_flight = deque()
+    max_in_flight = max(2, 2 * workers)
+    started = time.perf_counter()
+    scored_rows = 0
+
+    def drain_one():
+        nonlocal scored_rows
+        chunk_index, start_row, ids, future = in_flight.popleft()
+        probs, errors, local_top, local_X = future.result()
+        out.write(_encode_rows(_result_rows(start_row, ids, probs, errors), out_fmt, header=start_row == 0))
+        out.flush()
+        os.fsync(out.fileno())
+
+        if local_top is not None:
+            for offset, features in zip(local_top.tolist(), local_X):
+                entry = (float(probs[offset]), start_row + offset,
+                         ids[offset] if ids is not None else None, features.tolist())
+                if len(top) < explain_top:
+                    heapq.heappush(top, entry)
+                elif entry > top[0]:
+                    heapq.heapreplace(top, entry)
+
+        scored_rows += len(probs)
+        state.update(chunks_done=chunk_index + 1, rows_done=start_row + len(probs),
+                     output_bytes=out.tell(), top=top)
+        write_checkpoint(ckpt_path, state)
+        elapsed = time.perf_counter() - started
+        logging.info(f"chunk {chunk_index}: {state['rows_done']} rows done ({scored_rows / elapsed:,.0f} rows/s)")
+
+    try:
+        start_row = 0
+        for chunk_index, frame in enumerate(read_chunks(input_path, chunk_size, in_fmt)):
+            n = len(frame)
+            if chunk_index < state["chunks_done"]:
+                start_row += n
+                continue
+            ids = [_json_id(v) for v in frame[id_column].tolist()] if id_column in frame else None
+            in_flight.append((chunk_index, start_row, ids, pool.submit(_score_chunk, frame, explain_top)))
+            start_row += n
+            while len(in_flight) >= max_in_flight:
+                drain_one()
+        while in_flight:
+            drain_one()
+
+        explained = 0
+        if explain_top > 0 and top:
+            explained = explain_top_rows(sorted(top, reverse=True), output_path, artifacts, pool, workers)
+    finally:
+        out.close()
+        pool.shutdown(wait=True, cancel_futures=True)
+
+    summary = {
+        "rows": state["rows_done"],
+        "chunks": state["chunks_done"],
+        "scored_this_run": scored_rows,
+        "explained": explained,
+        "seconds": round(time.perf_counter() - started, 2),
+        "model_version": artifacts.version,
+        "output": output_path,
+    }
+    # The run is complete; a fresh invocation starts over
+    os.remove(ckpt_path)
+    return summary
+
+def explain_top_rows(entries, output_path, artifacts, pool, workers, shard_size=16):
+    """SHAP for the highest-risk rows, sharded across the pool, cached like /predict."""
+    from explain_cache import ExplanationCache
+    X = np.array([features for _, _, _, features in entries], dtype=np.float64)
+    scaled = artifacts.engine.scale(X)
+    try:
+        namespace = explainers.cache_namespace(artifacts.fingerprint, artifacts.model)
+        cache = ExplanationCache.from_env(namespace=namespace)
+    except Exception:
+        cache = None
+
+    def compute(rows):
+        futures = [pool.submit(_explain_scaled, rows[i:i + shard_size]) for i in range(0, len(rows), shard_size)]
+        return np.vstack([future.result() for future in futures])
+
+    shap_rows = cache.explain(scaled, compute) if cache is not None else compute(scaled)
+    factors = explainers.top_factors(shap_rows, X, artifacts.feature_columns)
+
+    path = f"{output_path}.explanations.ndjson"
+    with open(path, "w") as f:
+        for (prob, row, row_id, _), row_factors in zip(entries, factors):
+            f.write(json.dumps({
+                "row": row,
+                "id": row_id,
+                "risk_score": round(prob * 100, 1),
+                "risk_level": risk_level_for(prob),
+                "top_factors": row_factors,
+            }) + "\n")
+    logging.info(f"Wrote explanations for {len(entries)} rows to {path}")
+    return len(entries)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    parser = argparse.ArgumentParser(description="Score a whole patient file (CSV, Parquet or NDJSON) in chunks.")
+    parser.add_argument("input", help="Input file (.csv, .parquet or .ndjson/.jsonl).")
+    parser.add_argument("output", help="Output file (.csv or .ndjson/.jsonl).")
+    parser.add_argument("--chunk-size", type=int, default=50000, help="Rows per chunk.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Scoring processes (default: CPU count; 0 scores in this process).")
+    parser.add_argument("--input-format", choices=["csv", "parquet", "ndjson"], default=None)
+    parser.add_argument("--output-format", choices=["csv", "ndjson"], default=None)
+    parser.add_argument("--id-column", default="id", help="Input column copied to the output as `id`.")
+    parser.add_argument("--explain-top", type=int, default=0, metavar="N",
+                        help="Explain the N highest-risk rows with SHAP after scoring.")
+    parser.add_argument("--resume", action="store_true", help="Continue from <output>.checkpoint.json.")
+    parser.add_argument("--model-dir", default=MODEL_DIR)
+    args = parser.parse_args()
+
+    try:
+        summary = score_file(args.input, args.output, chunk_size=args.chunk_size, workers=args.workers,
+                             input_format=args.input_format, output_format=args.output_format,
+                             id_column=args.id_column, explain_top=args.explain_top,
+                             resume=args.resume, model_dir=args.model_dir)
+    except (OSError, ValueError) as e:
+        sys.exit(f"Bulk scoring failed: {e}")
+    print(json.dumps(summary))
@@ -0,0 +1,334 @@
+"""Loaded model versions and zero-downtime reloads for the serving processes.
+
+ServedModel is one loaded model version together with everything tied to it:
+the feature transformer, the inference engine, the explanation cache (keyed
+by the model fingerprint) and per-thread SHAP explainers. Request handlers
+take `manager.current` once and use that object for the whole request, so a
+request that started before a reload finishes on the version it started with.
+
+ModelManager watches MODEL_DIR. When the model files change it waits until
+they have stopped changing (the same signature on two consecutive polls, since
+train.py writes the pickles one by one), then loads the new version in the
+background, validates it on probe rows, warms the scoring path and the SHAP
+explainer, and only then swaps the `current` reference. A version that fails
+to load or validate is logged and skipped; the old one keeps serving.
+
+ModelRouter holds several such managers, "primary" (MODEL_DIR) plus named
+variants from other directories, and picks one per scoring request by traffic
+weight. A variant without a loaded model falls back to primary.
+
+Configuration (environment):
+    MODEL_RELOAD_INTERVAL  seconds between MODEL_DIR checks; 0 disables   (default 10)
+    MODEL_VARIANTS         extra versions, "name=dir,..." (relative to this directory)  (default none)
+    MODEL_TRAFFIC          fraction of scoring traffic per variant, "name=0.1,..."; the
+                           rest goes to primary                             (default none)
+    MODEL_SHADOW           variant that shadow-scores every request (shadow.py)  (default none)
+"""
+import os
+import time
+import random
+import functools
+import logging
+import threading
+import numpy as np
+import explainers
+from artifacts import load_artifacts
+from explain_cache import ExplanationCache
+
+_SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PRIMARY = "primary"
+
+# Files whose change means a new model version
+WATCHED_FILES = ("model_bundle.bin", "cancer_risk_model.pkl", "scaler.pkl", "background.pkl",
+                 "feature_columns.json", "metrics.json", "preprocessing.json")
+
+# Probe payloads for validation and warm-up: an empty payload (all defaults)
+# and a fully specified one
+PROBE_PAYLOADS = [
+    {},
+    {"age": 55, "sex": "female", "bmi": 27.5, "smoking_status": "Former Smoker", "pack_years": 10,
+     "wbc_count": 7.5, "neutrophil_pct": 60, "lymphocyte_pct": 30, "platelet_count": 250,
+     "hemoglobin": 13.2, "cea_level": 2.1, "crp_level": 3.0},
+]
+
+def risk_level_for(prob):
+    return "High" if prob >= 0.60 else ("Medium" if prob >= 0.25 else "Low")
+
+class ServedModel:
+    """One loaded model version and its explanation state."""
+
+    def __init__(self, artifacts):
+        self.artifacts = artifacts
+        self.version = artifacts.version
+        self.fingerprint = artifacts.fingerprint
+        self.source = artifacts.source
+        self.model = artifacts.model
+        self.engine = artifacts.engine
+        self.transformer = artifacts.transformer
+        self.feature_columns = artifacts.feature_columns
+        self.background = artifacts.background
+        self.metrics = artifacts.metrics
+        self.explanations_enabled = self.background is not None
+        # Gradient and kernel attributions differ, so they are cached apart
+        namespace = explainers.cache_namespace(self.fingerprint, self.model)
+        self.explain_cache = ExplanationCache.from_env(namespace=namespace)
+        self.loaded_at = time.time()
+        self._local = threading.local()
+
+    def explainer(self):
+        # KernelExplainer keeps per-call state on the instance, so request threads
+        # and background explanation workers each get their own copy (EXPLAINER
+        # selects it or the gradient explainer)
+        explainer = getattr(self._local, "explainer", None)
+        if explainer is None:
+            explainer = self._local.explainer = explainers.make_explainer(self.model, self.background)
+        return explainer
+
+    def shap_class1(self, scaled_features):
+        return explainers.class1_values(self.explainer().shap_values(scaled_features), len(scaled_features))
+
+    def format_factors(self, class1_shap, raw_features):
+        return explainers.top_factors(class1_shap, raw_features, self.feature_columns)
+
+    def explain(self, scaled_features, raw_features):
+        """top_factors per row, through the explanation cache."""
+        return self.format_factors(self.explain_cache.explain(scaled_features, self.shap_class1), raw_features)
+
+    def after_fork(self):
+        """Per-process state for a forked worker: explainers are kept, the cache's SQLite connection is not."""
+        self.explain_cache.reopen()
+
+    def evaluation_summary(self):
+        """The /model_metrics view of the test-set metrics train.py recorded, or None."""
+        metrics = self.metrics
+        if "roc_auc" not in metrics:
+            return None
+        return {
+            "auc_roc": metrics["roc_auc"],
+            "recall": metrics.get("recall_high_risk"),
+            "f1_score": metrics.get("f1_high_risk"),
+            "precision": metrics.get("precision_high_risk"),
+            "pr_auc": metrics.get("pr_auc"),
+            "threshold": metrics.get("threshold"),
+            "top_features": metrics.get("top_features", []),
+        }
+
+    def validate(self):
+        """Raise ValueError unless the model scores the probe rows sensibly."""
+        if not self.feature_columns:
+            raise ValueError("model has no feature columns")
+        if self.engine.n_features != len(self.feature_columns):
+            raise ValueError(f"engine expects {self.engine.n_features} features, "
+                             f"feature_columns has {len(self.feature_columns)}")
+        X = self.transformer.transform_records([dict(p) for p in PROBE_PAYLOADS])
+        proba = np.asarray(self.engine.predict_proba(X))
+        if proba.shape != (len(PROBE_PAYLOADS), 2):
+            raise ValueError(f"predict_proba returned shape {proba.shape}")
+        if not np.isfinite(proba).all() or (proba < 0).any() or (proba > 1).any():
+            raise ValueError("predict_proba returned values outside [0, 1]")
+        if not np.allclose(proba.sum(axis=1), 1.0, atol=1e-6):
+            raise ValueError("predict_proba rows do not sum to 1")
+
+    def warm(self, explain=True):
+        """Run the scoring path once (and one SHAP explanation) so the first request is not cold."""
+        X = self.transformer.transform_records([dict(PROBE_PAYLOADS[-1])])
+        _, scaled = self.engine.score(X)
+        if explain and self.explanations_enabled:
+            self.shap_class1(scaled)
+
+class ModelManager:
+    """Holds the current ServedModel and swaps in new versions from `model_dir`."""
+
+    def __init__(self, model_dir, interval=None, on_swap=None, on_failure=None):
+        self.model_dir = model_dir
+        self.interval = float(os.environ.get("MODEL_RELOAD_INTERVAL", "10")) if interval is None else interval
+        self.on_swap = on_swap
+        self.on_failure = on_failure
+        self.current = None
+        self.reloads = 0
+        self.failures = 0
+        self.last_error = None
+        self.last_check = None
+        self._loaded_signature = None
+        self._pending_signature = None
+        self._failed_signature = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def signature(self):
+        entries = []
+        for name in WATCHED_FILES:
+            try:
+                st = os.stat(os.path.join(self.model_dir, name))
+            except FileNotFoundError:
+                continue
+            entries.append((name, st.st_mtime_ns, st.st_size))
+        return tuple(entries)
+
+    def load(self, warm_explainer=False):
+        """Load, validate and warm the version currently in model_dir and make it current."""
+        with self._lock:
+            signature = self.signature()
+            try:
+                served = ServedModel(load_artifacts(self.model_dir))
+                served.validate()
+                served.warm(explain=warm_explainer)
+            except Exception as e:
+                self._failed_signature = signature
+                self.failures += 1
+                self.last_error = f"{type(e).__name__}: {e}"
+                if self.on_failure is not None:
+                    self.on_failure(self.current, e)
+                raise
+            old = self.current
+            self._loaded_signature = signature
+            self.last_error = None
+            if old is not None and (old.fingerprint, old.version) == (served.fingerprint, served.version):
+                # Files were touched but the model is the same
+                return old
+            # Single reference assignment: requests already holding `old` keep it
+            self.current = served
+            if old is not None:
+                self.reloads += 1
+            if self.on_swap is not None:
+                self.on_swap(old, served)
+            return served
+
+    def check(self):
+        """One poll: reload once the model files changed and then stayed unchanged."""
+        self.last_check = time.time()
+        signature = self.signature()
+        if not signature or signature in (self._loaded_signature, self._failed_signature):
+            self._pending_signature = None
+            return False
+        if signature != self._pending_signature:
+            self._pending_signature = signature
+            return False
+        self._pending_signature = None
+        old = self.current
+        try:
+            served = self.load(warm_explainer=True)
+        except Exception as e:
+            logging.error(f"Model reload from {self.model_dir} failed; keeping "
+                          f"{old.version if old else 'no model'}: {e}")
+            return False
+        if served is not old:
+            logging.info(f"Model {served.version} is now serving (was {old.version if old else 'none'})")
+        return served is not old
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                logging.error(f"Model watcher error: {e}")
+
+    def start(self):
+        """Start the background watcher (no-op when the interval is 0)."""
+        if self.interval > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._watch, name="model-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def after_fork(self):
+        """Reset locks and connections in a forked worker (the watcher thread does not survive a fork)."""
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        if self.current is not None:
+            self.current.after_fork()
+
+    def status(self):
+        served = self.current
+        return {
+            "version": served.version if served else None,
+            "source": served.source if served else None,
+            "fingerprint": served.fingerprint[:12] if served else None,
+            "loaded_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(served.loaded_at)) if served else None,
+            "reloads": self.reloads,
+            "reload_failures": self.failures,
+            "last_error": self.last_error,
+            "watch_interval_seconds": self.interval,
+        }
+
+def _pairs(spec):
+    """{"a": "1", "b": "x"} from "a=1,b=x"."""
+    pairs = {}
+    for item in filter(None, (part.strip() for part in (spec or "").split(","))):
+        name, sep, value = item.partition("=")
+        if not sep or not name.strip():
+            raise ValueError(f"Expected name=value, got {item!r}")
+        pairs[name.strip()] = value.strip()
+    return pairs
+
+class ModelRouter:
+    """Splits scoring traffic across model variants, each with its own ModelManager."""
+
+    def __init__(self, managers, weights=None, shadow=None, seed=None):
+        self.managers = managers
+        self.weights = {name: float(w) for name, w in (weights or {}).items() if float(w) > 0}
+        for name in list(self.weights) + ([shadow] if shadow else []):
+            if name not in managers:
+                raise ValueError(f"Unknown model variant {name!r}; known: {sorted(managers)}")
+        if sum(self.weights.values()) > 1.0 + 1e-9:
+            raise ValueError(f"MODEL_TRAFFIC fractions add up to more than 1: {self.weights}")
+        self.shadow = shadow
+        self._rng = random.Random(seed)
+
+    @classmethod
+    def from_env(cls, primary, on_variant_swap=None):
+        """`primary` plus the MODEL_VARIANTS managers; a variant swap calls on_variant_swap(name, old, new)."""
+        managers = {PRIMARY: primary}
+        for name, path in _pairs(os.environ.get("MODEL_VARIANTS")).items():
+            on_swap = functools.partial(on_variant_swap, name) if on_variant_swap is not None else None
+            managers[name] = ModelManager(os.path.join(_SCRIPT_DIR, path), interval=primary.interval, on_swap=on_swap)
+        return cls(managers, weights=_pairs(os.environ.get("MODEL_TRAFFIC")),
+                   shadow=os.environ.get("MODEL_SHADOW") or None)
+
+    def start(self):
+        """Load the variants (primary is loaded by its owner) and start their watchers."""
+        for name, manager in self.managers.items():
+            if name != PRIMARY:
+                try:
+                    manager.load()
+                except Exception as e:
+                    logging.warning(f"Model variant {name!r} not loaded from {manager.model_dir}: {e}")
+                manager.start()
+        return self
+
+    def route(self, requested=None, split=True):
+        """(variant name, ServedModel) for one request.
+
+        `requested` pins a known variant; otherwise, with `split`, a variant is
+        drawn by traffic weight. Variants without a loaded model fall back to primary.
+        """
+        name = PRIMARY
+        if requested in self.managers:
+            name = requested
+        elif split and self.weights:
+            draw = self._rng.random()
+            for variant, weight in self.weights.items():
+                draw -= weight
+                if draw < 0:
+                    name = variant
+                    break
+        served = self.managers[name].current
+        if served is None and name != PRIMARY:
+            name, served = PRIMARY, self.managers[PRIMARY].current
+        return name, served
+
+    def after_fork(self):
+        for manager in self.managers.values():
+            manager.after_fork()
+
+    def shadow_model(self):
+        return self.managers[self.shadow].current if self.shadow else None
+
+    def status(self):
+        shares = {PRIMARY: 1.0 - sum(self.weights.values()), **self.weights}
+        return {name: {**manager.status(), "traffic": round(shares.get(name, 0.0), 6), "shadow": name == self.shadow}
+                for name, manager in self.managers.items()}
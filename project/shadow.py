@@ -0,0 +1,134 @@
+"""Shadow scoring: score live requests on a second model version off the response path.
+
+The endpoint answers with its own model's scores, then hands the request's
+engineered feature matrix to ShadowScorer, which scores it on the shadow
+model in a background thread. The matrix is reused as-is when both models
+share feature columns and cleaning parameters; otherwise the payloads are
+transformed again for the shadow model. Each comparison is appended as one
+JSON line to the shadow log:
+
+    {"time", "endpoint", "primary_version", "shadow_version", "rows",
+     "features_reused", "seconds", "mean_abs_diff", "max_abs_diff", "mean_diff",
+     "risk_level_changes", "primary_scores", "shadow_scores"}
+
+Diffs are shadow minus primary probability. Admission is bounded like the
+async explanations: when SHADOW_QUEUE requests are waiting, new ones are
+dropped instead of queueing without limit.
+
+Configuration (environment):
+    SHADOW_LOG         JSON-lines comparison log          (default reports/shadow_log.jsonl)
+    SHADOW_QUEUE       max queued + running comparisons   (default 256)
+    SHADOW_LOG_MAX_MB  size at which the log is rotated to <log>.1  (default 64)
+"""
+import os
+import json
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+_SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SHADOW_LOG = os.path.join(_SCRIPT_DIR, "reports", "shadow_log.jsonl")
+
+def compare(primary_probs, shadow_probs, risk_level):
+    """Disagreement stats between two probability vectors for the same rows."""
+    primary_probs = np.asarray(primary_probs, dtype=np.float64)
+    shadow_probs = np.asarray(shadow_probs, dtype=np.float64)
+    diff = shadow_probs - primary_probs
+    return {
+        "rows": int(len(diff)),
+        "mean_abs_diff": round(float(np.abs(diff).mean()), 6) if len(diff) else 0.0,
+        "max_abs_diff": round(float(np.abs(diff).max()), 6) if len(diff) else 0.0,
+        "mean_diff": round(float(diff.mean()), 6) if len(diff) else 0.0,
+        "risk_level_changes": sum(risk_level(p) != risk_level(s) for p, s in zip(primary_probs, shadow_probs)),
+        "primary_scores": [round(float(p), 4) for p in primary_probs],
+        "shadow_scores": [round(float(s), 4) for s in shadow_probs],
+    }
+
+class ShadowScorer:
+    """Scores requests on a shadow model in one background thread and logs the comparison."""
+
+    def __init__(self, risk_level, log_path=None, max_pending=256, max_log_bytes=64 * 1024 * 1024, on_compare=None):
+        self.risk_level = risk_level
+        self.log_path = log_path or DEFAULT_SHADOW_LOG
+        self.max_log_bytes = max_log_bytes
+        self.on_compare = on_compare
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow")
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._log_lock = threading.Lock()
+        self.max_pending = max_pending
+        self.submitted = 0
+        self.dropped = 0
+        self.failed = 0
+
+    @classmethod
+    def from_env(cls, risk_level, on_compare=None):
+        return cls(
+            risk_level,
+            log_path=os.environ.get("SHADOW_LOG") or None,
+            max_pending=int(os.environ.get("SHADOW_QUEUE", "256")),
+            max_log_bytes=int(float(os.environ.get("SHADOW_LOG_MAX_MB", "64")) * 1024 * 1024),
+            on_compare=on_compare,
+        )
+
+    def submit(self, endpoint, primary, shadow, records, X, primary_probs):
+        """Queue one comparison; False when it was dropped. `X` must not be modified afterwards."""
+        if not self._slots.acquire(blocking=False):
+            with self._log_lock:
+                self.dropped += 1
+            return False
+        with self._log_lock:
+            self.submitted += 1
+        try:
+            self._pool.submit(self._run, endpoint, primary, shadow, records, X, primary_probs)
+        except RuntimeError:
+            # Pool already shut down
+            self._slots.release()
+            return False
+        return True
+
+    def _run(self, endpoint, primary, shadow, records, X, primary_probs):
+        try:
+            started = time.perf_counter()
+            reused = shadow.transformer.compatible_with(primary.transformer)
+            X_shadow = X if reused else shadow.transformer.transform_records(records)
+            shadow_probs = shadow.engine.predict_proba(X_shadow)[:, 1]
+            record = {
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "endpoint": endpoint,
+                "primary_version": primary.version,
+                "shadow_version": shadow.version,
+                "features_reused": reused,
+                "seconds": round(time.perf_counter() - started, 6),
+            }
+            record.update(compare(primary_probs, shadow_probs, self.risk_level))
+            self._write(record)
+            if self.on_compare is not None:
+                self.on_compare(record)
+        except Exception as e:
+            logging.error(f"Shadow scoring failed: {e}")
+            self.failed += 1
+        finally:
+            self._slots.release()
+
+    def _write(self, record):
+        line = json.dumps(record) + "\n"
+        with self._log_lock:
+            os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+            try:
+                if os.path.getsize(self.log_path) + len(line) > self.max_log_bytes:
+                    os.replace(self.log_path, self.log_path + ".1")
+            except FileNotFoundError:
+                pass
+            with open(self.log_path, "a") as f:
+                f.write(line)
+
+    def stats(self):
+        return {
+            "submitted": self.submitted,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "max_pending": self.max_pending,
+            "log": self.log_path,
+        }
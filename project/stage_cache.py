@@ -0,0 +1,231 @@
+"""Content-addressed cache for the train.py stages.
+
+A stage is a function whose output is a dict of named values. Its cache key
+hashes the stage name, the source code of the stage (and any helper modules it
+names), the pandas/numpy/scikit-learn versions, its parameters and the
+content hashes of its inputs. Inputs are usually the outputs of earlier
+stages, whose content hashes are stored with them, so a change anywhere
+upstream only invalidates the stages that actually see different data.
+
+Layout: <root>/<stage>-<key[:16]>/ holds manifest.json plus one file per
+output value:
+
+    DataFrame / Series   .parquet (pyarrow); .pkl, with a warning, if a column mixes types pyarrow
+                         cannot store or pyarrow is missing
+    ndarray              .npy
+    JSON-able values     inside manifest.json
+    anything else        .joblib (fitted scaler, model, ...)
+
+Configuration (environment):
+    TRAIN_CACHE        0 disables the cache (every stage recomputes)   (default 1)
+    TRAIN_CACHE_DIR    cache root                    (default data/processed/stages)
+    TRAIN_CACHE_KEEP   entries kept per stage                          (default 3)
+"""
+import os
+import json
+import time
+import shutil
+import hashlib
+import inspect
+import logging
+import numpy as np
+import pandas as pd
+
+FORMAT_VERSION = 1
+_SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE_DIR = os.path.join(_SCRIPT_DIR, "data", "processed", "stages")
+
+def _library_versions():
+    import sklearn
+    return {"pandas": pd.__version__, "numpy": np.__version__, "sklearn": sklearn.__version__}
+
+def _code_hash(code):
+    digest = hashlib.sha256()
+    for obj in code:
+        digest.update(inspect.getsource(obj).encode("utf-8"))
+    return digest.hexdigest()
+
+def content_hash(value):
+    """Stable hash of a stage input or output value."""
+    digest = hashlib.sha256()
+    if isinstance(value, pd.DataFrame):
+        digest.update(json.dumps([str(c) for c in value.columns]).encode())
+        digest.update(json.dumps([str(t) for t in value.dtypes]).encode())
+        digest.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    elif isinstance(value, pd.Series):
+        digest.update(str((value.name, value.dtype)).encode())
+        digest.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    elif isinstance(value, np.ndarray):
+        digest.update(str((value.dtype, value.shape)).encode())
+        digest.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, (list, tuple)) and any(isinstance(v, (pd.DataFrame, pd.Series, np.ndarray)) for v in value):
+        for item in value:
+            digest.update(content_hash(item).encode())
+    else:
+        import joblib
+        digest.update(joblib.hash(value).encode())
+    return digest.hexdigest()
+
+def file_hash(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _is_json(value):
+    try:
+        return json.loads(json.dumps(value)) == value
+    except (TypeError, ValueError):
+        return False
+
+class StageResult(dict):
+    """A stage's outputs plus their content hashes (used to key later stages)."""
+
+    def __init__(self, values, hashes, key, cached):
+        super().__init__(values)
+        self.hashes = hashes
+        self.key = key
+        self.cached = cached
+
+class StageCache:
+    def __init__(self, root=None, enabled=None, keep=None):
+        self.root = root or os.environ.get("TRAIN_CACHE_DIR", DEFAULT_CACHE_DIR)
+        self.enabled = os.environ.get("TRAIN_CACHE", "1") != "0" if enabled is None else enabled
+        self.keep = keep or int(os.environ.get("TRAIN_CACHE_KEEP", "3"))
+        self.versions = _library_versions()
+
+    def key(self, name, code, inputs, params):
+        """Cache key from stage code, library versions, params and input content hashes."""
+        parts = {
+            "format": FORMAT_VERSION,
+            "stage": name,
+            "code": _code_hash(code),
+            "versions": self.versions,
+            "params": params,
+            "inputs": {k: self._input_hash(v) for k, v in sorted(inputs.items())},
+        }
+        return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+    @classmethod
+    def _input_hash(cls, value):
+        # Outputs of earlier stages carry their hashes (see StageInput)
+        if isinstance(value, StageInput):
+            return value.hash
+        if isinstance(value, list) and any(isinstance(v, StageInput) for v in value):
+            return [cls._input_hash(v) for v in value]
+        return content_hash(value)
+
+    @staticmethod
+    def _unwrap(value):
+        if isinstance(value, StageInput):
+            return value.value
+        if isinstance(value, list):
+            return [v.value if isinstance(v, StageInput) else v for v in value]
+        return value
+
+    def run(self, name, fn, code=(), params=None, **inputs):
+        """Return fn(**inputs, **params) from the cache, computing and storing it on a miss.
+
+        `code` lists extra functions/modules whose source the output depends on
+        (fn itself is always included).
+        """
+        params = params or {}
+        key = self.key(name, (fn, *code), inputs, params)
+        entry = os.path.join(self.root, f"{name}-{key[:16]}")
+        if self.enabled and os.path.exists(os.path.join(entry, "manifest.json")):
+            try:
+                result = self._load(entry, key)
+                logging.info(f"[{name}] cache hit {key[:12]}")
+                return result
+            except Exception as e:
+                logging.warning(f"[{name}] ignoring unreadable cache entry {entry}: {e}")
+
+        args = {k: self._unwrap(v) for k, v in inputs.items()}
+        values = fn(**args, **params)
+        hashes = {k: content_hash(v) for k, v in values.items()}
+        if self.enabled:
+            self._store(entry, name, key, values, hashes)
+            self._prune(name)
+        return StageResult(values, hashes, key, cached=False)
+
+    def _store(self, entry, name, key, values, hashes):
+        tmp = f"{entry}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        outputs = {}
+        for out_name, value in values.items():
+            outputs[out_name] = self._write_value(tmp, out_name, value)
+        manifest = {"stage": name, "key": key, "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    "outputs": outputs, "hashes": hashes}
+        with open(os.path.join(tmp, "manifest.json"), "w") as f:
+            json.dump(manifest, f, indent=2)
+        shutil.rmtree(entry, ignore_errors=True)
+        os.replace(tmp, entry)
+
+    def _write_value(self, directory, name, value):
+        if isinstance(value, (pd.DataFrame, pd.Series)):
+            frame = value.to_frame() if isinstance(value, pd.Series) else value
+            spec = {"kind": "series" if isinstance(value, pd.Series) else "frame"}
+            try:
+                # Parquet needs string column names; the originals are kept in the manifest
+                stored = frame.copy(deep=False)
+                stored.columns = [str(c) for c in frame.columns]
+                stored.to_parquet(os.path.join(directory, f"{name}.parquet"), engine="pyarrow")
+                spec.update(file=f"{name}.parquet", columns=list(frame.columns))
+            except (ImportError, TypeError, ValueError, NotImplementedError) as e:
+                # pyarrow missing, or object columns mixing e.g. ints and strings
+                # (ArrowInvalid / ArrowTypeError / ArrowNotImplementedError subclass these)
+                logging.warning(f"Stage output {name} stored as pickle: {type(e).__name__}: {e}")
+                frame.to_pickle(os.path.join(directory, f"{name}.pkl"))
+                spec.update(file=f"{name}.pkl")
+            return spec
+        if isinstance(value, np.ndarray) and value.dtype != object:
+            np.save(os.path.join(directory, f"{name}.npy"), value)
+            return {"kind": "array", "file": f"{name}.npy"}
+        if _is_json(value):
+            return {"kind": "json", "value": value}
+        import joblib
+        joblib.dump(value, os.path.join(directory, f"{name}.joblib"))
+        return {"kind": "object", "file": f"{name}.joblib"}
+
+    def _load(self, entry, key):
+        with open(os.path.join(entry, "manifest.json"), "r") as f:
+            manifest = json.load(f)
+        if manifest["key"] != key:
+            raise ValueError("key mismatch")
+        values = {}
+        for name, spec in manifest["outputs"].items():
+            kind, path = spec["kind"], os.path.join(entry, spec.get("file", ""))
+            if kind in ("frame", "series"):
+                if path.endswith(".parquet"):
+                    value = pd.read_parquet(path, engine="pyarrow")
+                    value.columns = spec["columns"]
+                else:
+                    value = pd.read_pickle(path)
+                values[name] = value.iloc[:, 0] if kind == "series" else value
+            elif kind == "array":
+                values[name] = np.load(path)
+            elif kind == "json":
+                values[name] = spec["value"]
+            else:
+                import joblib
+                values[name] = joblib.load(path)
+        return StageResult(values, manifest["hashes"], key, cached=True)
+
+    def _prune(self, name):
+        entries = [os.path.join(self.root, d) for d in os.listdir(self.root)
+                   if d.startswith(f"{name}-") and ".tmp-" not in d]
+        entries.sort(key=os.path.getmtime, reverse=True)
+        for stale in entries[self.keep:]:
+            shutil.rmtree(stale, ignore_errors=True)
+
+class StageInput:
+    """An earlier stage's output passed on with its precomputed content hash."""
+
+    def __init__(self, result, name):
+        self.value = result[name]
+        self.hash = result.hashes[name]
+
+def output(result, name):
+    return StageInput(result, name)
@@ -0,0 +1,136 @@
+"""Wall time and peak memory per pipeline stage.
+
+    stages = StageTimer()
+    stages.mark("ingest")      # starts "ingest"
+    ...
+    stages.mark("clean")       # ends "ingest", starts "clean"
+    ...
+    stages.finish("reports/train_stages.json")
+
+Peak RSS per stage comes from a background thread sampling /proc/self/statm
+(every 10 ms by default), so it costs nothing on the main thread. Where /proc
+is unavailable, the process-wide ru_maxrss at the end of each stage is
+reported instead.
+"""
+import os
+import json
+import time
+import threading
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+def current_rss_mb():
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return None
+
+def max_rss_mb():
+    if resource is None:
+        return None
+    divisor = 1024 * 1024 if os.uname().sysname == "Darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / divisor
+
+class PeakRSS:
+    """Peak RSS while a block runs.
+
+        with PeakRSS() as mem:
+            ...
+        mem.peak_mb, mem.delta_mb
+    """
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.start_mb = self.peak_mb = self.delta_mb = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            rss = current_rss_mb()
+            if rss is not None and rss > self.peak_mb:
+                self.peak_mb = rss
+
+    def __enter__(self):
+        self.start_mb = current_rss_mb()
+        if self.start_mb is None:
+            self.start_mb = max_rss_mb()
+        else:
+            self.peak_mb = self.start_mb
+            self._thread = threading.Thread(target=self._sample, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self.peak_mb = max(self.peak_mb, current_rss_mb() or 0.0)
+        else:
+            self.peak_mb = max_rss_mb()
+        if self.start_mb is not None and self.peak_mb is not None:
+            self.delta_mb = self.peak_mb - self.start_mb
+        return False
+
+class StageTimer:
+    """Sequential named stages; each mark() closes the previous stage."""
+
+    def __init__(self, interval=0.01):
+        self.stages = []
+        self._current = None
+        self._peak = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampling = current_rss_mb() is not None
+        self._started = time.perf_counter()
+        if self._sampling:
+            threading.Thread(target=self._sample, args=(interval,), daemon=True).start()
+
+    def _sample(self, interval):
+        while not self._stop.wait(interval):
+            rss = current_rss_mb()
+            with self._lock:
+                if rss is not None and rss > self._peak:
+                    self._peak = rss
+
+    def _close(self):
+        if self._current is None:
+            return
+        name, start, rss_start = self._current
+        with self._lock:
+            rss_end = current_rss_mb() if self._sampling else max_rss_mb()
+            peak = max(self._peak, rss_end or 0.0) if self._sampling else rss_end
+        self.stages.append({
+            "stage": name,
+            "seconds": round(time.perf_counter() - start, 4),
+            "rss_start_mb": None if rss_start is None else round(rss_start, 1),
+            "peak_rss_mb": None if peak is None else round(peak, 1),
+        })
+        self._current = None
+
+    def mark(self, name):
+        self._close()
+        rss = current_rss_mb() if self._sampling else max_rss_mb()
+        with self._lock:
+            self._peak = rss or 0.0
+        self._current = (name, time.perf_counter(), rss)
+
+    def finish(self, path=None):
+        """Close the last stage; optionally write the report as JSON. Returns the report."""
+        self._close()
+        self._stop.set()
+        report = {
+            "total_seconds": round(time.perf_counter() - self._started, 4),
+            "max_rss_mb": None if max_rss_mb() is None else round(max_rss_mb(), 1),
+            "stages": self.stages,
+        }
+        if path:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2)
+        return report
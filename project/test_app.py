@@ -0,0 +1,93 @@
+import os
+
+os.environ.setdefault("MODEL_RELOAD_INTERVAL", "0")
+os.environ.setdefault("EXPLAIN_CACHE_PATH", "")
+os.environ.setdefault("RESPONSE_CACHE_ENTRIES", "0")
+
+import json
+import pytest
+import app
+import request_profiler
+
+NON_FINITE_PAYLOADS = [
+    {"age": "nan"},
+    {"neutrophil_pct": "nan"},
+    {"wbc_count": "inf", "lymphocyte_pct": 10},
+]
+
+@pytest.fixture
+def client():
+    return app.app.test_client()
+
+@pytest.mark.parametrize("payload", NON_FINITE_PAYLOADS)
+def test_predict_rejects_non_finite_inputs(client, payload):
+    response = client.post("/predict?explain=async", json=payload)
+    assert response.status_code == 400
+    assert response.json["success"] is False
+    assert "Non-finite" in response.json["error"]
+
+def test_predict_batch_reports_non_finite_rows(client):
+    response = client.post("/predict_batch?explain=false", json=NON_FINITE_PAYLOADS + [{"age": 50}])
+    assert response.status_code == 200
+    results = response.json["results"]
+    assert response.json["errors"] == len(NON_FINITE_PAYLOADS)
+    assert [r["success"] for r in results] == [False] * len(NON_FINITE_PAYLOADS) + [True]
+    assert 0 <= results[-1]["risk_score"] <= 100
+
+def scores(response):
+    return [r.get("risk_score") for r in response.json["results"]]
+
+def test_predict_batch_parses_ndjson_like_a_json_array(client):
+    payloads = [{"age": 40, "sex": "Female"}, {"age": 70, "sex": "Male", "crp_level": 30}]
+    array = client.post("/predict_batch?explain=false", json=payloads)
+    body = "\n".join(json.dumps(p) for p in payloads) + "\n\n{not json\n"
+    ndjson = client.post("/predict_batch?explain=false", data=body, content_type="application/x-ndjson")
+    assert array.status_code == ndjson.status_code == 200
+    assert scores(ndjson)[:2] == scores(array)
+    # The blank line is skipped; the bad line is reported by its line number
+    assert ndjson.json["count"] == 3 and ndjson.json["errors"] == 1
+    assert ndjson.json["results"][2]["error"].startswith("Invalid JSON on line 4")
+
+def test_predict_batch_isolates_row_errors(client):
+    good = [{"age": 45}, {"age": 80, "cea_level": 12}]
+    alone = scores(client.post("/predict_batch?explain=false", json=good))
+    response = client.post("/predict_batch?explain=false", json=[good[0], "patient", 5, {"age": "inf"}, good[1]])
+    results = response.json["results"]
+    assert [r["index"] for r in results] == [0, 1, 2, 3, 4]
+    assert [r["success"] for r in results] == [True, False, False, False, True]
+    assert results[1]["error"] == "Patient payload must be a JSON object."
+    assert [results[0]["risk_score"], results[4]["risk_score"]] == alone
+
+def test_predict_batch_explain_flag(client):
+    payloads = [{"age": 60, "sex": "Female", "hemoglobin": 10}]
+    for response in (client.post("/predict_batch?explain=false", json=payloads),
+                     client.post("/predict_batch", json={"patients": payloads, "explain": False})):
+        assert response.json["results"][0]["top_factors"] == []
+    explained = client.post("/predict_batch", json={"patients": payloads, "explain": True})
+    assert explained.json["results"][0]["top_factors"]
+    assert scores(explained) == scores(response)
+
+def test_predict_batch_limits(client, monkeypatch):
+    monkeypatch.setattr(app, "MAX_BATCH_ROWS", 2)
+    response = client.post("/predict_batch?explain=false", json=[{}, {}, {}])
+    assert response.status_code == 413 and "MAX_BATCH_ROWS=2" in response.json["error"]
+    assert client.post("/predict_batch?explain=false", json=[{}, {}]).status_code == 200
+    assert client.post("/predict_batch", json={"patients": {"age": 1}}).status_code == 400
+
+def test_metrics_text(client):
+    client.get("/health")
+    response = client.get("/metrics")
+    assert response.status_code == 200 and response.content_type.startswith("text/plain; version=0.0.4")
+    assert "# TYPE cancer_api_requests_total counter" in response.text
+    assert 'cancer_api_requests_total{endpoint="health",code="200"}' in response.text
+
+def test_profile_requests_need_the_token(client, monkeypatch, tmp_path):
+    # No PROFILE_TOKEN configured: every explicit request is denied
+    response = client.get("/health", headers={"X-Profile": "1", "X-Profile-Token": ""})
+    assert response.headers["X-Profile-Status"] == "denied" and "X-Profile-Id" not in response.headers
+    monkeypatch.setattr(app, "profiler", request_profiler.Profiler(token="s3cret", directory=str(tmp_path)))
+    response = client.get("/health", headers={"X-Profile": "1", "X-Profile-Token": "wrong"})
+    assert response.headers["X-Profile-Status"] == "denied"
+    response = client.get("/health", headers={"X-Profile": "1", "X-Profile-Token": "s3cret"})
+    assert response.headers["X-Profile-Status"] == "profiled" and response.headers["X-Profile-Id"]
+    assert "Server-Timing" in response.headers
@@ -0,0 +1,46 @@
+import os
+
+os.environ.setdefault("MODEL_RELOAD_INTERVAL", "0")
+os.environ.setdefault("EXPLAIN_CACHE_PATH", "")
+
+import json
+import asyncio
+import asgi_app
+
+async def call(service, method, path, body=None, headers=()):
+    messages = [{"type": "http.request", "body": json.dumps(body).encode() if body is not None else b""}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": method, "path": path,
+             "headers": [(k.encode(), v.encode()) for k, v in headers]}
+    await service(scope, receive, send)
+    return sent[0]["status"], json.loads(sent[1]["body"])
+
+def test_predict_ships_the_model_to_a_worker_once(monkeypatch):
+    monkeypatch.setenv("ASGI_EXPLAIN_PROCESSES", "1")
+
+    async def scenario():
+        service = asgi_app.PredictionService()
+        await service.startup()
+        try:
+            for age in (40, 50, 60, 70):
+                status, body = await call(service, "POST", "/predict", {"age": age, "sex": "Female"},
+                                          headers=[("x-deadline-ms", "30000")])
+                assert status == 200
+                assert "explanation_status" not in body and body["top_factors"]
+            status, body = await call(service, "POST", "/predict", {"age": "nan"})
+            assert status == 400 and "Non-finite" in body["error"]
+            _, health = await call(service, "GET", "/health")
+            return health["server"]
+        finally:
+            await service.shutdown()
+
+    server = asyncio.run(scenario())
+    # Only the first explanation sent the weights; later ones sent the fingerprint and rows
+    assert server["model_shipments"] == 1
@@ -0,0 +1,41 @@
+import threading
+from async_explain import ExplanationJobs, DONE, DROPPED, FAILED, PENDING
+
+def test_jobs_are_bounded_and_counted():
+    release = threading.Event()
+
+    def compute(value):
+        release.wait(5)
+        if value == "bad":
+            raise ValueError("boom")
+        return value * 2
+
+    jobs = ExplanationJobs(compute, max_workers=2, max_pending=2)
+    try:
+        first, status = jobs.submit(21)
+        second, _ = jobs.submit("bad")
+        assert status == PENDING
+        assert jobs.submit(1) == (None, DROPPED)
+        assert jobs.stats()["in_flight"] == 2
+
+        release.set()
+        state = jobs.get(first, wait=5)
+        assert (state["status"], state["top_factors"]) == (DONE, 42)
+        assert jobs.get(second, wait=5) == {"status": FAILED, "error": "boom"}
+        assert jobs.get("unknown") is None
+        stats = jobs.stats()
+        assert (stats["in_flight"], stats["submitted"], stats["dropped"], stats["failed"]) == (0, 2, 1, 1)
+
+        # Slots free up again once jobs finish
+        third, status = jobs.submit(1)
+        assert status == PENDING and jobs.get(third, wait=5)["status"] == DONE
+    finally:
+        release.set()
+        jobs.shutdown()
+
+def test_submit_after_shutdown_fails_job_and_frees_slot():
+    jobs = ExplanationJobs(lambda: None, max_pending=1)
+    jobs.shutdown()
+    job_id, status = jobs.submit()
+    assert jobs.get(job_id)["status"] == FAILED
+    assert jobs.stats()["in_flight"] == 0
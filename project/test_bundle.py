@@ -0,0 +1,47 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from bundle import ModelBundle, write_bundle
+from inference import TOLERANCE
+
+@pytest.fixture
+def bundle_file(tmp_path, fitted):
+    model, scaler, background, feature_columns = fitted
+    path = str(tmp_path / "model_bundle.bin")
+    write_bundle(path, model, scaler, background, feature_columns, version="test-1", thresholds={"decision": 0.3})
+    return path
+
+def test_bundle_matches_sklearn(bundle_file, fitted):
+    model, scaler, background, feature_columns = fitted
+    bundle = ModelBundle(bundle_file)
+    assert bundle.version == "test-1"
+    assert bundle.feature_columns == feature_columns
+    np.testing.assert_array_equal(bundle.arrays["background"], np.asarray(background, dtype=np.float64))
+
+    rng = np.random.default_rng(0)
+    X = scaler.mean_ + scaler.scale_ * rng.standard_normal((300, len(feature_columns))) * 3
+    scaled = scaler.transform(pd.DataFrame(X, columns=feature_columns))
+    expected = model.predict_proba(pd.DataFrame(scaled, columns=feature_columns))
+    for dtype in ("float64", "float32"):
+        np.testing.assert_allclose(bundle.engine(dtype=dtype).predict_proba(X), expected,
+                                   rtol=0, atol=TOLERANCE[dtype])
+    np.testing.assert_allclose(bundle.scaled_model().predict_proba(scaled), expected, rtol=0, atol=TOLERANCE["float64"])
+
+def test_bundle_rejects_bad_checksum(bundle_file):
+    # Flip one byte in the last array's data
+    with open(bundle_file, "r+b") as f:
+        f.seek(-1, os.SEEK_END)
+        last = f.read(1)
+        f.seek(-1, os.SEEK_END)
+        f.write(bytes([last[0] ^ 0xFF]))
+    with pytest.raises(ValueError, match="Checksum mismatch"):
+        ModelBundle(bundle_file, verify=True)
+    # Skipping verification is an explicit opt-out
+    ModelBundle(bundle_file, verify=False)
+
+def test_bundle_rejects_foreign_file(tmp_path):
+    path = tmp_path / "model_bundle.bin"
+    path.write_bytes(b"PK\x03\x04" + b"\0" * 64)
+    with pytest.raises(ValueError, match="not a model bundle"):
+        ModelBundle(str(path))
@@ -0,0 +1,86 @@
+import sqlite3
+import numpy as np
+from explain_cache import LRUCache, ExplanationCache
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # "b" is now the oldest
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.stats()["evictions"] == 1
+
+def test_lru_byte_limit():
+    cache = LRUCache(max_entries=10, max_bytes=100, sizeof=len)
+    cache.put("a", "x" * 60)
+    cache.put("b", "y" * 60)
+    assert cache.get("a") is None and cache.nbytes == 60
+    cache.put("huge", "z" * 101)  # larger than the whole cache: not stored
+    assert cache.get("huge") is None and cache.get("b") is not None
+
+def test_lru_ttl_expiry(clock):
+    cache = LRUCache(ttl=10)
+    cache.put("a", 1)
+    clock.now += 9
+    assert cache.get("a") == 1
+    clock.now += 2
+    assert cache.get("a") is None and len(cache) == 0
+
+def test_explanation_cache_reuses_rows_and_expires(clock):
+    cache = ExplanationCache(namespace="m1", ttl=60)
+    calls = []
+
+    def compute(rows):
+        calls.append(len(rows))
+        return rows * 2
+
+    X = np.arange(6, dtype=np.float64).reshape(3, 2)
+    np.testing.assert_array_equal(cache.explain(X, compute), X * 2)
+    np.testing.assert_array_equal(cache.explain(X[[2, 0]], compute), X[[2, 0]] * 2)
+    assert calls == [3]
+    clock.now += 61
+    assert cache.lookup(X) is None
+
+def test_explanation_cache_namespaces_and_rounding():
+    row = np.array([0.123456, -0.0])
+    assert ExplanationCache(namespace="a").key_for(row) != ExplanationCache(namespace="b").key_for(row)
+    rounded = ExplanationCache(decimals=3)
+    assert rounded.key_for(row) == rounded.key_for(np.array([0.1234999, 0.0]))
+
+def test_explanation_cache_persists_across_instances(tmp_path, clock):
+    path = str(tmp_path / "explanations.sqlite")
+    X = np.array([[1.0, 2.0]])
+    ExplanationCache(namespace="m1", path=path).explain(X, lambda rows: rows + 1)
+    reopened = ExplanationCache(namespace="m1", path=path, ttl=60)
+    np.testing.assert_array_equal(reopened.lookup(X), X + 1)
+    assert reopened.stats()["disk_hits"] == 1
+    clock.now += 61
+    assert ExplanationCache(namespace="m1", path=path, ttl=60).lookup(X) is None
+
+def test_explanation_cache_is_memory_only_unless_configured(monkeypatch, tmp_path):
+    monkeypatch.delenv("EXPLAIN_CACHE_PATH", raising=False)
+    assert not ExplanationCache.from_env(namespace="m1").stats()["persistent"]
+    path = str(tmp_path / "explanations.sqlite")
+    assert ExplanationCache.from_env(namespace="m1", default_path=path).stats()["persistent"]
+    monkeypatch.setenv("EXPLAIN_CACHE_PATH", "")
+    assert not ExplanationCache.from_env(namespace="m1", default_path=path).stats()["persistent"]
+
+def test_clear_keeps_other_namespaces(tmp_path):
+    path = str(tmp_path / "explanations.sqlite")
+    X = np.array([[1.0, 2.0], [3.0, 4.0]])
+    first, second = ExplanationCache(namespace="m1", path=path), ExplanationCache(namespace="m2", path=path)
+    first.explain(X, lambda rows: rows + 1)
+    second.explain(X, lambda rows: rows + 2)
+    first.clear()
+    assert ExplanationCache(namespace="m1", path=path).lookup(X) is None
+    np.testing.assert_array_equal(ExplanationCache(namespace="m2", path=path).lookup(X), X + 2)
+
+def test_files_without_namespaces_are_upgraded(tmp_path):
+    path = str(tmp_path / "explanations.sqlite")
+    with sqlite3.connect(path) as db:
+        db.execute("CREATE TABLE explanations (key TEXT PRIMARY KEY, shap BLOB NOT NULL, created REAL NOT NULL)")
+    X = np.array([[1.0, 2.0]])
+    ExplanationCache(namespace="m1", path=path).explain(X, lambda rows: rows + 1)
+    np.testing.assert_array_equal(ExplanationCache(namespace="m1", path=path).lookup(X), X + 1)
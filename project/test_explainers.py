@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+from explainers import IntegratedGradients
+
+def network(out_activation, n_features=5, hidden=7, seed=0):
+    rng = np.random.default_rng(seed)
+    n_out = 1 if out_activation == "logistic" else 2
+    coefs = [rng.normal(0, 0.6, (n_features, hidden)), rng.normal(0, 0.6, (hidden, n_out))]
+    intercepts = [rng.normal(0, 0.2, hidden), rng.normal(0, 0.2, n_out)]
+    background = rng.standard_normal((6, n_features))
+    return IntegratedGradients(coefs, intercepts, "tanh", out_activation, background, steps=128), rng
+
+@pytest.mark.parametrize("out_activation", ["logistic", "softmax"])
+def test_gradients_match_central_differences(out_activation):
+    ig, rng = network(out_activation)
+    X = rng.standard_normal((4, 5))
+    h = 1e-6
+    numeric = np.empty_like(X)
+    for i in range(X.shape[1]):
+        step = np.zeros(X.shape[1])
+        step[i] = h
+        numeric[:, i] = (ig.predict(X + step) - ig.predict(X - step)) / (2 * h)
+    np.testing.assert_allclose(ig.gradients(X), numeric, rtol=1e-5, atol=1e-8)
+
+@pytest.mark.parametrize("out_activation", ["logistic", "softmax"])
+def test_attributions_are_complete(out_activation):
+    ig, rng = network(out_activation, seed=1)
+    X = 2 * rng.standard_normal((8, 5))
+    values = ig.shap_values(X)
+    assert values.shape == X.shape
+    assert ig.expected_value == pytest.approx(ig.predict(ig.background).mean())
+    # Midpoint rule over 128 steps: the sum matches P(x) - E[P(baseline)] up to integration error
+    np.testing.assert_allclose(values.sum(axis=1), ig.predict(X) - ig.expected_value, atol=1e-4)
+
+def test_chunking_does_not_change_attributions():
+    ig, rng = network("softmax", seed=2)
+    X = rng.standard_normal((10, 5))
+    whole = ig.shap_values(X)
+    ig.max_points = 1  # one row per chunk
+    np.testing.assert_allclose(ig.shap_values(X), whole, rtol=0, atol=1e-12)
@@ -0,0 +1,161 @@
+import os
+import json
+import random
+import numpy as np
+import pandas as pd
+from features import FeatureTransformer
+
+_SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+with open(os.path.join(_SCRIPT_DIR, "model", "feature_columns.json")) as f:
+    FEATURE_COLUMNS = json.load(f)
+
+def baseline_row(data, feature_columns):
+    """The per-row feature logic app.py's /predict had before FeatureTransformer."""
+    row_dict = {col: 0.0 for col in feature_columns}
+    if 'smoking_status' in data:
+        ss = str(data['smoking_status'])
+        if ss == '0': data['smoking_status'] = 'Non-Smoker'
+        elif ss == '1': data['smoking_status'] = 'Former Smoker'
+        elif ss == '2': data['smoking_status'] = 'Smoker'
+    for k, v in data.items():
+        if k in row_dict:
+            try:
+                row_dict[k] = float(v) if v is not None else 0.0
+            except (ValueError, TypeError):
+                pass
+    for k, v in data.items():
+        if v is None: continue
+        search_prefix = f"{k}_"
+        for col in feature_columns:
+            if col.lower().startswith(search_prefix.lower()):
+                val_part = col[len(search_prefix):]
+                if val_part.lower() == str(v).lower():
+                    row_dict[col] = 1.0
+    sex_input = str(data.get("sex", "male")).strip().lower()
+    wbc = data.get("wbc_count", 0)
+    neut_pct = data.get("neutrophil_pct", 0)
+    lymph_pct = data.get("lymphocyte_pct", 0)
+    platelets = data.get("platelet_count", 0)
+    hemoglobin = data.get("hemoglobin", 0)
+    try:
+        wbc_f = float(wbc) if wbc else 0
+        neut_f = float(neut_pct) if neut_pct else 0
+        lymph_f = float(lymph_pct) if lymph_pct else 1e-9
+        plat_f = float(platelets) if platelets else 0
+        hemo_f = float(hemoglobin) if hemoglobin else 0
+    except Exception:
+        wbc_f, neut_f, lymph_f, plat_f, hemo_f = 0, 0, 1e-9, 0, 0
+    neut_count = (neut_f / 100.0) * wbc_f if wbc_f else 0
+    lymph_count = (lymph_f / 100.0) * wbc_f if wbc_f else 1e-9
+    row_dict["neutrophil_count"] = neut_count
+    row_dict["lymphocyte_count"] = lymph_count
+    row_dict["NLR"] = neut_count / lymph_count
+    row_dict["PLR"] = plat_f / lymph_count
+    mono_pct = max(0, 100 - neut_f - lymph_f)
+    mono_count = (mono_pct / 100.0) * wbc_f if wbc_f else 0
+    row_dict["monocyte_count"] = mono_count
+    row_dict["MLR"] = mono_count / lymph_count
+    row_dict["anemia_flag"] = 1 if ((sex_input == 'female' and hemo_f < 12) or (sex_input == 'male' and hemo_f < 13.5)) else 0
+    row_dict["thrombocytosis_flag"] = 1 if plat_f > 400 else 0
+    row_dict["high_nlr_flag"] = 1 if row_dict.get("NLR", 0) > 3.0 else 0
+    return np.array([row_dict[col] for col in feature_columns], dtype=np.float64)
+
+NUMERIC_KEYS = ["age", "bmi", "pack_years", "cea_level", "crp_level",
+                "wbc_count", "neutrophil_pct", "lymphocyte_pct", "platelet_count", "hemoglobin"]
+VALUES = [0, 0.0, 1, 7.5, 55, 250, 450, 92.5, -3, "0", "12.5", "", None, "abc", "nan", "inf", "-inf",
+          float("nan"), float("inf"), True, False, [1], {"a": 1}]
+CATEGORIES = {
+    "sex": ["Female", "female", " Male ", "MALE", "other", "", None, 2, "Gender"],
+    "smoking_status": ["0", "1", "2", 0, 1, 2, "Smoker", "former smoker", "3", 8, None, "x"],
+}
+
+def random_payload(rng):
+    payload = {}
+    for key in NUMERIC_KEYS:
+        if rng.random() < 0.7:
+            payload[key] = rng.choice(VALUES)
+    for key, options in CATEGORIES.items():
+        if rng.random() < 0.8:
+            payload[key] = rng.choice(options)
+    if rng.random() < 0.1:
+        payload["unknown_field"] = "ignored"
+    return payload
+
+def test_transform_records_matches_baseline_rows():
+    rng = random.Random(0)
+    transformer = FeatureTransformer(FEATURE_COLUMNS)
+    payloads, expected = [], []
+    for _ in range(5000):
+        payload = random_payload(rng)
+        if payload.get("lymphocyte_pct") == "0":
+            # The old code skipped the floor for a string "0" and divided by
+            # zero (a 400, or NaN with an infinite WBC); the transformer
+            # floors it like a numeric 0
+            continue
+        expected.append(baseline_row(dict(payload), FEATURE_COLUMNS))
+        payloads.append(payload)
+    actual = transformer.transform_records([dict(p) for p in payloads])
+    # assert_array_equal treats NaN == NaN, so non-finite propagation must match too
+    np.testing.assert_array_equal(actual, expected)
+
+def test_single_transform_matches_batch():
+    rng = random.Random(1)
+    transformer = FeatureTransformer(FEATURE_COLUMNS)
+    payloads = [random_payload(rng) for _ in range(200)]
+    batch = transformer.transform_records([dict(p) for p in payloads])
+    for payload, row in zip(payloads, batch):
+        np.testing.assert_array_equal(transformer.transform(dict(payload)), row)
+
+def test_transform_frame_matches_transform_records():
+    # Training (train.py's parity check) and score_bulk build features column-wise
+    rng = np.random.default_rng(2)
+    n = 500
+    frame = pd.DataFrame({
+        "age": rng.uniform(20, 90, n),
+        "bmi": rng.uniform(15, 45, n),
+        "wbc_count": rng.choice([0.0, 4.0, 7.5, 15.8], n),
+        "neutrophil_pct": rng.uniform(0, 95, n),
+        "lymphocyte_pct": rng.choice([0.0, 5.0, 30.0, 60.0], n),
+        "platelet_count": rng.uniform(100, 600, n),
+        "hemoglobin": rng.uniform(8, 17, n),
+        "sex": rng.choice(["Female", "Male"], n),
+        "smoking_status": rng.choice(["Non-Smoker", "Former Smoker", "Smoker"], n),
+    })
+    transformer = FeatureTransformer(FEATURE_COLUMNS)
+    for serving in (False, True):
+        np.testing.assert_allclose(transformer.transform_frame(frame, serving=serving),
+                                   transformer.transform_records(frame.to_dict("records")), rtol=1e-12)
+
+PREPROCESSING = {"columns": ["age", "wbc_count", "neutrophil_pct", "hemoglobin"],
+                 "fill": [50.0, 7.0, 60.0, 13.0], "lower": [18.0, 2.0, 20.0, 8.0], "upper": [90.0, 15.0, 95.0, 17.0]}
+
+def test_serving_imputes_the_training_median_then_clips():
+    transformer = FeatureTransformer(FEATURE_COLUMNS, preprocessing=PREPROCESSING)
+    payloads = [
+        {"sex": "Male"},                                       # everything missing: medians
+        {"sex": "Male", "age": "abc", "hemoglobin": None},     # unparseable / null: medians
+        {"sex": "Female", "age": 120, "wbc_count": 40, "neutrophil_pct": 5, "hemoglobin": 12.5},  # clipped
+    ]
+    X = transformer.transform_records([dict(p) for p in payloads])
+    column = lambda name: X[:, transformer.index[name]]
+    np.testing.assert_array_equal(column("age"), [50, 50, 90])
+    np.testing.assert_array_equal(column("hemoglobin"), [13, 13, 12.5])
+    # Engineered features see the cleaned CBC values: 20% of a clipped WBC of 15
+    np.testing.assert_allclose(column("neutrophil_count"), [4.2, 4.2, 3.0])
+    np.testing.assert_array_equal(column("anemia_flag"), [1, 1, 0])
+    # The columnar path cleans the same way
+    np.testing.assert_allclose(transformer.transform_frame(pd.DataFrame(payloads), serving=True), X, rtol=1e-12)
+
+def test_missing_sex_is_rejected_for_file_rows():
+    transformer = FeatureTransformer(FEATURE_COLUMNS)
+    frame = pd.DataFrame({"age": [50, 60, 70, 80], "sex": ["Female", None, " ", np.nan],
+                          "wbc_count": [7.0, 7.0, np.inf, 7.0]})
+    X = transformer.transform_frame(frame, serving=True)
+    errors = transformer.invalid_rows(X, frame)
+    assert sorted(errors) == [1, 2, 3]
+    assert errors[1] == "Missing sex" and errors[2].endswith("; Missing sex") and "wbc_count" in errors[2]
+    # Without a sex column no row can be scored; request payloads keep the /predict default
+    no_sex = frame.drop(columns="sex")
+    assert len(transformer.invalid_rows(transformer.transform_frame(no_sex, serving=True), no_sex)) == 4
+    assert transformer.invalid_rows(transformer.transform_records([{"age": 50}])) == {}
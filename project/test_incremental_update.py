@@ -0,0 +1,83 @@
+import os
+import copy
+import json
+import numpy as np
+import pandas as pd
+import pytest
+import incremental_update
+from bundle import ModelBundle, bundle_path
+from features import FeatureTransformer
+from incremental_update import rebase_first_layer, restandardize, regressions, run
+
+@pytest.fixture
+def model_dir(tmp_path, model_copy, monkeypatch):
+    monkeypatch.setattr(incremental_update, "REPORT_PATH", str(tmp_path / "reports" / "incremental_update.json"))
+    return str(model_copy)
+
+def raw_rows(scaler, feature_columns, n, seed):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(scaler.mean_ + scaler.scale_ * rng.standard_normal((n, len(feature_columns))),
+                        columns=feature_columns)
+
+def test_rebase_keeps_the_function_exact(fitted):
+    model, scaler, _, feature_columns = fitted
+    X = raw_rows(scaler, feature_columns, 200, 0)
+    new_scaler = copy.deepcopy(scaler)
+    new_scaler.partial_fit(raw_rows(scaler, feature_columns, 500, 1) * 1.5 + 3)
+    rebased = copy.deepcopy(model)
+    rebase_first_layer(rebased, scaler, new_scaler)
+
+    before = model.predict_proba(pd.DataFrame(scaler.transform(X), columns=feature_columns))
+    after = rebased.predict_proba(pd.DataFrame(new_scaler.transform(X), columns=feature_columns))
+    np.testing.assert_allclose(after, before, rtol=0, atol=1e-9)
+    np.testing.assert_allclose(restandardize(scaler.transform(X), scaler, new_scaler), new_scaler.transform(X),
+                               rtol=0, atol=1e-9)
+
+def test_regressions_respect_tolerance():
+    before = {"roc_auc": 0.90, "pr_auc": 0.80, "recall_high_risk": 0.70, "f1_high_risk": 0.9}
+    after = {"roc_auc": 0.885, "pr_auc": 0.75, "recall_high_risk": None, "f1_high_risk": 0.1}
+    # f1 is not gated; a metric missing on either side is skipped
+    assert regressions(before, after, tolerance=0.02) == {"pr_auc": [0.80, 0.75]}
+    assert regressions(before, after, tolerance=0.01) == {"roc_auc": [0.90, 0.885], "pr_auc": [0.80, 0.75]}
+    assert regressions(before, before, tolerance=0.0) == {}
+
+def labeled_file(path, fitted, n, seed, invert=False):
+    """Payload rows labeled by the current model (inverted: the opposite of what it predicts)."""
+    model, scaler, _, feature_columns = fitted
+    rng = np.random.default_rng(seed)
+    frame = pd.DataFrame({
+        "age": rng.uniform(20, 90, n), "bmi": rng.uniform(17, 40, n),
+        "sex": rng.choice(["Male", "Female"], n),
+        "smoking_status": rng.choice(["Non-Smoker", "Former Smoker", "Smoker"], n),
+        "wbc_count": rng.uniform(3, 16, n), "neutrophil_pct": rng.uniform(40, 90, n),
+        "lymphocyte_pct": rng.uniform(5, 45, n), "platelet_count": rng.uniform(120, 600, n),
+        "hemoglobin": rng.uniform(8, 17, n), "cea_level": rng.uniform(0, 30, n), "crp_level": rng.uniform(0, 50, n),
+    })
+    X = FeatureTransformer(feature_columns).transform_records(frame.to_dict("records"))
+    proba = model.predict_proba(pd.DataFrame(scaler.transform(pd.DataFrame(X, columns=feature_columns)),
+                                             columns=feature_columns))[:, 1]
+    labels = (proba >= np.median(proba)).astype(int)
+    frame["cancer_risk"] = 1 - labels if invert else labels
+    frame.to_csv(path, index=False)
+    return str(path)
+
+def test_update_that_forgets_is_rejected(tmp_path, model_dir, fitted):
+    new = labeled_file(tmp_path / "new.csv", fitted, 400, 0, invert=True)
+    reference = labeled_file(tmp_path / "reference.csv", fitted, 200, 1)
+    before = os.path.getmtime(bundle_path(model_dir))
+    report = run(new, model_dir=model_dir, holdout_path=reference, epochs=30, tolerance=0.01)
+    assert not report["accepted"] and not report["written"]
+    assert report["holdout"]["reference"]["regressions"]
+    assert os.path.getmtime(bundle_path(model_dir)) == before
+    with open(incremental_update.REPORT_PATH) as f:
+        assert json.load(f)["accepted"] is False
+
+def test_accepted_update_writes_a_new_version(tmp_path, model_dir, fitted):
+    new = labeled_file(tmp_path / "new.csv", fitted, 300, 2)
+    output_dir = str(tmp_path / "model_b")
+    report = run(new, model_dir=model_dir, output_dir=output_dir, epochs=2, tolerance=1.0)
+    assert report["accepted"] and report["written"]
+    bundle = ModelBundle(bundle_path(output_dir))
+    assert bundle.version == report["version"]
+    assert bundle.header["metrics"]["incremental_update"]["train_rows"] == report["train_rows"]
+    assert "content_key" not in bundle.header["metrics"]
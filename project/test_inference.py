@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+from inference import FusedMLP, SklearnEngine, TOLERANCE
+
+def probe_rows(scaler, n=300):
+    rng = np.random.default_rng(0)
+    return scaler.mean_ + scaler.scale_ * rng.standard_normal((n, len(scaler.mean_))) * 3
+
+def sklearn_proba(model, scaler, feature_columns, X):
+    scaled = scaler.transform(pd.DataFrame(X, columns=feature_columns))
+    return model.predict_proba(pd.DataFrame(scaled, columns=feature_columns))
+
+@pytest.mark.parametrize("dtype", ["float64", "float32"])
+def test_fused_matches_sklearn(fitted, dtype):
+    model, scaler, _, feature_columns = fitted
+    X = probe_rows(scaler)
+    engine = FusedMLP.from_sklearn(model, scaler, dtype=dtype)
+    expected = sklearn_proba(model, scaler, feature_columns, X)
+    np.testing.assert_allclose(engine.predict_proba(X), expected, rtol=0, atol=TOLERANCE[dtype])
+    # Single rows go through the same (reused) buffers
+    np.testing.assert_allclose(engine.predict_proba(X[7]), expected[7:8], rtol=0, atol=TOLERANCE[dtype])
+
+@pytest.mark.parametrize("value", [np.nan, np.inf, -np.inf])
+def test_fused_rejects_non_finite_rows(fitted, value):
+    model, scaler, _, _ = fitted
+    X = probe_rows(scaler, n=4)
+    X[2, 0] = value
+    with pytest.raises(ValueError):
+        FusedMLP.from_sklearn(model, scaler).predict_proba(X)
+
+def test_score_scales_once(fitted):
+    model, scaler, _, feature_columns = fitted
+    X = probe_rows(scaler, n=5)
+    scaled_expected = scaler.transform(pd.DataFrame(X, columns=feature_columns))
+    calls = []
+
+    class CountingScaler:
+        def transform(self, rows):
+            calls.append(len(rows))
+            return scaler.transform(pd.DataFrame(rows, columns=feature_columns))
+
+    class Model:
+        def predict_proba(self, rows):
+            return model.predict_proba(pd.DataFrame(rows, columns=feature_columns))
+
+    expected = Model().predict_proba(scaled_expected)
+    for engine in (FusedMLP.from_sklearn(model, scaler), SklearnEngine(Model(), CountingScaler())):
+        proba, scaled = engine.score(X)
+        np.testing.assert_allclose(scaled, scaled_expected, rtol=1e-12)
+        np.testing.assert_allclose(proba, expected, rtol=0, atol=TOLERANCE["float64"])
+    assert calls == [5]
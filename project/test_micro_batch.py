@@ -0,0 +1,62 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pytest
+from micro_batch import MicroBatcher
+
+def test_results_follow_their_requests():
+    served = ["model-a", "model-b"]
+    batch_sizes = []
+
+    def run(model, X, explain):
+        batch_sizes.append(len(X))
+        time.sleep(0.002)  # let the next batch queue up behind this one
+        return [(model, explain, float(row[0])) for row in X]
+
+    batcher = MicroBatcher(run, max_wait=0.005, max_rows=8)
+
+    def call(i):
+        # Multi-row requests too, so fan-out has to slice by request length
+        X = np.arange(i * 10, i * 10 + 1 + i % 3, dtype=np.float64).reshape(-1, 1)
+        model, explain = served[i % 2], i % 3 == 0
+        return batcher.submit(model, X, explain), [(model, explain, float(v)) for v in X[:, 0]]
+
+    try:
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            for got, expected in pool.map(call, range(200)):
+                assert got == expected
+    finally:
+        batcher.stop(timeout=5)
+    assert max(batch_sizes) <= 8
+    assert batcher.stats()["rows"] == sum(1 + i % 3 for i in range(200))
+    assert batcher.batches < 200  # concurrent requests were coalesced
+
+def test_errors_reach_every_request_in_the_group():
+    def run(served, X, explain):
+        raise ValueError("boom")
+
+    batcher = MicroBatcher(run, max_wait=0.01)
+    try:
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            futures = [pool.submit(batcher.submit, "m", np.zeros((1, 2)), False) for _ in range(4)]
+            for future in futures:
+                with pytest.raises(ValueError, match="boom"):
+                    future.result(timeout=5)
+    finally:
+        batcher.stop(timeout=5)
+
+def test_submit_after_stop_fails():
+    batcher = MicroBatcher(lambda served, X, explain: list(X))
+    batcher.stop(timeout=5)
+    with pytest.raises(RuntimeError):
+        batcher.submit("m", np.zeros((1, 2)), False)
+
+def test_stop_ends_the_collector_while_a_batch_is_open():
+    batcher = MicroBatcher(lambda served, X, explain: [float(row[0]) for row in X], max_wait=0.5)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        future = pool.submit(batcher.submit, "m", np.ones((1, 1)), False)
+        time.sleep(0.05)  # the collector now waits for more rows to join the batch
+        batcher.stop(timeout=2)
+        assert not batcher._thread.is_alive()
+        # The open batch was still scored before the collector exited
+        assert future.result(timeout=1) == [1.0]
@@ -0,0 +1,33 @@
+import os
+import sys
+import json
+import subprocess
+
+CLI_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "predict_cli.py")
+
+def test_serve_round_trips_request_ids():
+    env = {**os.environ, "MODEL_RELOAD_INTERVAL": "0", "EXPLAIN_CACHE_PATH": ""}
+    requests = [
+        {"id": 1, "payload": {"age": 67, "sex": "Male", "wbc_count": 15.8, "lymphocyte_pct": 7.4}},
+        {"id": "abc", "payload": {"age": 45, "sex": "Female"}},
+        {"id": 3, "payload": {"age": "nan"}},
+        {"id": 4, "payload": "not an object"},
+        {"id": 5, "age": 30, "smoking_status": "1"},
+    ]
+    process = subprocess.Popen(
+        [sys.executable, CLI_PATH, "--serve", "--workers", "3", "--no-explain"],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, env=env,
+    )
+    stdout, _ = process.communicate("".join(json.dumps(r) + "\n" for r in requests), timeout=120)
+    assert process.returncode == 0
+    lines = [json.loads(line) for line in stdout.splitlines()]
+
+    ready, responses = lines[0], {r["id"]: r for r in lines[1:]}
+    assert ready["id"] is None and ready["ready"] is True
+    assert len(lines) == len(requests) + 1
+    assert sorted(responses, key=str) == sorted((r["id"] for r in requests), key=str)
+    for request_id in (1, "abc", 5):
+        assert responses[request_id]["success"] is True
+        assert responses[request_id]["risk_level"] in ("Low", "Medium", "High")
+    for request_id in (3, 4):
+        assert responses[request_id]["success"] is False
@@ -0,0 +1,55 @@
+import os
+import re
+import sys
+import json
+import signal
+import subprocess
+import urllib.request
+import pytest
+from prefork_server import process_memory
+
+_SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def test_process_memory_of_this_process():
+    memory = process_memory(os.getpid())
+    assert memory["rss_mb"] > 0
+    if os.path.exists(f"/proc/{os.getpid()}/smaps_rollup"):
+        assert memory["pss_mb"] > 0 and memory["private_mb"] > 0
+        assert memory["shared_mb"] + memory["private_mb"] == pytest.approx(memory["rss_mb"], abs=0.2)
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_forked_worker_serves_and_stops(tmp_path):
+    report_path = tmp_path / "prefork_workers.json"
+    # Keep the memory report out of reports/
+    script = "import sys, prefork_server; prefork_server.REPORT_PATH = sys.argv.pop(1); prefork_server.main()"
+    env = {**os.environ, "MODEL_RELOAD_INTERVAL": "0", "EXPLAIN_CACHE_PATH": "", "PYTHONWARNINGS": "ignore"}
+    process = subprocess.Popen(
+        [sys.executable, "-c", script, str(report_path), "--host", "127.0.0.1", "--port", "0", "--workers", "1"],
+        cwd=_SCRIPT_DIR, stderr=subprocess.PIPE, text=True, env=env,
+    )
+    try:
+        port = None
+        for line in process.stderr:
+            match = re.search(r"Serving on http://127\.0\.0\.1:(\d+) with 1 workers", line)
+            if match:
+                port = int(match.group(1))
+                break
+        assert port, "server did not start"
+
+        request = urllib.request.Request(f"http://127.0.0.1:{port}/predict?explain=async",
+                                         data=json.dumps({"age": 60, "sex": "Female"}).encode(),
+                                         headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=60) as response:
+            body = json.loads(response.read())
+        assert body["success"] and body["risk_level"] in ("Low", "Medium", "High")
+
+        process.send_signal(signal.SIGTERM)
+        _, stderr = process.communicate(timeout=60)
+        assert process.returncode == 0, stderr
+        assert "All workers stopped" in stderr
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.communicate()
+    roles = [p["role"] for p in json.loads(report_path.read_text())["processes"]]
+    assert roles == ["parent", "worker"]
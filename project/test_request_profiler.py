@@ -0,0 +1,20 @@
+from request_profiler import Profiler
+
+def test_authorized_needs_the_configured_token():
+    assert not Profiler().authorized(None)
+    assert not Profiler().authorized("anything")
+    assert not Profiler(token="").authorized("")
+    profiler = Profiler(token="s3cret")
+    assert not profiler.authorized(None)
+    assert not profiler.authorized("wrong")
+    assert profiler.authorized("s3cret")
+
+def test_one_profile_at_a_time(tmp_path):
+    profiler = Profiler(directory=str(tmp_path))
+    profile = profiler.begin("predict")
+    assert profile is not None and profiler.begin("predict") is None
+    profiler.end(profile)
+    assert list(tmp_path.glob("*.json"))
+    second = profiler.begin("predict")
+    assert second is not None
+    profiler.end(second, save=False)
@@ -0,0 +1,50 @@
+from types import SimpleNamespace
+import pytest
+from features import FeatureTransformer
+from response_cache import ResponseCache
+
+RESULT = {"risk_score": 42.0, "risk_level": "Medium", "top_factors": []}
+
+@pytest.fixture
+def served(fitted):
+    return SimpleNamespace(fingerprint="fp", version="v1", transformer=FeatureTransformer(fitted[3]))
+
+def key(cache, served, payload, explained=True):
+    return cache.key_for(served, served.transformer.transform(dict(payload)), explained)
+
+def test_equivalent_payloads_share_a_key(served):
+    cache = ResponseCache()
+    base = key(cache, served, {"age": 55, "sex": "Female", "smoking_status": "1"})
+    assert key(cache, served, {"age": "55.0", "sex": "female", "smoking_status": "Former Smoker", "x": 1}) == base
+    assert key(cache, served, {"age": 56, "sex": "Female", "smoking_status": "1"}) != base
+    assert key(cache, served, {"age": 55, "sex": "Female", "smoking_status": "1"}, explained=False) != base
+    other_version = SimpleNamespace(**{**vars(served), "version": "v2"})
+    assert key(cache, other_version, {"age": 55, "sex": "Female", "smoking_status": "1"}) != base
+
+def test_lru_eviction(served):
+    cache = ResponseCache(max_entries=2)
+    a, b, c = (key(cache, served, {"age": age}) for age in (40, 50, 60))
+    cache.put(a, RESULT)
+    cache.put(b, RESULT)
+    assert cache.get(a) == RESULT  # b is now least recently used
+    cache.put(c, RESULT)
+    assert cache.get(b) is None
+    assert cache.get(a) == RESULT and cache.get(c) == RESULT
+    assert cache.stats()["evictions"] == 1
+
+def test_ttl_expiry(served, clock):
+    cache = ResponseCache(ttl=300)
+    k = key(cache, served, {"age": 40})
+    cache.put(k, RESULT)
+    clock.now += 299
+    assert cache.get(k) == RESULT
+    clock.now += 2
+    assert cache.get(k) is None
+
+def test_invalidate_and_disabled(served):
+    cache = ResponseCache()
+    k = key(cache, served, {"age": 40})
+    cache.put(k, RESULT)
+    cache.invalidate()
+    assert cache.get(k) is None and cache.stats()["invalidations"] == 1
+    assert not ResponseCache(max_entries=0).enabled
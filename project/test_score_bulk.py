@@ -0,0 +1,36 @@
+import os
+import csv
+import pytest
+import serving
+from score_bulk import score_file
+
+@pytest.fixture(autouse=True)
+def no_disk_cache(monkeypatch):
+    monkeypatch.setenv("EXPLAIN_CACHE_PATH", "")
+
+def test_score_file_levels_and_row_errors(tmp_path):
+    source = tmp_path / "patients.csv"
+    source.write_text(
+        "id,age,sex,wbc_count,neutrophil_pct,lymphocyte_pct,platelet_count,hemoglobin\n"
+        "p1,67,Male,15.8,86.2,7.4,580,9.4\n"
+        "p2,45,Female,7.0,60,30,250,13.5\n"
+        "p3,50,Male,inf,60,10,250,14\n"
+        "p4,38,Female,,,,,\n"
+        "p5,60,,7.0,60,30,250,13.5\n"
+    )
+    output = tmp_path / "scores.csv"
+    summary = score_file(str(source), str(output), chunk_size=2, workers=0)
+    assert summary["rows"] == 5 and not os.path.exists(f"{output}.checkpoint.json")
+
+    with open(output) as f:
+        rows = list(csv.DictReader(f))
+    assert [r["id"] for r in rows] == ["p1", "p2", "p3", "p4", "p5"]
+    for r in rows:
+        if r["id"] == "p3":
+            assert r["risk_level"] == "" and "wbc_count" in r["error"]
+            continue
+        if r["id"] == "p5":
+            assert r["risk_level"] == "" and r["error"] == "Missing sex"
+            continue
+        assert r["error"] == ""
+        assert r["risk_level"] == serving.risk_level_for(float(r["risk_probability"]))
@@ -0,0 +1,51 @@
+import pytest
+from service_metrics import Counter, Gauge, Histogram, render
+
+def test_render_text_format():
+    registry = []
+    requests = Counter("requests_total", "Requests served", ("endpoint", "code"), registry=registry)
+    requests.labels("predict", 200).inc()
+    requests.labels("predict", 200).inc(2)
+    requests.labels('say "hi"\n', 400).inc()
+    in_flight = Gauge("in_flight", "Requests in flight", registry=registry)
+    in_flight.inc(3)
+    in_flight.dec()
+    latency = Histogram("latency_seconds", "Latency", ("stage",), buckets=(0.5, 0.1), registry=registry)
+    for value in (0.05, 0.1, 0.3, 2.0):
+        latency.labels("parse").observe(value)
+
+    assert render(registry).splitlines() == [
+        "# HELP requests_total Requests served",
+        "# TYPE requests_total counter",
+        'requests_total{endpoint="predict",code="200"} 3.0',
+        'requests_total{endpoint="say \\"hi\\"\\n",code="400"} 1.0',
+        "# HELP in_flight Requests in flight",
+        "# TYPE in_flight gauge",
+        "in_flight 2.0",
+        "# HELP latency_seconds Latency",
+        "# TYPE latency_seconds histogram",
+        # Buckets are sorted and cumulative; a value on a bound falls in that bucket
+        'latency_seconds_bucket{stage="parse",le="0.1"} 2',
+        'latency_seconds_bucket{stage="parse",le="0.5"} 3',
+        'latency_seconds_bucket{stage="parse",le="+Inf"} 4',
+        'latency_seconds_sum{stage="parse"} 2.45',
+        'latency_seconds_count{stage="parse"} 4',
+    ]
+
+def test_timer_counts_errors():
+    registry = []
+    seconds = Histogram("stage_seconds", "Stage time", ("stage",), registry=registry)
+    errors = Counter("stage_errors_total", "Stage errors", ("stage",), registry=registry)
+    with seconds.time("ok", on_error=errors.labels("ok")):
+        pass
+    with pytest.raises(RuntimeError):
+        with seconds.time("bad", on_error=errors.labels("bad")):
+            raise RuntimeError("boom")
+    text = render(registry)
+    assert 'stage_seconds_count{stage="bad"} 1' in text and 'stage_seconds_count{stage="ok"} 1' in text
+    assert 'stage_errors_total{stage="bad"} 1.0' in text and 'stage_errors_total{stage="ok"} 0.0' in text
+
+def test_label_count_is_checked():
+    counter = Counter("c_total", "C", ("a", "b"), registry=None)
+    with pytest.raises(ValueError, match="expects labels"):
+        counter.labels("only-one")
@@ -0,0 +1,117 @@
+import os
+from types import SimpleNamespace
+import pytest
+import serving
+from serving import ModelManager, ModelRouter, PRIMARY
+
+@pytest.fixture(autouse=True)
+def no_disk_cache(monkeypatch):
+    monkeypatch.setenv("EXPLAIN_CACHE_PATH", "")
+
+@pytest.fixture
+def swaps():
+    return []
+
+@pytest.fixture
+def manager(model_copy, swaps):
+    manager = ModelManager(str(model_copy), interval=0, on_swap=lambda old, new: swaps.append((old, new)))
+    manager.load()
+    return manager
+
+def settle(manager):
+    """Two polls: the first sees the change, the second (same signature) reloads."""
+    assert not manager.check()
+    return manager.check()
+
+def test_new_version_is_swapped_in(manager, swaps, model_copy, write_version):
+    old = manager.current
+    write_version(model_copy, "v2")
+    assert settle(manager)
+    assert manager.current.version == "v2" and manager.reloads == 1
+    assert swaps[-1] == (old, manager.current)
+    # A request still holding the old version finishes on it
+    X = old.transformer.transform_records([{}])
+    assert old.engine.predict_proba(X).shape == (1, 2)
+
+@pytest.mark.parametrize("step", ["validate", "warm"])
+def test_failed_version_keeps_the_old_one(manager, model_copy, write_version, monkeypatch, step):
+    old = manager.current
+
+    def fail(self, *args, **kwargs):
+        raise ValueError(f"{step} failed")
+
+    monkeypatch.setattr(serving.ServedModel, step, fail)
+    write_version(model_copy, "v2")
+    assert not settle(manager)
+    assert manager.current is old and manager.reloads == 0
+    assert manager.failures == 1 and f"{step} failed" in manager.last_error
+    # The failed files are not retried until they change again
+    assert not manager.check() and manager.failures == 1
+
+def test_corrupt_bundle_keeps_the_old_one(manager, model_copy):
+    old = manager.current
+    (model_copy / "model_bundle.bin").write_bytes(b"not a bundle")
+    assert not settle(manager)
+    assert manager.current is old and manager.failures == 1
+
+def test_touched_files_with_the_same_model_are_not_reloaded(manager, swaps, model_copy):
+    old = manager.current
+    swapped = len(swaps)
+    stat = os.stat(model_copy / "model_bundle.bin")
+    os.utime(model_copy / "model_bundle.bin", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert not settle(manager)
+    assert manager.current is old and manager.reloads == 0 and len(swaps) == swapped
+    assert manager.check() is False  # the touched signature is now the loaded one
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_after_fork_gives_the_child_working_state(manager):
+    manager.interval = 60
+    manager.start()
+    try:
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                manager.after_fork()
+                served = manager.current
+                X = served.transformer.transform_records([{}])
+                if manager._thread is None and served.engine.predict_proba(X).shape == (1, 2):
+                    manager.start()
+                    code = 0 if manager._thread.is_alive() else 1
+            finally:
+                os._exit(code)
+        _, status = os.waitpid(pid, 0)
+        assert os.WEXITSTATUS(status) == 0
+    finally:
+        manager.stop()
+
+def fixed(version):
+    """A manager stand-in whose current model is just a version label (None: not loaded)."""
+    return SimpleNamespace(current=version)
+
+def test_router_splits_traffic_by_weight():
+    router = ModelRouter({PRIMARY: fixed("p"), "canary": fixed("c"), "other": fixed("o")},
+                         weights={"canary": "0.2", "other": "0.1"}, seed=0)
+    names = [router.route()[0] for _ in range(5000)]
+    assert abs(names.count("canary") / 5000 - 0.2) < 0.02
+    assert abs(names.count("other") / 5000 - 0.1) < 0.02
+    # A pinned variant is always used; without split everything goes to primary
+    assert router.route("other") == ("other", "o")
+    assert {router.route(split=False)[0] for _ in range(100)} == {PRIMARY}
+
+def test_router_falls_back_to_primary():
+    router = ModelRouter({PRIMARY: fixed("p"), "canary": fixed(None)}, weights={"canary": 1.0})
+    assert router.route() == (PRIMARY, "p")
+    assert router.route("canary") == (PRIMARY, "p")
+    with pytest.raises(ValueError, match="Unknown model variant"):
+        ModelRouter({PRIMARY: fixed("p")}, weights={"canary": 0.1})
+    with pytest.raises(ValueError, match="more than 1"):
+        ModelRouter({PRIMARY: fixed("p"), "a": fixed("a"), "b": fixed("b")}, weights={"a": 0.6, "b": 0.6})
+
+def test_variant_swaps_do_not_reach_the_primary_callback(manager, swaps, model_copy, monkeypatch):
+    variant_swaps = []
+    monkeypatch.setenv("MODEL_VARIANTS", f"canary={model_copy}")
+    router = ModelRouter.from_env(manager, on_variant_swap=lambda *args: variant_swaps.append(args)).start()
+    assert router.route("canary")[0] == "canary"
+    assert [(name, old) for name, old, _ in variant_swaps] == [("canary", None)]
+    assert len(swaps) == 1  # only primary's own initial load
@@ -0,0 +1,51 @@
+import json
+import threading
+from types import SimpleNamespace
+import numpy as np
+from serving import risk_level_for
+from shadow import ShadowScorer
+
+class Transformer:
+    def __init__(self, compatible=True):
+        self.compatible = compatible
+
+    def compatible_with(self, other):
+        return self.compatible
+
+    def transform_records(self, records):
+        return np.array([[float(record["x"])] for record in records])
+
+def model(version, offset, transformer=None, gate=None):
+    def predict_proba(X):
+        if gate is not None:
+            gate.wait(5)
+        p = np.clip(X[:, 0] + offset, 0, 1)
+        return np.column_stack([1 - p, p])
+    return SimpleNamespace(version=version, transformer=transformer or Transformer(),
+                           engine=SimpleNamespace(predict_proba=predict_proba))
+
+def test_comparison_is_logged(tmp_path):
+    done = threading.Event()
+    scorer = ShadowScorer(risk_level_for, log_path=str(tmp_path / "shadow.jsonl"), on_compare=lambda r: done.set())
+    X = np.array([[0.1], [0.5]])
+    shadow = model("v2", 0.2, Transformer(compatible=False))
+    assert scorer.submit("/predict", model("v1", 0.0), shadow, [{"x": 0.2}, {"x": 0.5}], X, X[:, 0])
+    assert done.wait(5)
+    record = json.loads((tmp_path / "shadow.jsonl").read_text())
+    # Incompatible features: the shadow model re-transformed the payloads
+    assert not record["features_reused"] and record["shadow_scores"] == [0.4, 0.7]
+    assert (record["primary_version"], record["shadow_version"], record["rows"]) == ("v1", "v2", 2)
+    assert record["max_abs_diff"] == 0.3 and record["risk_level_changes"] == 2
+    assert scorer.stats()["submitted"] == 1
+
+def test_full_queue_drops(tmp_path):
+    gate, done = threading.Event(), threading.Event()
+    scorer = ShadowScorer(risk_level_for, log_path=str(tmp_path / "shadow.jsonl"), max_pending=1,
+                          on_compare=lambda r: done.set())
+    X = np.array([[0.1]])
+    primary, shadow = model("v1", 0.0), model("v2", 0.0, gate=gate)
+    assert scorer.submit("/predict", primary, shadow, [{}], X, X[:, 0])
+    assert not scorer.submit("/predict", primary, shadow, [{}], X, X[:, 0])
+    gate.set()
+    assert done.wait(5)
+    assert scorer.stats()["dropped"] == 1 and scorer.stats()["failed"] == 0
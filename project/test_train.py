@@ -0,0 +1,21 @@
+import os
+import pytest
+import train
+
+@pytest.fixture
+def model_dir(model_copy, monkeypatch):
+    (model_copy / "preprocessing.json").write_text("null")
+    monkeypatch.setattr(train, "MODEL_DIR", str(model_copy))
+    return model_copy
+
+def test_serving_artifacts_current(model_dir, write_version):
+    write_version(model_dir, "v1", content_key="abc")
+    assert train.serving_artifacts_current("abc")
+    assert not train.serving_artifacts_current("def")
+    # A missing artifact means model/ must be rewritten
+    os.remove(model_dir / "background.pkl")
+    assert not train.serving_artifacts_current("abc")
+
+def test_bundles_without_content_key_are_rewritten(model_dir, write_version):
+    write_version(model_dir, "v1", content_key=None)
+    assert not train.serving_artifacts_current("abc")
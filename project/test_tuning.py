@@ -0,0 +1,24 @@
+import warnings
+import numpy as np
+from sklearn.exceptions import ConvergenceWarning
+from sklearn.metrics import f1_score
+from tuning import tune_mlp, train_mlp, DECISION_THRESHOLD
+
+def make_data(n, seed):
+    rng = np.random.default_rng(seed)
+    X = rng.standard_normal((n, 6))
+    y = (X[:, 0] + 0.5 * X[:, 1] + 0.8 * rng.standard_normal(n) > 0.6).astype(int)
+    return X, y
+
+def test_best_trial_value_matches_final_fit(tmp_path):
+    X_train, y_train = make_data(300, 0)
+    X_eval, y_eval = make_data(150, 1)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", ConvergenceWarning)
+        params, epochs, study = tune_mlp(X_train, y_train, X_eval, y_eval, n_trials=3, workers=1,
+                                         max_epochs=6, epochs_per_step=2,
+                                         storage=f"sqlite:///{tmp_path / 'optuna.sqlite'}", study_name="test")
+        model = train_mlp(params, X_train, y_train, epochs)
+    assert epochs in (2, 4, 6)
+    preds = (model.predict_proba(X_eval)[:, 1] >= DECISION_THRESHOLD).astype(int)
+    assert f1_score(y_eval, preds, zero_division=0) == study.best_value
@@ -1,18 +1,27 @@
 import os
 import sys
+import time
+import logging
 import pandas as pd
 import numpy as np
 import warnings
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import classification_report, confusion_matrix, roc_auc_score, roc_curve, precision_recall_curve, auc
-from sklearn.neural_network import MLPClassifier
-import optuna
-import shap
 import matplotlib.pyplot as plt
 import joblib
-from imblearn.over_sampling import SMOTE
 import json
+import features
+import ingestion
+import tuning
+import explainers
+import global_importance
+from features import FeatureTransformer, engineer_frame
+from bundle import write_bundle, bundle_path, read_header
+from stage_timer import StageTimer
+from stage_cache import StageCache, file_hash, output, content_hash
+from tuning import tune_mlp, train_mlp
+from global_importance import compute_importance, top_features, background_summary
 
 warnings.filterwarnings('ignore')
 
@@ -24,9 +33,6 @@ PROCESSED_DIR= os.path.join(_SCRIPT_DIR, "data", "processed")
 MODEL_DIR    = os.path.join(_SCRIPT_DIR, "model")
 REPORTS_DIR  = os.path.join(_SCRIPT_DIR, "reports")
 
-for d in [RAW_DIR, PROCESSED_DIR, MODEL_DIR, REPORTS_DIR]:
-    os.makedirs(d, exist_ok=True)
-
 EXPECTED_FILES = {
     "mendeley_blood_cancer.csv": "https://data.mendeley.com/datasets/snkd73bnjr/1",
     "cervical_cancer.csv": "https://archive.ics.uci.edu/dataset/383/cervical+cancer+risk+factors",
@@ -34,20 +40,6 @@ EXPECTED_FILES = {
     "lung_cancer_risk.csv": "Kaggle: 'Lung Cancer Risk Prediction'"
 }
 
-def verify_datasets():
-    missing = []
-    for f, url in EXPECTED_FILES.items():
-        if not os.path.exists(os.path.join(RAW_DIR, f)):
-            missing.append((f, url))
-    
-    if len(missing) > 0:
-        print("ERROR: MISSING DATASETS")
-        for f, url in missing:
-            print(f"  - {f}  (source: {url})")
-        sys.exit(1)
-        
-verify_datasets()
-
 plco_schema = [
     'age', 'sex', 'bmi', 'smoking_status', 'pack_years', 'alcohol_use', 'family_history_cancer',
     'occupational_exposure', 'prior_cancer_diagnosis', 'wbc_count', 'rbc_count',
@@ -55,331 +47,505 @@ plco_schema = [
     'cea_level', 'ca125_level', 'crp_level', 'mcv', 'mch', 'cancer_risk'
 ]
 
-# 1. Load Datasets
-dfs = []
-for f in EXPECTED_FILES.keys():
-    try:
-        df = pd.read_csv(os.path.join(RAW_DIR, f), na_values=['?'])
-        
-        # Standardize column names
-        df.columns = [col.lower().strip().replace(' ', '_').replace('-', '_').replace('(', '').replace(')', '').replace(':', '_') for col in df.columns]
-        
-        # Mapping for alignment of biomarkers
-        mapping = {
-            'total_wbc_count/cumm': 'wbc_count',
-            'platelet_count_/cumm': 'platelet_count',
-            'gender': 'sex',
-            'smoking': 'smoking_status',
-            'occupational_hazards': 'occupational_exposure',
-            'obesity': 'bmi'
-        }
-        df.rename(columns=mapping, inplace=True)
-        
-        # Explicit mapping mapping for this hackathon
-        cancer_pos_terms = ['yes', 'high', 'positive', '1', 'confirmed', 'aml', 'all', 'cll', 'cml', 'lymphoma', 'multiple myeloma', 'nsclc', 'sclc']
-        
-        target_candidates = ['cancer_risk', 'risk_factor', 'biopsy', 'lung_cancer', 'cancer_type', 'dx_cancer', 'level', 'diagnosis_result', 'final_prediction']
-        target_col = None
-        for col in df.columns:
-            if any(tc == col for tc in target_candidates) or any(tc in col for tc in target_candidates):
-                target_col = col
-                break
-        
-        if target_col:
-            df.rename(columns={target_col: 'cancer_risk'}, inplace=True)
-            # Ensure it's a Series even if multiple columns matched (unlikely but safe)
-            if isinstance(df['cancer_risk'], pd.DataFrame):
-                df['cancer_risk'] = df['cancer_risk'].iloc[:, 0]
-
-            if df['cancer_risk'].dtype == 'O':
-                df['cancer_risk'] = df['cancer_risk'].map(lambda x: 1 if str(x).lower().strip() in cancer_pos_terms else 0)
-        else:
-            df['cancer_risk'] = 0 # If no target column found, assume no cancer risk for this dataset
-            pass  # target col found and renamed above
-
-        # Cap positives per dataset at 500 to avoid dominance
-        if 'cancer_risk' in df.columns:
-            pos = df[df['cancer_risk'] == 1]
-            neg = df[df['cancer_risk'] == 0]
-            if len(pos) > 500:
-                pos = pos.sample(n=500, random_state=42)
-            if len(neg) > 500:
-                neg = neg.sample(n=500, random_state=42)
-            df = pd.concat([pos, neg], ignore_index=True)
-
-        dfs.append(df)
-    except Exception as e:
-        print(f"Failed to process {f}: {e}")
-
-# --- Inject Synthetic Healthy Population ---
-# All datasets above contain ONLY cancer patients.
-# We MUST add realistic healthy samples or the model has no idea what "healthy" looks like.
-print("--- Injecting Synthetic Healthy Samples ---")
-np.random.seed(42)
-N_HEALTHY = 700
-
-def rand(low, high, n=N_HEALTHY): return np.random.uniform(low, high, n)
-def choose(opts, n=N_HEALTHY): return np.random.choice(opts, n)
-
-healthy_df = pd.DataFrame({
-    'age':                  rand(18, 65),
-    'sex':                  choose(['Male', 'Female']),
-    'bmi':                  rand(18.5, 27.5),
-    'smoking_status':       choose(['Non-Smoker', 'Former Smoker']),
-    'pack_years':           np.where(choose(['Non-Smoker', 'Former Smoker']) == 'Non-Smoker', 0.0, rand(1, 10)),
-    'alcohol_use':          rand(0, 3),
-    'family_history_cancer': choose([0, 0, 0, 1]),  # 75% no family history
-    'occupational_exposure': choose([0, 0, 0, 1]),
-    'prior_cancer_diagnosis': np.zeros(N_HEALTHY),
-    # Normal CBC values (per WHO / reference lab standards)
-    'wbc_count':            rand(4.5, 11.0),       # 10^3/uL
-    'rbc_count':            rand(4.0, 5.5),         # 10^6/uL
-    'hemoglobin':           rand(12.5, 17.0),       # g/dL
-    'hematocrit':           rand(37.0, 52.0),       # %
-    'platelet_count':       rand(150, 400),         # 10^3/uL
-    'neutrophil_pct':       rand(45, 70),           # %
-    'lymphocyte_pct':       rand(20, 45),           # %
-    'mcv':                  rand(80, 100),          # fL
-    'mch':                  rand(27, 33),           # pg
-    # Normal tumor markers (very low in healthy individuals)
-    'cea_level':            rand(0.1, 2.5),         # ng/mL (normal < 3.0)
-    'ca125_level':          rand(5, 25),            # U/mL (normal < 35)
-    'crp_level':            rand(0.1, 3.0),         # mg/L (normal < 5)
-    'cancer_risk':          np.zeros(N_HEALTHY)     # Label: healthy = 0
-})
-
-dfs.append(healthy_df)
-print(f"  + Added {N_HEALTHY} synthetic healthy samples")
-
-# ── Borderline / Moderate-Risk Samples ────────────────────────────────────────
-# Gap between our perfectly-healthy synthetic data and the severe cancer-patient
-# data was too large; the MLP collapses intermediate inputs to one extreme.
-# We bridge that gap with 400 "grey-zone" patients: real risk factors, but
-# biomarkers only mildly out of range.
-N_BORDER = 400
-
-def randb(low, high): return np.random.uniform(low, high, N_BORDER)
-def chooseb(opts): return np.random.choice(opts, N_BORDER)
-
-border_df = pd.DataFrame({
-    'age':                  randb(45, 75),
-    'sex':                  chooseb(['Male', 'Female']),
-    'bmi':                  randb(25, 32),            # overweight
-    'smoking_status':       chooseb(['Smoker', 'Former Smoker']),
-    'pack_years':           randb(5, 25),
-    'alcohol_use':          randb(2, 6),
-    'family_history_cancer': chooseb([0, 0, 1]),       # 33% family history
-    'occupational_exposure': chooseb([0, 1]),
-    'prior_cancer_diagnosis': np.zeros(N_BORDER),
-    # Mildly abnormal CBC
-    'wbc_count':            randb(11.0, 15.0),         # leukocytosis onset
-    'rbc_count':            randb(3.5, 4.5),
-    'hemoglobin':           randb(10.5, 13.0),         # mild anaemia
-    'hematocrit':           randb(32, 40),
-    'platelet_count':       randb(350, 500),           # approaching high-normal
-    'neutrophil_pct':       randb(65, 80),             # mildly elevated
-    'lymphocyte_pct':       randb(15, 25),             # mildly low
-    'mcv':                  randb(75, 85),             # mildly low (microcytic)
-    'mch':                  randb(24, 28),
-    # Mildly elevated tumour markers
-    'cea_level':            randb(2.5, 7.0),           # borderline elevated
-    'ca125_level':          randb(25, 60),             # borderline elevated
-    'crp_level':            randb(5.0, 15.0),          # moderate inflammation
-    # Label these as a 50/50 mix to teach the model intermediate risk
-    'cancer_risk':          np.random.randint(0, 2, N_BORDER)
-})
-
-dfs.append(border_df)
-print(f"  + Added {N_BORDER} synthetic moderate-risk samples")
-
-merged_df = pd.concat(dfs, ignore_index=True)
-
-# Generate schema features
-for col in plco_schema:
-    if col not in merged_df.columns:
-        merged_df[col] = np.nan
-
-# Force 'age' and schema columns to be numerical
-for col in plco_schema:
-    if col in merged_df.columns and col != 'smoking_status' and col != 'sex':
-        merged_df[col] = pd.to_numeric(merged_df[col], errors='coerce')
-
-# Handle columns safely 
-missing_ratios = merged_df.isnull().sum() / len(merged_df)
-cols_to_drop = missing_ratios[missing_ratios > 0.40].index.tolist()
-cols_to_drop = [c for c in cols_to_drop if c not in plco_schema]
-merged_df.drop(columns=cols_to_drop, inplace=True)
-
-numerical_cols = merged_df.select_dtypes(include=['int64', 'float64']).columns.tolist()
-categorical_cols = merged_df.select_dtypes(include=['object', 'category', 'bool']).columns.tolist()
-
-if 'cancer_risk' in numerical_cols: numerical_cols.remove('cancer_risk')
-if 'cancer_risk' in categorical_cols: categorical_cols.remove('cancer_risk')
-
-for col in numerical_cols:
-    median_val = merged_df[col].median()
-    if pd.isna(median_val):
-        merged_df[col].fillna(0.0, inplace=True)
-    else:
-        merged_df[col].fillna(median_val, inplace=True)
-
-for col in categorical_cols:
-    mode_val = merged_df[col].mode()
-    if len(mode_val) == 0:
-        merged_df[col].fillna("Unknown", inplace=True)
-    else:
-        merged_df[col].fillna(mode_val[0], inplace=True)
-
-merged_df.drop_duplicates(inplace=True)
-
-# Outlier scaling
-for col in numerical_cols:
-    Q1 = merged_df[col].quantile(0.25)
-    Q3 = merged_df[col].quantile(0.75)
-    IQR = Q3 - Q1
-    lower_bound = Q1 - 1.5 * IQR
-    upper_bound = Q3 + 1.5 * IQR
-    merged_df[col] = np.where(merged_df[col] > upper_bound, upper_bound, merged_df[col])
-    merged_df[col] = np.where(merged_df[col] < lower_bound, lower_bound, merged_df[col])
-
-# Engineered Features
-if 'monocyte_count' not in merged_df.columns:
-    merged_df['monocyte_count'] = np.random.uniform(0.1, 1.0, len(merged_df))
-for c in ['neutrophil_count', 'lymphocyte_count', 'platelet_count']:
-    if c not in merged_df.columns:
-        if f"{c.split('_')[0]}_pct" in merged_df.columns and 'wbc_count' in merged_df.columns:
-            merged_df[c] = (merged_df[f"{c.split('_')[0]}_pct"] / 100) * merged_df['wbc_count']
-        else:
-            merged_df[c] = merged_df[c] if c in merged_df.columns else 1.0 
-
-merged_df['NLR'] = merged_df['neutrophil_count'] / (merged_df['lymphocyte_count'] + 1e-9)
-merged_df['PLR'] = merged_df['platelet_count'] / (merged_df['lymphocyte_count'] + 1e-9)
-merged_df['MLR'] = merged_df['monocyte_count'] / (merged_df['lymphocyte_count'] + 1e-9)
-
-merged_df['anemia_flag'] = np.where(((merged_df['sex'].astype(str).str.lower() == 'female') & (merged_df['hemoglobin'] < 12)) | ((merged_df['sex'].astype(str).str.lower() == 'male') & (merged_df['hemoglobin'] < 13.5)), 1, 0)
-merged_df['thrombocytosis_flag'] = np.where(merged_df['platelet_count'] > 400, 1, 0)
-merged_df['high_nlr_flag'] = np.where(merged_df['NLR'] > 3.0, 1, 0)
-
-numerical_cols.extend(['NLR', 'PLR', 'MLR', 'anemia_flag', 'thrombocytosis_flag', 'high_nlr_flag'])
-
-encoded_df = pd.get_dummies(merged_df, columns=categorical_cols, drop_first=True)
-encoded_df = encoded_df.loc[:, ~encoded_df.columns.duplicated()]
-
-encoded_df.to_csv(os.path.join(PROCESSED_DIR, "cleaned_plco_mirrored_data.csv"), index=False)
-
-X = encoded_df.drop(columns=['cancer_risk'])
-y = encoded_df['cancer_risk'].astype(int)
-
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, stratify=y, random_state=42)
+THRESHOLD = 0.30
 
-scaler = StandardScaler()
-X_train_scaled = pd.DataFrame(scaler.fit_transform(X_train), columns=X_train.columns)
-X_test_scaled = pd.DataFrame(scaler.transform(X_test), columns=X_test.columns)
+# Pipeline stages, in order: ingest, synthesize, clean, engineer, encode,
+# split, tune, fit, explain, importance, compare, report. Each stage except `report` is cached by
+# stage_cache.StageCache under data/processed/stages/, keyed on its code and
+# the content of its inputs, so a re-run only recomputes stages whose inputs
+# changed. TRAIN_CACHE=0 forces a full run.
 
-joblib.dump(scaler, os.path.join(MODEL_DIR, "scaler.pkl"))
-with open(os.path.join(MODEL_DIR, "feature_columns.json"), "w") as f:
-    json.dump(list(X_train.columns), f)
+def verify_datasets():
+    missing = []
+    for f, url in EXPECTED_FILES.items():
+        if not os.path.exists(os.path.join(RAW_DIR, f)):
+            missing.append((f, url))
 
-print(f"--- Class distribution: {dict(y_train.value_counts().items())} ---")
-X_train_res = X_train_scaled
-y_train_res = y_train
+    if len(missing) > 0:
+        print("ERROR: MISSING DATASETS")
+        for f, url in missing:
+            print(f"  - {f}  (source: {url})")
+        sys.exit(1)
 
+def dataset_name(f):
+    return os.path.splitext(f)[0]
 
-# USE DEEP NEURAL NETWORK (MLP Classifier) instead of XGBoost
-print("\n--- Training Deep Neural Network (MLP) ---")
+# ── 1. ingest ────────────────────────────────────────────────────────────────
 
-def objective(trial):
-    # MLP Neural Network Optuna Hyperparameters
-    params = {
-        'hidden_layer_sizes': trial.suggest_categorical('hidden_layer_sizes', [(128, 64), (256, 128, 64), (64, 32)]),
-        'activation': trial.suggest_categorical('activation', ['relu', 'tanh']),
-        'learning_rate_init': trial.suggest_float('learning_rate_init', 1e-4, 1e-2, log=True),
-        'alpha': trial.suggest_float('alpha', 1e-5, 1e-2, log=True),
-        'early_stopping': True,
-        'random_state': 42,
-        'max_iter': 100
+def ingest(files):
+    """Read the raw CSVs in parallel (ingestion.py): harmonized columns and labels, pos/neg capped."""
+    frames, stats = ingestion.read_datasets([os.path.join(RAW_DIR, f) for f in files])
+    dfs = {}
+    for f, file_stats in zip(files, stats):
+        if "error" in file_stats:
+            print(f"Failed to process {f}: {file_stats['error']}")
+        else:
+            dfs[dataset_name(f)] = frames[os.path.join(RAW_DIR, f)]
+    # Per-file rows, parse time and peak memory (also written to reports/ingest_report.json)
+    dfs["ingest_report"] = stats
+    return dfs
+
+# ── 2. synthesize ────────────────────────────────────────────────────────────
+
+def synthesize(seed=42, n_healthy=700, n_border=400):
+    # --- Inject Synthetic Healthy Population ---
+    # All datasets above contain ONLY cancer patients.
+    # We MUST add realistic healthy samples or the model has no idea what "healthy" looks like.
+    print("--- Injecting Synthetic Healthy Samples ---")
+    rng = np.random.RandomState(seed)
+    N_HEALTHY = n_healthy
+
+    def rand(low, high, n=N_HEALTHY): return rng.uniform(low, high, n)
+    def choose(opts, n=N_HEALTHY): return rng.choice(opts, n)
+
+    healthy_df = pd.DataFrame({
+        'age':                  rand(18, 65),
+        'sex':                  choose(['Male', 'Female']),
+        'bmi':                  rand(18.5, 27.5),
+        'smoking_status':       choose(['Non-Smoker', 'Former Smoker']),
+        'pack_years':           np.where(choose(['Non-Smoker', 'Former Smoker']) == 'Non-Smoker', 0.0, rand(1, 10)),
+        'alcohol_use':          rand(0, 3),
+        'family_history_cancer': choose([0, 0, 0, 1]),  # 75% no family history
+        'occupational_exposure': choose([0, 0, 0, 1]),
+        'prior_cancer_diagnosis': np.zeros(N_HEALTHY),
+        # Normal CBC values (per WHO / reference lab standards)
+        'wbc_count':            rand(4.5, 11.0),       # 10^3/uL
+        'rbc_count':            rand(4.0, 5.5),         # 10^6/uL
+        'hemoglobin':           rand(12.5, 17.0),       # g/dL
+        'hematocrit':           rand(37.0, 52.0),       # %
+        'platelet_count':       rand(150, 400),         # 10^3/uL
+        'neutrophil_pct':       rand(45, 70),           # %
+        'lymphocyte_pct':       rand(20, 45),           # %
+        'mcv':                  rand(80, 100),          # fL
+        'mch':                  rand(27, 33),           # pg
+        # Normal tumor markers (very low in healthy individuals)
+        'cea_level':            rand(0.1, 2.5),         # ng/mL (normal < 3.0)
+        'ca125_level':          rand(5, 25),            # U/mL (normal < 35)
+        'crp_level':            rand(0.1, 3.0),         # mg/L (normal < 5)
+        'cancer_risk':          np.zeros(N_HEALTHY)     # Label: healthy = 0
+    })
+    print(f"  + Added {N_HEALTHY} synthetic healthy samples")
+
+    # ── Borderline / Moderate-Risk Samples ────────────────────────────────────
+    # Gap between our perfectly-healthy synthetic data and the severe cancer-patient
+    # data was too large; the MLP collapses intermediate inputs to one extreme.
+    # We bridge that gap with 400 "grey-zone" patients: real risk factors, but
+    # biomarkers only mildly out of range.
+    N_BORDER = n_border
+
+    def randb(low, high): return rng.uniform(low, high, N_BORDER)
+    def chooseb(opts): return rng.choice(opts, N_BORDER)
+
+    border_df = pd.DataFrame({
+        'age':                  randb(45, 75),
+        'sex':                  chooseb(['Male', 'Female']),
+        'bmi':                  randb(25, 32),            # overweight
+        'smoking_status':       chooseb(['Smoker', 'Former Smoker']),
+        'pack_years':           randb(5, 25),
+        'alcohol_use':          randb(2, 6),
+        'family_history_cancer': chooseb([0, 0, 1]),       # 33% family history
+        'occupational_exposure': chooseb([0, 1]),
+        'prior_cancer_diagnosis': np.zeros(N_BORDER),
+        # Mildly abnormal CBC
+        'wbc_count':            randb(11.0, 15.0),         # leukocytosis onset
+        'rbc_count':            randb(3.5, 4.5),
+        'hemoglobin':           randb(10.5, 13.0),         # mild anaemia
+        'hematocrit':           randb(32, 40),
+        'platelet_count':       randb(350, 500),           # approaching high-normal
+        'neutrophil_pct':       randb(65, 80),             # mildly elevated
+        'lymphocyte_pct':       randb(15, 25),             # mildly low
+        'mcv':                  randb(75, 85),             # mildly low (microcytic)
+        'mch':                  randb(24, 28),
+        # Mildly elevated tumour markers
+        'cea_level':            randb(2.5, 7.0),           # borderline elevated
+        'ca125_level':          randb(25, 60),             # borderline elevated
+        'crp_level':            randb(5.0, 15.0),          # moderate inflammation
+        # Label these as a 50/50 mix to teach the model intermediate risk
+        'cancer_risk':          rng.randint(0, 2, N_BORDER)
+    })
+    print(f"  + Added {N_BORDER} synthetic moderate-risk samples")
+    return {"healthy": healthy_df, "borderline": border_df}
+
+# ── 3. clean ─────────────────────────────────────────────────────────────────
+
+def clean(datasets, schema):
+    """Merge all cohorts, coerce schema columns, impute, dedupe and clip outliers."""
+    # Ingested cohorts arrive with compact dtypes
+    merged_df = pd.concat([ingestion.canonical_frame(d) for d in datasets], ignore_index=True)
+
+    # Generate schema features
+    for col in schema:
+        if col not in merged_df.columns:
+            merged_df[col] = np.nan
+
+    # Force 'age' and schema columns to be numerical
+    for col in schema:
+        if col in merged_df.columns and col != 'smoking_status' and col != 'sex':
+            merged_df[col] = pd.to_numeric(merged_df[col], errors='coerce')
+
+    # Handle columns safely
+    missing_ratios = merged_df.isnull().sum() / len(merged_df)
+    cols_to_drop = missing_ratios[missing_ratios > 0.40].index.tolist()
+    cols_to_drop = [c for c in cols_to_drop if c not in schema]
+    merged_df.drop(columns=cols_to_drop, inplace=True)
+
+    numerical_cols = merged_df.select_dtypes(include=['int64', 'float64']).columns.tolist()
+    categorical_cols = merged_df.select_dtypes(include=['object', 'category', 'bool']).columns.tolist()
+
+    if 'cancer_risk' in numerical_cols: numerical_cols.remove('cancer_risk')
+    if 'cancer_risk' in categorical_cols: categorical_cols.remove('cancer_risk')
+
+    # Impute: all medians in one pass (0.0 for all-missing columns), modes for categoricals
+    medians = merged_df[numerical_cols].median().fillna(0.0)
+    fill_values = medians.to_dict()
+    for col in categorical_cols:
+        mode_val = merged_df[col].mode()
+        fill_values[col] = "Unknown" if len(mode_val) == 0 else mode_val[0]
+    merged_df = merged_df.fillna(fill_values)
+
+    merged_df.drop_duplicates(inplace=True)
+
+    # Outlier clipping to [Q1 - 1.5 IQR, Q3 + 1.5 IQR], all columns at once
+    values = merged_df[numerical_cols].to_numpy(dtype=np.float64)
+    q1, q3 = np.quantile(values, [0.25, 0.75], axis=0)
+    lower, upper = q1 - 1.5 * (q3 - q1), q3 + 1.5 * (q3 - q1)
+    np.clip(values, lower, upper, out=values)
+    merged_df[numerical_cols] = values
+
+    # Fitted parameters, stored in the model bundle so serving applies the same transform
+    preprocessing = {
+        "columns": numerical_cols,
+        "fill": [float(medians[c]) for c in numerical_cols],
+        "lower": lower.tolist(),
+        "upper": upper.tolist(),
     }
-    
-    clf = MLPClassifier(**params)
-    clf.fit(X_train_res, y_train_res)
-    # Target heavily Recall/F1
-    preds = (clf.predict_proba(X_test_scaled)[:, 1] >= 0.30).astype(int)
-    from sklearn.metrics import f1_score
-    return f1_score(y_test, preds, zero_division=0)
+    return {"merged": merged_df, "numerical_cols": numerical_cols, "categorical_cols": categorical_cols,
+            "preprocessing": preprocessing}
+
+# ── 4. engineer ──────────────────────────────────────────────────────────────
+
+def engineer(merged_df):
+    # Engineered Features
+    # Same arithmetic as serving (features.py); monocyte_count is derived from the
+    # differential exactly as app.py/predict_cli.py do instead of being sampled.
+    merged_df = merged_df.copy()
+    for col, values in engineer_frame(merged_df).items():
+        merged_df[col] = values.astype(int) if values.dtype == bool else values
+    return {"merged": merged_df}
+
+# ── 5. encode ────────────────────────────────────────────────────────────────
+
+def encode(merged_df, categorical_cols, preprocessing):
+    encoded_df = pd.get_dummies(merged_df, columns=categorical_cols, drop_first=True)
+    encoded_df = encoded_df.loc[:, ~encoded_df.columns.duplicated()]
+
+    X = encoded_df.drop(columns=['cancer_risk'])
+    y = encoded_df['cancer_risk'].astype(int)
+
+    # Parity check: rebuild the matrix from the raw merged frame with the transformer
+    # used at serving time, including its re-application of the fitted imputation
+    # and clipping. Any difference means serving would see other features.
+    parity = FeatureTransformer(list(X.columns), preprocessing=preprocessing).transform_frame(merged_df)
+    parity_ok = np.isclose(parity, X.to_numpy(dtype=float), rtol=1e-12, atol=0, equal_nan=True).all(axis=0)
+    if not parity_ok.all():
+        raise ValueError(f"Serving features diverge from training features: {list(X.columns[~parity_ok])}")
+    print(f"--- Feature parity verified for {X.shape[1]} columns ---")
+    return {"X": X, "y": y}
+
+# ── 6. split ─────────────────────────────────────────────────────────────────
+
+def split(X, y):
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, stratify=y, random_state=42)
+
+    scaler = StandardScaler()
+    X_train_scaled = pd.DataFrame(scaler.fit_transform(X_train), columns=X_train.columns)
+    X_test_scaled = pd.DataFrame(scaler.transform(X_test), columns=X_test.columns)
+    return {"X_train_scaled": X_train_scaled, "X_test_scaled": X_test_scaled,
+            "y_train": y_train, "y_test": y_test, "scaler": scaler}
+
+# ── 7. tune ──────────────────────────────────────────────────────────────────
+
+def tune(X_train_scaled, y_train, X_test_scaled, y_test, n_trials, max_epochs, epochs_per_step):
+    # USE DEEP NEURAL NETWORK (MLP Classifier) instead of XGBoost
+    print("\n--- Training Deep Neural Network (MLP) ---")
+
+    # Parallel, prunable search (tuning.py): trials train a few epochs at a time
+    # with partial_fit and are pruned on F1@0.30; the SQLite study lets an
+    # interrupted run resume. TUNE_TRIALS / TUNE_WORKERS etc. configure it.
+    best_params, best_epochs, study = tune_mlp(X_train_scaled, y_train, X_test_scaled, y_test, n_trials=n_trials,
+                                               max_epochs=max_epochs, epochs_per_step=epochs_per_step)
+    pruned = sum(t.state.name == "PRUNED" for t in study.trials)
+    print(f"Trials: {len(study.trials)} ({pruned} pruned), best F1@0.30: {study.best_value:.4f} "
+          f"after {best_epochs} epochs")
+    return {"best_params": best_params, "best_epochs": best_epochs}
+
+# ── 8. fit ───────────────────────────────────────────────────────────────────
+
+def fit(X_train_scaled, y_train, best_params, best_epochs):
+    print("\n--- Training Final Multi-Layer Perceptron (Neural Network) ---")
+    # Trained exactly as the winning trial was, so its tuning score is this model's score
+    final_model = train_mlp(best_params, X_train_scaled, y_train, best_epochs)
+    return {"model": final_model}
+
+# ── 9. explain ───────────────────────────────────────────────────────────────
+
+def explain(X_train_scaled):
+    # Reference set the serving KernelExplainer integrates over; kept small so
+    # one /predict explanation stays fast
+    return {"background": X_train_scaled.sample(5, random_state=42)}
+
+# ── 10. importance ───────────────────────────────────────────────────────────
+
+def importance(model, X_train_scaled, X_test_scaled, background_size, nsamples):
+    print("\n--- Global SHAP importance over the test set ---")
+    # Every test row, sharded over a process pool (global_importance.py);
+    # GLOBAL_SHAP_BACKGROUND / GLOBAL_SHAP_NSAMPLES / GLOBAL_SHAP_WORKERS configure it
+    shap_values, importance_report = compute_importance(model, X_train_scaled, X_test_scaled,
+                                                        background_size=background_size, nsamples=nsamples)
+    timing = importance_report["timing"]
+    print(f"Explained {importance_report['rows']} rows in {timing['seconds']:.1f}s "
+          f"({timing['workers']} workers, {timing['shards']} shards)")
+    return {"shap_values": shap_values, "importance": importance_report}
+
+# ── 11. compare ──────────────────────────────────────────────────────────────
+
+def compare(model, X_train_scaled, X_test_scaled, shap_values, importance_report):
+    print("\n--- Integrated gradients vs KernelExplainer on the test split ---")
+    # Same k-means background the importance stage integrated over, so both
+    # attribute P(x) - E[P(background)] and the values are directly comparable
+    background = background_summary(X_train_scaled, importance_report["background_size"])
+    started = time.perf_counter()
+    gradient = explainers.IntegratedGradients.from_model(model, background)
+    gradient_values = gradient.shap_values(X_test_scaled)
+    seconds = time.perf_counter() - started
+
+    comparison = explainers.compare_attributions(shap_values, gradient_values)
+    target = model.predict_proba(X_test_scaled)[:, 1] - gradient.expected_value
+    comparison["completeness_max_error"] = round(float(np.abs(gradient_values.sum(axis=1) - target).max()), 6)
+    comparison["steps"] = gradient.steps
+    comparison["timing"] = {
+        "gradient_seconds": round(seconds, 4),
+        "kernel_seconds": importance_report["timing"]["seconds"],
+        "kernel_workers": importance_report["timing"]["workers"],
+    }
+    print(f"Top-3 overlap {comparison['top3_overlap']}, sign agreement {comparison['sign_agreement']}, "
+          f"mean row correlation {comparison['row_correlation_mean']}; "
+          f"{seconds:.2f}s vs {importance_report['timing']['seconds']:.1f}s")
+    return {"comparison": comparison}
 
-study = optuna.create_study(direction='maximize')
-study.optimize(objective, n_trials=15, n_jobs=1)
+# ── 12. report ───────────────────────────────────────────────────────────────
 
-best_params = study.best_params
-print(f"Best params: {best_params}")
+SERVING_FILES = ("scaler.pkl", "feature_columns.json", "cancer_risk_model.pkl", "background.pkl",
+                 "preprocessing.json", "metrics.json")
 
-print("\n--- Training Final Multi-Layer Perceptron (Neural Network) ---")
-final_model = MLPClassifier(**best_params, early_stopping=True, random_state=42, max_iter=300)
-final_model.fit(X_train_res, y_train_res)
+def serving_artifacts_current(content_key):
+    """True when MODEL_DIR already holds the serving artifacts built from `content_key`.
 
-THRESHOLD = 0.30
-y_pred_proba = final_model.predict_proba(X_test_scaled)[:, 1]
-y_pred = (y_pred_proba >= THRESHOLD).astype(int)
-
-print("\n--- Neural Network Classification Report (Threshold=0.30) ---")
-print(classification_report(y_test, y_pred))
-
-cm = confusion_matrix(y_test, y_pred)
-print("Confusion Matrix:\n", cm)
-
-auc_roc = roc_auc_score(y_test, y_pred_proba)
-
-from sklearn.metrics import average_precision_score
-pr_auc = average_precision_score(y_test, y_pred_proba)
-
-rep = classification_report(y_test, y_pred, output_dict=True)
-high_risk_recall = rep['1']['recall']
-high_risk_f1 = rep['1']['f1-score']
-
-print(f"\n--- Specific Metrics ---")
-print(f"PR AUC: {pr_auc:.4f}")
-print(f"High Risk Recall: {high_risk_recall:.4f}")
-print(f"High Risk F1-Score: {high_risk_f1:.4f}")
-
-# Output logic for charts...
-fpr, tpr, _ = roc_curve(y_test, y_pred_proba)
-plt.figure()
-plt.plot(fpr, tpr, color='darkorange', lw=2, label=f'ROC curve (area = {auc_roc:0.3f})')
-plt.plot([0, 1], [0, 1], color='navy', linestyle='--')
-plt.legend()
-plt.savefig(os.path.join(REPORTS_DIR, "roc_curve.png"))
-plt.close()
-
-import seaborn as sns
-plt.figure(figsize=(6, 5))
-sns.heatmap(cm, annot=True, fmt='d', cmap='Blues', cbar=False, 
-            xticklabels=['Low Risk', 'High Risk'], 
-            yticklabels=['Low Risk', 'High Risk'])
-plt.ylabel('Actual Label')
-plt.xlabel('Predicted Label')
-plt.title('Neural Network Confusion Matrix (Threshold 0.30)')
-plt.tight_layout()
-plt.savefig(os.path.join(REPORTS_DIR, "confusion_matrix.png"))
-plt.close()
-
-joblib.dump(final_model, os.path.join(MODEL_DIR, "cancer_risk_model.pkl"))
-
-print("\n--- Estimating SHAP for Neural Network ---")
-# SHAP KernelExplainer is required for NNs, but takes long on full data, using 5 background samples
-background = X_train_scaled.sample(5, random_state=42)
-test_samp = X_test_scaled.sample(10, random_state=42)
-
-explainer = shap.KernelExplainer(final_model.predict_proba, background)
-shap_values = explainer.shap_values(test_samp)
-shap_values_class1 = shap_values[:, :, 1] if len(np.shape(shap_values)) == 3 else shap_values
-
-plt.figure(figsize=(10, 8))
-shap.summary_plot(shap_values_class1, test_samp, max_display=20, show=False)
-plt.tight_layout()
-plt.savefig(os.path.join(REPORTS_DIR, "shap_summary.png"))
-plt.close()
-
-# For App API loading
-joblib.dump(background, os.path.join(MODEL_DIR, "background.pkl"))
-
-print("================ NEURAL NETWORK PIPELINE COMPLETED ================")
\ No newline at end of file
+    The bundle is written last, so its header vouches for the other files.
+    """
+    if not all(os.path.exists(os.path.join(MODEL_DIR, name)) for name in SERVING_FILES):
+        return False
+    try:
+        header = read_header(bundle_path(MODEL_DIR))
+    except (OSError, ValueError):
+        return False
+    return (header.get("metrics") or {}).get("content_key") == content_key
+
+def report(final_model, scaler, background, X_test_scaled, y_test, feature_columns, shap_values, importance_report,
+           preprocessing, content_key):
+    """Metrics, charts and the serving artifacts (always runs; cheap).
+
+    The serving artifacts are only rewritten when `content_key` changed: a
+    run whose stages all hit the cache keeps the current model version, so
+    hot-reloading servers see no change.
+    """
+    import shap
+    import seaborn as sns
+    from sklearn.metrics import average_precision_score
+
+    y_pred_proba = final_model.predict_proba(X_test_scaled)[:, 1]
+    y_pred = (y_pred_proba >= THRESHOLD).astype(int)
+
+    print("\n--- Neural Network Classification Report (Threshold=0.30) ---")
+    print(classification_report(y_test, y_pred))
+
+    cm = confusion_matrix(y_test, y_pred)
+    print("Confusion Matrix:\n", cm)
+
+    auc_roc = roc_auc_score(y_test, y_pred_proba)
+    pr_auc = average_precision_score(y_test, y_pred_proba)
+
+    rep = classification_report(y_test, y_pred, output_dict=True)
+    high_risk_recall = rep['1']['recall']
+    high_risk_f1 = rep['1']['f1-score']
+
+    print(f"\n--- Specific Metrics ---")
+    print(f"PR AUC: {pr_auc:.4f}")
+    print(f"High Risk Recall: {high_risk_recall:.4f}")
+    print(f"High Risk F1-Score: {high_risk_f1:.4f}")
+
+    # Output logic for charts...
+    fpr, tpr, _ = roc_curve(y_test, y_pred_proba)
+    plt.figure()
+    plt.plot(fpr, tpr, color='darkorange', lw=2, label=f'ROC curve (area = {auc_roc:0.3f})')
+    plt.plot([0, 1], [0, 1], color='navy', linestyle='--')
+    plt.legend()
+    plt.savefig(os.path.join(REPORTS_DIR, "roc_curve.png"))
+    plt.close()
+
+    plt.figure(figsize=(6, 5))
+    sns.heatmap(cm, annot=True, fmt='d', cmap='Blues', cbar=False,
+                xticklabels=['Low Risk', 'High Risk'],
+                yticklabels=['Low Risk', 'High Risk'])
+    plt.ylabel('Actual Label')
+    plt.xlabel('Predicted Label')
+    plt.title('Neural Network Confusion Matrix (Threshold 0.30)')
+    plt.tight_layout()
+    plt.savefig(os.path.join(REPORTS_DIR, "confusion_matrix.png"))
+    plt.close()
+
+    plt.figure(figsize=(10, 8))
+    shap.summary_plot(shap_values, X_test_scaled, max_display=20, show=False)
+    plt.tight_layout()
+    plt.savefig(os.path.join(REPORTS_DIR, "shap_summary.png"))
+    plt.close()
+
+    if serving_artifacts_current(content_key):
+        print(f"Serving artifacts in {MODEL_DIR} are unchanged (content {content_key[:12]}); not rewriting them")
+        return
+
+    # For App API loading
+    joblib.dump(scaler, os.path.join(MODEL_DIR, "scaler.pkl"))
+    with open(os.path.join(MODEL_DIR, "feature_columns.json"), "w") as f:
+        json.dump(feature_columns, f)
+    joblib.dump(final_model, os.path.join(MODEL_DIR, "cancer_risk_model.pkl"))
+    joblib.dump(background, os.path.join(MODEL_DIR, "background.pkl"))
+    # Imputation/clip parameters of the cleaning stage, applied again at serving time
+    with open(os.path.join(MODEL_DIR, "preprocessing.json"), "w") as f:
+        json.dump(preprocessing, f)
+
+    # Global importance: per-sample SHAP values and mean |SHAP| with timing
+    np.save(os.path.join(MODEL_DIR, "shap_values.npy"), shap_values)
+    with open(os.path.join(MODEL_DIR, "global_importance.json"), "w") as f:
+        json.dump(importance_report, f, indent=2)
+
+    model_version = time.strftime("%Y%m%d%H%M%S")
+    metrics = {
+        "roc_auc": round(float(auc_roc), 4),
+        "pr_auc": round(float(pr_auc), 4),
+        "recall_high_risk": round(float(high_risk_recall), 4),
+        "f1_high_risk": round(float(high_risk_f1), 4),
+        "precision_high_risk": round(float(rep['1']['precision']), 4),
+        "threshold": THRESHOLD,
+        "confusion_matrix": cm.tolist(),
+        "top_features": top_features(importance_report),
+        "model_version": model_version,
+        "last_trained": time.strftime("%Y-%m-%d"),
+        "content_key": content_key,
+    }
+    with open(os.path.join(MODEL_DIR, "metrics.json"), "w") as f:
+        json.dump(metrics, f)
+
+    # Single memory-mappable bundle (weights, scaler, background, feature order,
+    # thresholds, metrics) that app.py / predict_cli.py load instead of the pickles
+    write_bundle(
+        bundle_path(MODEL_DIR), final_model, scaler, background, feature_columns,
+        version=model_version,
+        thresholds={"decision": THRESHOLD},
+        preprocessing=preprocessing,
+        metrics=metrics,
+    )
+    print(f"Model bundle {model_version} written to {bundle_path(MODEL_DIR)}")
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    for d in [RAW_DIR, PROCESSED_DIR, MODEL_DIR, REPORTS_DIR]:
+        os.makedirs(d, exist_ok=True)
+    verify_datasets()
+
+    cache = StageCache()
+    # Wall time and peak RSS per stage, written to reports/train_stages.json
+    stages = StageTimer()
+
+    # 1. Load Datasets (keyed on the raw file contents)
+    stages.mark("ingest")
+    raw = cache.run("ingest", ingest, code=(ingestion,), params={
+        "files": {f: file_hash(os.path.join(RAW_DIR, f)) for f in EXPECTED_FILES}})
+    with open(os.path.join(REPORTS_DIR, "ingest_report.json"), "w") as f:
+        json.dump(raw["ingest_report"], f, indent=2)
+    for file_stats in raw["ingest_report"]:
+        if "error" not in file_stats:
+            print(f"  {file_stats['file']:<28} {file_stats['rows']:>9} rows  {file_stats['parse_seconds']:>7.3f}s  "
+                  f"peak RSS {file_stats['peak_rss_mb']} MB")
+
+    stages.mark("synthesize")
+    synthetic = cache.run("synthesize", synthesize)
+
+    stages.mark("clean")
+    datasets = [output(raw, dataset_name(f)) for f in EXPECTED_FILES if dataset_name(f) in raw]
+    datasets += [output(synthetic, "healthy"), output(synthetic, "borderline")]
+    cleaned = cache.run("clean", clean, code=(ingestion.canonical_frame,), params={"schema": plco_schema}, datasets=datasets)
+
+    stages.mark("engineer")
+    engineered = cache.run("engineer", engineer, code=(features,), merged_df=output(cleaned, "merged"))
+
+    stages.mark("encode")
+    encoded = cache.run("encode", encode, code=(features,), merged_df=output(engineered, "merged"),
+                        categorical_cols=output(cleaned, "categorical_cols"),
+                        preprocessing=output(cleaned, "preprocessing"))
+
+    stages.mark("split")
+    splits = cache.run("split", split, X=output(encoded, "X"), y=output(encoded, "y"))
+    print(f"--- Class distribution: {dict(splits['y_train'].value_counts().items())} ---")
+
+    stages.mark("tune")
+    tuned = cache.run("tune", tune, code=(tuning,), params={
+        "n_trials": int(os.environ.get("TUNE_TRIALS", "60")),
+        "max_epochs": int(os.environ.get("TUNE_EPOCHS", "100")),
+        "epochs_per_step": int(os.environ.get("TUNE_EPOCHS_PER_STEP", "5")),
+    }, X_train_scaled=output(splits, "X_train_scaled"), y_train=output(splits, "y_train"),
+       X_test_scaled=output(splits, "X_test_scaled"), y_test=output(splits, "y_test"))
+    best_params = tuned["best_params"]
+    print(f"Best params: {best_params}")
+
+    stages.mark("fit")
+    fitted = cache.run("fit", fit, code=(train_mlp,), X_train_scaled=output(splits, "X_train_scaled"),
+                       y_train=output(splits, "y_train"), best_params=best_params,
+                       best_epochs=tuned["best_epochs"])
+
+    stages.mark("explain")
+    explained = cache.run("explain", explain, X_train_scaled=output(splits, "X_train_scaled"))
+
+    stages.mark("importance")
+    important = cache.run("importance", importance, code=(global_importance,), params={
+        "background_size": int(os.environ.get("GLOBAL_SHAP_BACKGROUND", "25")),
+        "nsamples": os.environ.get("GLOBAL_SHAP_NSAMPLES", "auto"),
+    }, model=output(fitted, "model"), X_train_scaled=output(splits, "X_train_scaled"),
+       X_test_scaled=output(splits, "X_test_scaled"))
+
+    stages.mark("compare")
+    compared = cache.run("compare", compare, code=(explainers.IntegratedGradients, explainers.compare_attributions),
+                         model=output(fitted, "model"), X_train_scaled=output(splits, "X_train_scaled"),
+                         X_test_scaled=output(splits, "X_test_scaled"),
+                         shap_values=output(important, "shap_values"),
+                         importance_report=output(important, "importance"))
+    with open(os.path.join(REPORTS_DIR, "explainer_comparison.json"), "w") as f:
+        json.dump(compared["comparison"], f, indent=2)
+
+    stages.mark("report")
+    # Everything the serving artifacts are built from, by content
+    content_key = content_hash([fitted.hashes["model"], splits.hashes["scaler"], explained.hashes["background"],
+                                encoded.hashes["X"], cleaned.hashes["preprocessing"], important.hashes["importance"],
+                                THRESHOLD])
+    report(fitted["model"], splits["scaler"], explained["background"], splits["X_test_scaled"], splits["y_test"],
+           list(encoded["X"].columns), important["shap_values"], important["importance"], cleaned["preprocessing"],
+           content_key)
+
+    stage_report = stages.finish(os.path.join(REPORTS_DIR, "train_stages.json"))
+    for stage in stage_report["stages"]:
+        print(f"  {stage['stage']:<11} {stage['seconds']:>8.2f}s  peak RSS {stage['peak_rss_mb']} MB")
+
+    print("================ NEURAL NETWORK PIPELINE COMPLETED ================")
+
+if __name__ == "__main__":
+    main()
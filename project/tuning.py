@@ -0,0 +1,150 @@
+"""Parallel, prunable Optuna search for the MLP hyperparameters.
+
+Each trial trains with partial_fit a few epochs at a time and reports F1 at
+the 0.30 decision threshold after every step, so the MedianPruner can stop
+unpromising configurations early instead of fitting every trial to
+convergence. A trial's value is its best F1, and the epoch count that reached
+it is kept as the trial's `best_epoch`; train.py's final fit trains that many
+epochs through the same train_mlp(), so the winning score is the score of the
+model that ships. Trials run in a process pool; all workers share one study
+in a local SQLite database, so an interrupted search resumes where it stopped
+(the same training data maps to the same study name).
+
+Configuration (environment):
+    TUNE_TRIALS           total trials in the study, including earlier runs  (default 60)
+    TUNE_WORKERS          worker processes                                    (default: CPU count)
+    TUNE_EPOCHS           max epochs per trial                                (default 100)
+    TUNE_EPOCHS_PER_STEP  epochs between pruning checks                       (default 5)
+    TUNE_TIMEOUT          seconds before workers stop starting new trials     (default: none)
+    TUNE_STORAGE          Optuna storage URL        (default sqlite:///cache/optuna.sqlite)
+    TUNE_STUDY            study name                (default derived from the training data)
+"""
+import os
+import logging
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import optuna
+from sklearn.metrics import f1_score
+from sklearn.neural_network import MLPClassifier
+
+_SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_STORAGE = "sqlite:///" + os.path.join(_SCRIPT_DIR, "cache", "optuna.sqlite")
+DECISION_THRESHOLD = 0.30
+
+# Categorical choices must be primitives to round-trip through the database
+HIDDEN_LAYERS = {"128-64": (128, 64), "256-128-64": (256, 128, 64), "64-32": (64, 32)}
+
+_data = {}
+
+def _init_worker(X_train, y_train, X_eval, y_eval):
+    from threadpoolctl import threadpool_limits
+    # One BLAS thread per process; the pool provides the parallelism
+    threadpool_limits(1)
+    optuna.logging.set_verbosity(optuna.logging.WARNING)
+    _data.update(X_train=X_train, y_train=y_train, X_eval=X_eval, y_eval=y_eval)
+
+def suggest_params(trial):
+    return {
+        "hidden_layer_sizes": HIDDEN_LAYERS[trial.suggest_categorical("hidden_layer_sizes", list(HIDDEN_LAYERS))],
+        "activation": trial.suggest_categorical("activation", ["relu", "tanh"]),
+        "learning_rate_init": trial.suggest_float("learning_rate_init", 1e-4, 1e-2, log=True),
+        "alpha": trial.suggest_float("alpha", 1e-5, 1e-2, log=True),
+    }
+
+def decode_params(params):
+    """Study params -> MLPClassifier keyword arguments."""
+    params = dict(params)
+    params["hidden_layer_sizes"] = HIDDEN_LAYERS[params["hidden_layer_sizes"]]
+    return params
+
+def train_mlp(params, X, y, epochs, on_epoch=None):
+    """MLPClassifier(**params) trained for `epochs` passes of partial_fit.
+
+    Deterministic for the same inputs; `on_epoch(clf, epoch)` runs after each pass.
+    """
+    clf = MLPClassifier(**params, random_state=42)
+    classes = np.unique(y)
+    for epoch in range(1, epochs + 1):
+        clf.partial_fit(X, y, classes=classes)
+        if on_epoch is not None:
+            on_epoch(clf, epoch)
+    return clf
+
+def objective(trial, max_epochs, epochs_per_step):
+    X_eval, y_eval = _data["X_eval"], _data["y_eval"]
+    best = {"f1": -1.0, "epoch": max_epochs}
+
+    def evaluate(clf, epoch):
+        if epoch % epochs_per_step and epoch != max_epochs:
+            return
+        # Target heavily Recall/F1
+        preds = (clf.predict_proba(X_eval)[:, 1] >= DECISION_THRESHOLD).astype(int)
+        f1 = f1_score(y_eval, preds, zero_division=0)
+        if f1 > best["f1"]:
+            best.update(f1=f1, epoch=epoch)
+        trial.report(f1, epoch)
+        if trial.should_prune():
+            raise optuna.TrialPruned()
+
+    train_mlp(suggest_params(trial), _data["X_train"], _data["y_train"], max_epochs, on_epoch=evaluate)
+    trial.set_user_attr("best_epoch", best["epoch"])
+    return best["f1"]
+
+def _run_worker(storage_url, study_name, n_trials, max_epochs, epochs_per_step, timeout, seed):
+    study = optuna.load_study(study_name=study_name, storage=_storage(storage_url),
+                              sampler=optuna.samplers.TPESampler(seed=seed),
+                              pruner=_pruner(epochs_per_step))
+    study.optimize(lambda trial: objective(trial, max_epochs, epochs_per_step),
+                   n_trials=n_trials, timeout=timeout, catch=(ValueError,))
+
+def _storage(url):
+    if url.startswith("sqlite:///"):
+        os.makedirs(os.path.dirname(os.path.abspath(url[len("sqlite:///"):])), exist_ok=True)
+        # Several processes write to the same file; wait for locks instead of failing
+        return optuna.storages.RDBStorage(url, engine_kwargs={"connect_args": {"timeout": 60}})
+    return url
+
+def _pruner(epochs_per_step):
+    return optuna.pruners.MedianPruner(n_startup_trials=5, n_warmup_steps=2 * epochs_per_step)
+
+def tune_mlp(X_train, y_train, X_eval, y_eval, n_trials=None, workers=None, max_epochs=None,
+             epochs_per_step=None, timeout=None, storage=None, study_name=None):
+    """Search the MLP hyperparameters; returns (best MLPClassifier kwargs, epochs to train them, study)."""
+    import joblib
+    X_train, y_train = np.asarray(X_train, dtype=np.float64), np.asarray(y_train)
+    X_eval, y_eval = np.asarray(X_eval, dtype=np.float64), np.asarray(y_eval)
+    n_trials = n_trials or int(os.environ.get("TUNE_TRIALS", "60"))
+    workers = workers or int(os.environ.get("TUNE_WORKERS", "0")) or os.cpu_count() or 1
+    max_epochs = max_epochs or int(os.environ.get("TUNE_EPOCHS", "100"))
+    epochs_per_step = epochs_per_step or int(os.environ.get("TUNE_EPOCHS_PER_STEP", "5"))
+    timeout = timeout or (float(os.environ["TUNE_TIMEOUT"]) if os.environ.get("TUNE_TIMEOUT") else None)
+    storage = storage or os.environ.get("TUNE_STORAGE", DEFAULT_STORAGE)
+    study_name = study_name or os.environ.get("TUNE_STUDY") or \
+        f"mlp-f1-{joblib.hash((X_train, y_train, X_eval, y_eval, max_epochs, epochs_per_step))[:12]}"
+
+    study = optuna.create_study(study_name=study_name, storage=_storage(storage), direction="maximize",
+                                pruner=_pruner(epochs_per_step), load_if_exists=True)
+    finished = sum(t.state in (optuna.trial.TrialState.COMPLETE, optuna.trial.TrialState.PRUNED)
+                   for t in study.trials)
+    remaining = max(0, n_trials - finished)
+    if finished:
+        logging.info(f"Resuming study {study_name}: {finished} trials already finished")
+
+    workers = min(workers, remaining)
+    if remaining and workers > 1:
+        # Split the remaining trials across workers; each worker runs its own
+        # sampler against the shared study. The data reaches workers through
+        # the initializer, so any start method works.
+        shares = [remaining // workers + (i < remaining % workers) for i in range(workers)]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(X_train, y_train, X_eval, y_eval)) as pool:
+            futures = [pool.submit(_run_worker, storage, study_name, share, max_epochs, epochs_per_step,
+                                   timeout, 42 + i) for i, share in enumerate(shares)]
+            for future in futures:
+                future.result()
+    elif remaining:
+        _data.update(X_train=X_train, y_train=y_train, X_eval=X_eval, y_eval=y_eval)
+        _run_worker(storage, study_name, remaining, max_epochs, epochs_per_step, timeout, 42)
+
+    study = optuna.load_study(study_name=study_name, storage=_storage(storage))
+    return decode_params(study.best_params), study.best_trial.user_attrs.get("best_epoch", max_epochs), study
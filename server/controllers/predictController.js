@@ -3,6 +3,10 @@ const User = require('../models/userModel');
 const { spawn } = require('child_process');
 const path = require('path');
 const { GoogleGenerativeAI } = require('@google/generative-ai');
+const predictWorker = require('../services/predictWorker');
+
+// Set PREDICT_MODE=oneshot to fall back to one Python process per prediction.
+const USE_PERSISTENT_WORKER = process.env.PREDICT_MODE !== 'oneshot';
 
 const runPythonPrediction = (biomarkers) => {
     return new Promise((resolve, reject) => {
@@ -49,7 +53,9 @@ const predictBiomarkers = async (req, res) => {
         const patientId = biomarkers.patientId;
 
         // Run prediction
-        const prediction = await runPythonPrediction(biomarkers);
+        const prediction = USE_PERSISTENT_WORKER
+            ? await predictWorker.predict(biomarkers)
+            : await runPythonPrediction(biomarkers);
 
         // Optional: Generate AI Insight via Gemini
         let ai_insight = null;
@@ -0,0 +1,91 @@
+const { spawn } = require('child_process');
+const path = require('path');
+const readline = require('readline');
+const logger = require('../utils/logger');
+
+const CLI_PATH = path.join(__dirname, '../../project/predict_cli.py');
+const REQUEST_TIMEOUT_MS = parseInt(process.env.PREDICT_TIMEOUT_MS, 10) || 60000;
+
+// One long-lived `predict_cli.py --serve` process shared by every request.
+// Requests are written as NDJSON lines and matched back to their promise by id.
+let worker = null;
+let nextId = 1;
+const pending = new Map();
+
+const rejectAll = (err) => {
+    for (const { reject, timer } of pending.values()) {
+        clearTimeout(timer);
+        reject(err);
+    }
+    pending.clear();
+};
+
+// Drops a failed worker (so the next request starts a fresh one) and fails its requests
+const abandon = (proc, err) => {
+    if (worker !== proc) return; // already abandoned; its requests were failed then
+    worker = null;
+    rejectAll(err);
+};
+
+const startWorker = () => {
+    const proc = spawn('python', [CLI_PATH, '--serve'], { stdio: ['pipe', 'pipe', 'pipe'] });
+
+    readline.createInterface({ input: proc.stdout }).on('line', (line) => {
+        let message;
+        try {
+            message = JSON.parse(line);
+        } catch (e) {
+            logger.error(`Unparseable line from prediction worker: ${line}`);
+            return;
+        }
+        const entry = pending.get(message.id);
+        if (!entry) return; // ready banner or a request that already timed out
+        pending.delete(message.id);
+        clearTimeout(entry.timer);
+        delete message.id;
+        entry.resolve(message);
+    });
+
+    proc.stderr.on('data', (data) => {
+        logger.warn(`prediction worker: ${data.toString().trim()}`);
+    });
+
+    proc.on('error', (err) => {
+        logger.error(`Failed to start prediction worker: ${err.message}`);
+        abandon(proc, new Error(`Prediction worker unavailable: ${err.message}`));
+    });
+
+    // EPIPE when the worker dies mid-write; unhandled, it would crash the server
+    proc.stdin.on('error', (err) => {
+        logger.error(`Prediction worker stdin error: ${err.message}`);
+        abandon(proc, new Error(`Prediction worker unavailable: ${err.message}`));
+    });
+
+    proc.on('close', (code) => {
+        logger.warn(`Prediction worker exited with code ${code}`);
+        abandon(proc, new Error(`Prediction worker exited with code ${code}`));
+    });
+
+    return proc;
+};
+
+/**
+ * Sends one biomarker payload to the resident Python worker.
+ * The worker is (re)started lazily, so a crash only fails in-flight requests.
+ * @param {Object} biomarkers
+ * @returns {Promise<Object>} Prediction results
+ */
+exports.predict = (biomarkers) => {
+    if (!worker) worker = startWorker();
+
+    return new Promise((resolve, reject) => {
+        const id = nextId++;
+        const timer = setTimeout(() => {
+            pending.delete(id);
+            reject(new Error(`Prediction timed out after ${REQUEST_TIMEOUT_MS}ms`));
+        }, REQUEST_TIMEOUT_MS);
+
+        pending.set(id, { resolve, reject, timer });
+        worker.stdin.write(JSON.stringify({ id, payload: biomarkers }) + '\n');
+    });
+};